@@ -22,3 +22,165 @@ def EMA(frame, fast=5, slow=30, signal=10):
     df['EMA_Signal'] =df['Close'].ewm(span=signal,adjust=False, min_periods=0).mean()     
     return df
 
+
+class EWMState:
+    """Running exponential moving average advanced one value at a time.
+
+    Follows the same recursion as pandas ``Series.ewm(span=..., adjust=..., min_periods=...).mean()``
+    so the value after feeding a series equals the last value of the pandas result.
+    """
+
+    def __init__(self, span, adjust=False, min_periods=0):
+        self.alpha = 2.0 / (span + 1.0)
+        self.adjust = adjust
+        self.min_periods = max(min_periods, 1)
+        self.weighted = np.nan
+        self.old_wt = 1.0
+        self.nobs = 0
+
+    def _step(self, value):
+        if np.isnan(self.weighted):
+            return value, 1.0
+        new_wt = 1.0 if self.adjust else self.alpha
+        old_wt = self.old_wt * (1.0 - self.alpha)
+        weighted = self.weighted
+        if weighted != value:
+            weighted = (old_wt * weighted + new_wt * value) / (old_wt + new_wt)
+        return weighted, (old_wt + new_wt) if self.adjust else 1.0
+
+    def update(self, value):
+        self.weighted, self.old_wt = self._step(value)
+        self.nobs += 1
+        return self.value
+
+    def peek(self, value):
+        """Value the average would have after ``value``, without committing it."""
+        weighted, _ = self._step(value)
+        return weighted if self.nobs + 1 >= self.min_periods else np.nan
+
+    @property
+    def value(self):
+        return self.weighted if self.nobs >= self.min_periods else np.nan
+
+
+class IndicatorState:
+    """EMA and MACD state of one symbol, advanced by closed candles in O(1)."""
+
+    def __init__(self, fast=5, slow=30, signal=10, macd_fast=12, macd_slow=26, macd_signal=9):
+        self.ema_fast = EWMState(fast)
+        self.ema_slow = EWMState(slow)
+        self.ema_signal = EWMState(signal)
+        self.macd_fast = EWMState(macd_fast, adjust=True, min_periods=macd_fast)
+        self.macd_slow = EWMState(macd_slow, adjust=True, min_periods=macd_slow)
+        self.macd_signal = EWMState(macd_signal, adjust=True, min_periods=macd_signal)
+        self.last_time = None
+
+    def update(self, close):
+        self.ema_fast.update(close)
+        self.ema_slow.update(close)
+        self.ema_signal.update(close)
+        macd = self.macd_fast.update(close) - self.macd_slow.update(close)
+        if not np.isnan(macd):
+            self.macd_signal.update(macd)
+
+    def values(self, pending=None) -> dict:
+        """Current indicator values, optionally including a candle that has not closed yet."""
+        if pending is None:
+            macd = self.macd_fast.value - self.macd_slow.value
+            return {'EMA_Fast': self.ema_fast.value, 'EMA_Slow': self.ema_slow.value,
+                    'EMA_Signal': self.ema_signal.value, 'MACD': macd, 'SIGNAL': self.macd_signal.value}
+        macd = self.macd_fast.peek(pending) - self.macd_slow.peek(pending)
+        signal = self.macd_signal.peek(macd) if not np.isnan(macd) else self.macd_signal.value
+        return {'EMA_Fast': self.ema_fast.peek(pending), 'EMA_Slow': self.ema_slow.peek(pending),
+                'EMA_Signal': self.ema_signal.peek(pending), 'MACD': macd, 'SIGNAL': signal}
+
+
+class IndicatorEngine:
+    """Keeps an IndicatorState per key (symbol, interval), each cycle only feeds the new closed candles."""
+
+    def __init__(self, **params):
+        self.params = params
+        self.states = {}
+
+    def advance(self, key, times, closes) -> IndicatorState:
+        """Feed closed candles (open time in ms, close price) newer than the last one seen for key."""
+        state = self.states.get(key)
+        if state is None:
+            state = IndicatorState(**self.params)
+            self.states[key] = state
+        for time, close in zip(times, closes):
+            if state.last_time is not None and time <= state.last_time:
+                continue
+            state.update(float(close))
+            state.last_time = int(time)
+        return state
+
+    def reset(self, key) -> None:
+        self.states.pop(key, None)
+
+
+def closes_to_panel(series) -> np.ndarray:
+    """Stack close price arrays into a (symbols x time) panel, right aligned and padded with NaN on the left."""
+    width = max((len(closes) for closes in series), default=0)
+    panel = np.full((len(series), width), np.nan)
+    for row, closes in enumerate(series):
+        if len(closes):
+            panel[row, width - len(closes):] = closes
+    return panel
+
+
+def ewm_panel(panel, span, adjust=False, min_periods=0) -> np.ndarray:
+    """Row wise ``ewm(span, adjust, min_periods).mean()`` of a (symbols x time) panel in one pass over time.
+
+    Same recursion as EWMState, NaN values (padding) are treated like pandas does with ignore_na=False.
+    """
+    alpha = 2.0 / (span + 1.0)
+    new_wt = 1.0 if adjust else alpha
+    min_periods = max(min_periods, 1)
+    rows, width = panel.shape
+    out = np.full((rows, width), np.nan)
+    weighted = np.full(rows, np.nan)
+    old_wt = np.ones(rows)
+    nobs = np.zeros(rows, dtype=np.int64)
+    for t in range(width):
+        value = panel[:, t]
+        observed = ~np.isnan(value)
+        started = ~np.isnan(weighted)
+        old_wt = np.where(started, old_wt * (1.0 - alpha), old_wt)
+        update = started & observed
+        changed = update & (weighted != value)
+        weighted = np.where(changed, (old_wt * weighted + new_wt * value) / (old_wt + new_wt), weighted)
+        old_wt = np.where(update, old_wt + new_wt if adjust else 1.0, old_wt)
+        weighted = np.where(~started & observed, value, weighted)
+        nobs += observed
+        out[:, t] = np.where(nobs >= min_periods, weighted, np.nan)
+    return out
+
+
+def ema_series(values, span, window=None) -> np.ndarray:
+    """``ewm(span, adjust=False).mean()`` of a long 1D series without a Python step per value.
+
+    The recursion is solved in closed form block by block, blocks are short enough for
+    the decay powers to stay inside the float range. With `window` every value is the EMA
+    of only the last `window` values, like recomputing the EMA over a sliding window.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    decay = 1.0 - 2.0 / (span + 1.0)
+    out = np.empty(len(values))
+    if len(values) == 0:
+        return out
+    block = max(int(300 / -np.log(decay)), 1)
+    out[0] = values[0]
+    previous = values[0]
+    for start in range(1, len(values), block):
+        end = min(start + block, len(values))
+        steps = np.arange(1, end - start + 1)
+        scaled = np.cumsum(values[start:end] * decay ** -steps)
+        out[start:end] = decay ** steps * (previous + (1.0 - decay) * scaled)
+        previous = out[end - 1]
+    if window is not None and window < len(values):
+        # F[t] = a * sum(d^k x[t-k], k < n-1) + d^(n-1) F[t-n+1], the windowed EMA seeds with x[t-n+1] instead
+        seed = decay ** (window - 1)
+        full = out.copy()
+        out[window - 1:] = full[window - 1:] - seed * full[:len(values) - window + 1] + seed * values[:len(values) - window + 1]
+    return out
@@ -0,0 +1,160 @@
+"""Backtest of the EMA crossover alerts over the local kline store.
+
+The signal is the one of the ema alerts: buy while EMA_Fast > EMA_Signal,
+sell while EMA_Fast < EMA_Signal, evaluated on every closed candle. A long position
+is opened at the close of the candle that turns the signal to buy and closed at the
+close of the candle that turns it to sell. Symbols are split in groups and every group
+is simulated in its own process, each symbol as whole NumPy arrays.
+
+    python backtest.py --interval 1h --download --start "3 years ago UTC"
+    python backtest.py --interval 1h --workers 8
+"""
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List
+import numpy as np
+from algo_utils import ema_series
+from kline_store import KlineStore
+
+TRADE_DTYPE = np.dtype([('entry_time', '<i8'), ('exit_time', '<i8'), ('entry_price', '<f8'), ('exit_price', '<f8'),
+                        ('return', '<f8'), ('open', '?')])
+
+
+def crossover_positions(closes, fast=5, signal=10, window=None) -> np.ndarray:
+    """1 while the crossover signal says buy, 0 otherwise; an equal fast and signal keeps the previous state."""
+    emaFast = ema_series(closes, fast, window)
+    emaSignal = ema_series(closes, signal, window)
+    state = np.sign(emaFast - emaSignal)
+    # a single candle never signals, same as the alerts
+    state[:1] = 0
+    # forward fill the 0 states with the last buy/sell
+    index = np.where(state != 0, np.arange(len(state)), 0)
+    np.maximum.accumulate(index, out=index)
+    state = state[index]
+    return (state > 0).astype(np.int8)
+
+
+def simulate(times, closes, fast=5, signal=10, window=None, fee=0.001) -> np.ndarray:
+    """Trades of the long only crossover strategy, `fee` is paid on entry and on exit."""
+    positions = crossover_positions(closes, fast, signal, window)
+    changes = np.diff(positions, prepend=0)
+    entries = np.flatnonzero(changes == 1)
+    exits = np.flatnonzero(changes == -1)
+    trades = np.zeros(len(entries), dtype=TRADE_DTYPE)
+    if len(entries) == 0:
+        return trades
+    isOpen = len(exits) < len(entries)
+    exits = np.append(exits, len(closes) - 1) if isOpen else exits
+    trades['entry_time'] = times[entries]
+    trades['exit_time'] = times[exits]
+    trades['entry_price'] = closes[entries]
+    trades['exit_price'] = closes[exits]
+    trades['return'] = trades['exit_price'] * (1 - fee) / (trades['entry_price'] * (1 + fee)) - 1
+    trades['open'][-1] = isOpen
+    return trades
+
+
+def summarize(trades) -> Dict:
+    returns = trades['return']
+    return {'trades': len(trades), 'wins': int((returns > 0).sum()),
+            'pnl': float(np.prod(1 + returns) - 1) if len(trades) else 0.0,
+            'best': float(returns.max()) if len(trades) else 0.0,
+            'worst': float(returns.min()) if len(trades) else 0.0}
+
+
+def backtest_shard(root, interval, symbols: List, params: Dict) -> Dict:
+    """Run the simulation for a group of symbols, this is what every worker process executes."""
+    store = KlineStore(root)
+    results = {}
+    for symbol in symbols:
+        records = store.read(symbol, interval)
+        if len(records) < 2:
+            continue
+        trades = simulate(records['time'], records['close'], **params)
+        results[symbol] = (trades, summarize(trades))
+    return results
+
+
+def backtest(root, interval, symbols: List, workers=4, shardsPerWorker=4, **params) -> Dict:
+    """{symbol: (trades, summary)} for every stored symbol, computed on a process pool."""
+    shards = [list(shard) for shard in np.array_split(np.array(symbols, dtype=object), max(workers * shardsPerWorker, 1))
+              if len(shard)]
+    results = {}
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for shardResults in pool.map(backtest_shard, [root] * len(shards), [interval] * len(shards), shards,
+                                         [params] * len(shards)):
+                results.update(shardResults)
+    else:
+        for shard in shards:
+            results.update(backtest_shard(root, interval, shard, params))
+    return results
+
+
+def universe_summary(results: Dict) -> Dict:
+    summaries = {symbol: summary for symbol, (_, summary) in results.items()}
+    trades = sum(summary['trades'] for summary in summaries.values())
+    wins = sum(summary['wins'] for summary in summaries.values())
+    pnls = np.array([summary['pnl'] for summary in summaries.values()])
+    ranked = sorted(summaries, key=lambda symbol: summaries[symbol]['pnl'])
+    return {'symbols': len(summaries), 'trades': trades, 'win_rate': wins / trades if trades else 0.0,
+            'mean_pnl': float(pnls.mean()) if len(pnls) else 0.0,
+            'median_pnl': float(np.median(pnls)) if len(pnls) else 0.0,
+            'best': ranked[-1] if ranked else None, 'worst': ranked[0] if ranked else None}
+
+
+def stored_symbols(root, interval) -> List:
+    store = KlineStore(root)
+    directory = os.path.join(root, interval)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(symbol for symbol in os.listdir(directory) if store.size(symbol, interval) > 0)
+
+
+def download(bClient, interval, start, symbols: List) -> None:
+    """Fill the kline store of bClient with the missing candles of every symbol, one klines page at a time.
+
+    A symbol that fails is logged and skipped, the next run resumes it from its last stored candle.
+    """
+    logger = logging.getLogger('trading_bot.backtest')
+
+    def fill(symbol):
+        try:
+            return bClient.downloadKlines(interval, start, symbol)
+        except Exception:
+            logger.exception(f'failed to download klines for {symbol}')
+            return 0
+
+    with ThreadPoolExecutor(max_workers=max(bClient.workers, 1)) as pool:
+        written = sum(pool.map(fill, symbols))
+    logger.info(f'downloaded {written} {interval} klines of {len(symbols)} symbols')
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description='Backtest the EMA crossover alerts on stored klines')
+    parser.add_argument('--store', default='klines')
+    parser.add_argument('--interval', default='1d')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--window', type=int, help='evaluate the EMAs over the last N candles only, like the polling loop')
+    parser.add_argument('--fee', type=float, default=0.001)
+    parser.add_argument('--download', action='store_true', help='fetch the missing USDT klines first')
+    parser.add_argument('--start', default='3 years ago UTC')
+    args = parser.parse_args(argv)
+
+    if args.download:
+        from binance_client import BinanceClient
+        bClient = BinanceClient(testnet=False, klineStore=KlineStore(args.store))
+        download(bClient, args.interval, args.start, bClient.get_usdt_tickers())
+
+    results = backtest(args.store, args.interval, stored_symbols(args.store, args.interval), workers=args.workers,
+                       window=args.window, fee=args.fee)
+    for symbol, (_, summary) in sorted(results.items()):
+        print(f'{symbol:15} trades: {summary["trades"]:5} wins: {summary["wins"]:5} pnl: {summary["pnl"]:+.2%}')
+    print(universe_summary(results))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
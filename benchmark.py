@@ -0,0 +1,215 @@
+"""Offline benchmarks of the bot pipeline.
+
+Runs without network access, binance.client.Client is replaced by SyntheticClient
+which serves deterministic random walk klines. Every benchmark reports throughput,
+p50/p99 latency of one iteration and peak traced memory.
+
+    python benchmark.py                          # run and print
+    python benchmark.py --save baseline.json     # store results as baseline
+    python benchmark.py --compare baseline.json  # fail when p50 regressed more than --threshold
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict
+import numpy as np
+from algo_utils import MACD, EMA
+from binance_client import BinanceClient
+from binance_time_utils import intervalToMilliseconds
+from db_manager import DbManager
+from indicators import DEFAULT_STRATEGY, INDICATORS, lookback
+from message_sender import MessageSender
+from utils import list_to_tables, symbols_to_table, symbols_alerts_to_table
+
+DAY_MS = 24 * 60 * 60 * 1000
+# symbols share this many distinct series, so a large universe does not hold a copy of the klines per symbol
+SERIES = 16
+
+
+def synthetic_klines(count, seed=0, step=DAY_MS, end=None) -> list:
+    """Raw klines shaped like the Binance payload (prices as strings), ending with the forming candle."""
+    rng = np.random.default_rng(seed)
+    end = int(time.time() * 1000) if end is None else end
+    first = end - end % step - (count - 1) * step
+    closes = 100 + np.cumsum(rng.normal(size=count))
+    return [[first + i * step, f'{close - 0.5:.8f}', f'{close + 1:.8f}', f'{close - 1:.8f}', f'{close:.8f}',
+             '1000.00000000', first + (i + 1) * step - 1, '0', 10, '0', '0', '0']
+            for i, close in enumerate(closes)]
+
+
+class SyntheticClient:
+    """Stand-in for binance.client.Client serving synthetic klines for any symbol."""
+
+    def __init__(self, symbols, count=31, step=DAY_MS):
+        series = [synthetic_klines(count, seed, step) for seed in range(min(len(symbols), SERIES))]
+        self.klines = {symbol: series[seed % SERIES] for seed, symbol in enumerate(symbols)}
+
+    def get_historical_klines(self, symbol, interval, start_str=None, end_str=None, limit=None):
+        return self.klines[symbol]
+
+    def get_klines(self, symbol, interval, startTime=0, limit=1000):
+        return [row for row in self.klines[symbol] if row[0] >= startTime][:limit]
+
+    def get_all_tickers(self):
+        return [{'symbol': symbol, 'price': row[-1][4]} for symbol, row in self.klines.items()]
+
+
+class NullBot:
+
+    def send_message(self, chat_id, text, parse_mode=None):
+        pass
+
+
+def measure(name, fn: Callable, setup: Callable = None, repeat=20, items=1) -> Dict:
+    """Time `repeat` calls of fn (after one warm up call), `items` is the work done by one call.
+
+    Peak memory comes from one extra call under tracemalloc, so tracing does not skew the timings.
+    """
+    state = setup() if setup else None
+    fn(state)
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(state)
+        durations.append(time.perf_counter() - started)
+    tracemalloc.start()
+    fn(state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    durations = np.array(durations)
+    return {'name': name, 'p50_ms': float(np.percentile(durations, 50) * 1000),
+            'p99_ms': float(np.percentile(durations, 99) * 1000),
+            'throughput': float(items * repeat / durations.sum()), 'peak_kb': peak / 1024}
+
+
+def bench_parse(scale):
+    raw = synthetic_klines(1000)
+    bClient = BinanceClient(client=SyntheticClient([]))
+    return measure('convertKlinesToFrame 1000 rows', lambda _: bClient.convertKlinesToFrame(raw),
+                   repeat=scale['repeat'], items=1000)
+
+
+def bench_indicators(scale):
+    raw = synthetic_klines(720)
+    frame = BinanceClient(client=SyntheticClient([])).convertKlinesToFrame(raw)
+    return [measure('algo_utils.EMA 720 rows', lambda _: EMA(frame), repeat=scale['repeat'], items=720),
+            measure('algo_utils.MACD 720 rows', lambda _: MACD(frame), repeat=scale['repeat'], items=720)]
+
+
+def bench_timeframes_checker(scale):
+    symbols = [f'S{i}USDT' for i in range(scale['symbols'])]
+    timeframes = ['1h', '4h', '1d']
+    strategies = list(INDICATORS)
+    # the forming candle and the lookback of every strategy on the daily timeframe
+    count = lookback(strategies) * DAY_MS // intervalToMilliseconds('1h') + 1
+    bClient = BinanceClient(client=SyntheticClient(symbols, count, intervalToMilliseconds('1h')), weightLimit=10 ** 9)
+    start = f'{lookback(strategies)} days ago UTC'
+    return measure(f'timeframes_checker {len(symbols)} symbols',
+                   lambda _: bClient.timeframes_checker('1h', start, symbols, timeframes, strategies=strategies),
+                   repeat=max(scale['repeat'] // 4, 1), items=len(symbols))
+
+
+def bench_fanout(scale):
+    from load_simulation import load_bot
+    symbols = [f'S{i}USDT' for i in range(scale['symbols'])]
+    chats = scale['chats']
+
+    def setup():
+        rng = np.random.default_rng(0)
+        bot = load_bot()
+        bot.db = DbManager(':memory:')
+        bot.sender = MessageSender(NullBot())
+        timeframe = bot.DEFAULT_TIMEFRAME
+        dispatcher = bot.alertDispatchers[(timeframe, DEFAULT_STRATEGY)]
+        for chat_id in range(chats):
+            dispatcher.subscribe(chat_id, 'all' if chat_id % 2 else symbols[rng.integers(len(symbols))])
+        # every cycle about 5% of the universe changes its signal
+        signals = rng.random(len(symbols)) > 0.5
+        snapshots = []
+        for _ in range(8):
+            signals = signals ^ (rng.random(len(symbols)) < 0.05)
+            snapshots.append({timeframe: {symbol: {"buy": bool(buy), "sell": not buy, "fast": 1, "signal": 1, "updated": time.time()}
+                                          for symbol, buy in zip(symbols, signals)}})
+        return {'bot': bot, 'snapshots': snapshots, 'cycle': 0}
+
+    def fanout(state):
+        bot = state['bot']
+        state['cycle'] += 1
+        bot.tickers_ema = state['snapshots'][state['cycle'] % len(state['snapshots'])]
+        bot.subscribe_response(None)
+        bot.sender.pending.clear()
+        bot.sender.ready.clear()
+
+    return measure(f'subscribe_response fan-out {chats} chats', fanout, setup,
+                   repeat=max(scale['repeat'] // 4, 1), items=chats)
+
+
+def bench_tables(scale):
+    symbols = [f'S{i}USDT' for i in range(scale['symbols'])]
+    alerts = [(symbol, i % 2 == 0, i % 2 == 1) for i, symbol in enumerate(symbols)]
+    return [measure(f'list_to_tables {len(symbols)} symbols', lambda _: list_to_tables(symbols, 50, symbols_to_table),
+                    repeat=scale['repeat'], items=len(symbols)),
+            measure(f'list_to_tables {len(alerts)} alerts', lambda _: list_to_tables(alerts, 50, symbols_alerts_to_table),
+                    repeat=scale['repeat'], items=len(alerts))]
+
+
+BENCHMARKS = [bench_parse, bench_indicators, bench_timeframes_checker, bench_fanout, bench_tables]
+
+
+def run(scale) -> list:
+    results = []
+    for benchmark in BENCHMARKS:
+        result = benchmark(scale)
+        results.extend(result if isinstance(result, list) else [result])
+    return results
+
+
+def compare(results, baseline, threshold) -> list:
+    """Names of the benchmarks whose p50 latency grew more than threshold (0.2 = 20%) over the baseline."""
+    previous = {result['name']: result for result in baseline}
+    return [result['name'] for result in results
+            if result['name'] in previous and result['p50_ms'] > previous[result['name']]['p50_ms'] * (1 + threshold)]
+
+
+def print_results(results, baseline=None) -> None:
+    previous = {result['name']: result for result in baseline or []}
+    print(f'{"benchmark":45} {"p50 ms":>10} {"p99 ms":>10} {"items/s":>12} {"peak KB":>10} {"vs base":>8}')
+    for result in results:
+        change = ''
+        if result['name'] in previous:
+            change = f'{result["p50_ms"] / previous[result["name"]]["p50_ms"] - 1:+.0%}'
+        print(f'{result["name"]:45} {result["p50_ms"]:10.3f} {result["p99_ms"]:10.3f} '
+              f'{result["throughput"]:12.0f} {result["peak_kb"]:10.0f} {change:>8}')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Offline benchmarks of the bot pipeline')
+    parser.add_argument('--symbols', type=int, default=400)
+    parser.add_argument('--chats', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--save', help='write the results as baseline json')
+    parser.add_argument('--compare', help='baseline json to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    results = run({'symbols': args.symbols, 'chats': args.chats, 'repeat': args.repeat})
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    print_results(results, baseline)
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2)
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'regressions over {args.threshold:.0%}: {", ".join(regressions)}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,14 +1,38 @@
-from typing import List
+from typing import List, TYPE_CHECKING
 import time
-from binance.client import Client
-from binance.enums import *
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import dotenv_values
-from binance_time_utils import convertToStartTime, convertToInterval
-import pandas as pd
+from binance_time_utils import convertToStartTime, convertToInterval, intervalToMilliseconds, startToMilliseconds
+import numpy as np
 import logging
-from algo_utils import MACD, EMA
+import requests
+from requests.adapters import HTTPAdapter
+from algo_utils import MACD, EMA, IndicatorEngine
+from indicators import DEFAULT_STRATEGY, INDICATORS, lookback, signal_key, strategy_signals
+from kline_resampler import KlineResampler
+from kline_store import klines_to_records
+from metrics import REGISTRY
+from rate_limiter import WeightLimiter
 from utils import symbols_to_table
 
+# python-binance and pandas take most of the startup time, they are imported where they are first needed
+if TYPE_CHECKING:
+    import pandas as pd
+
+KLINES_LIMIT = 1000
+KLINES_WEIGHT = 2
+EXCHANGE_INFO_WEIGHT = 20
+RETRY_STATUS_CODES = (418, 429)
+# candles every timeframe ema signal is evaluated over, the forming one included
+SIGNAL_CANDLES = INDICATORS[DEFAULT_STRATEGY].lookback
+
+FETCH_SECONDS = REGISTRY.histogram('bot_fetch_seconds', 'Latency of one Binance klines request')
+PARSE_SECONDS = REGISTRY.histogram('bot_parse_seconds', 'Time to parse the klines of one symbol')
+COMPUTE_SECONDS = REGISTRY.histogram('bot_compute_seconds', 'Time to compute the indicators of a batch of symbols')
+SYMBOL_FAILURES = REGISTRY.counter('bot_symbol_failures', 'Symbols whose klines could not be fetched', 'symbol')
+REST_WEIGHT = REGISTRY.counter('bot_rest_weight', 'Request weight spent on the Binance REST API')
+USED_WEIGHT = REGISTRY.gauge('bot_rest_used_weight_1m', 'Request weight of the current minute as reported by Binance')
+
 class BinanceClient:
     client = None
     env = None
@@ -17,35 +41,140 @@ class BinanceClient:
     closedOrders = []
     testnet=True
 
-    def __init__(self, testnet = True) -> None:
+    def __init__(self, testnet = True, klineStore = None, client = None, workers = 8, weightLimit = 1200,
+                 retries = 3, retryDelay = 1.0, clock = time.time) -> None:
         self.logger = logging.getLogger('trading_bot.binance_client')
         self.logger.info('creating an instance of BinanceClient')
         self.env = dotenv_values('.env')
         self.testnet = testnet
-        if self.testnet == True:
+        if client is not None:
+            self.client = client
+        elif self.testnet == True:
+            from binance.client import Client
             self.client = Client(api_key=self.env['API_KEY_TEST'], api_secret=self.env['API_SECRET_TEST'], testnet=True)
         else:
+            from binance.client import Client
             self.client = Client(api_key=self.env['API_KEY'], api_secret=self.env['API_SECRET'])
+        self.indicators = IndicatorEngine()
+        self.resamplers = {}
+        self.klineStore = klineStore
+        # (symbol, interval) -> earliest start the kline store was backfilled from
+        self.backfilled = {}
+        self.workers = workers
+        self.retries = retries
+        self.retryDelay = retryDelay
+        # time of the candles, a replay runs it ahead of the wall clock
+        self.clock = clock
+        self.weightLimiter = WeightLimiter(limit=weightLimit)
+        session = getattr(self.client, 'session', None)
+        if session is not None:
+            # one keep-alive connection per worker instead of requests' default pool of 10
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(workers, 1))
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
             
 
-    def getHistoricalData(self, interval, start, symbol) -> pd.DataFrame:
-          rawData = self.client.get_historical_klines(symbol=symbol, interval=interval, start_str=start)
+    def getHistoricalData(self, interval, start, symbol) -> 'pd.DataFrame':
+        return self.convertRecordsToFrame(self.getHistoricalRecords(interval, start, symbol))
+
+    def getHistoricalRecords(self, interval, start, symbol) -> np.ndarray:
+          if self.klineStore is not None:
+              return self.getStoredHistoricalRecords(interval, start, symbol)
+          # get_historical_klines asks for the earliest valid timestamp first, that is a second klines request
+          self.weightLimiter.acquire(2 * KLINES_WEIGHT)
+          REST_WEIGHT.inc(2 * KLINES_WEIGHT)
+          with FETCH_SECONDS.time():
+              rawData = self.client.get_historical_klines(symbol=symbol, interval=interval, start_str=start)
+          self.syncUsedWeight()
           if len(rawData) == 0:
               rawData = [[time.time() * 1000,0,0,0,0,0]]
               print(f'get_historical_klines for symbol {symbol}, data: {rawData}')    
-          frame = self.convertKlinesToFrame(rawData)
-          return frame
+          with PARSE_SECONDS.time():
+              return klines_to_records(rawData)
 
-    # https://binance-docs.github.io/apidocs/spot/en/#compressed-aggregate-trades-list
-    def convertKlinesToFrame(self, rawData):
-        frame = pd.DataFrame(rawData)
-        frame = frame.iloc[:, :6]
-        frame = frame.astype(float)
-        frame.columns = ['Time', 'Open', 'High', 'Low', 'Close', 'Volume']
-        frame = frame.set_index('Time')
-        frame['Time'] = pd.to_datetime( frame.index, unit='ms')
-        frame.index = pd.to_datetime( frame.index, unit='ms')
+    def getStoredHistoricalRecords(self, interval, start, symbol) -> np.ndarray:
+        """Fetch only the candles missing from the kline store and return the window from the store."""
+        startTime = startToMilliseconds(start, self.clock())
+        firstTime = self.klineStore.firstTime(symbol, interval)
+        if firstTime is not None and startTime < firstTime and startTime < self.backfilled.get((symbol, interval), firstTime):
+            # the lookback grew since the store was filled, fetch the candles before the first stored one
+            head = self.fetchKlines(symbol, interval, startTime, firstTime - 1)
+            self.klineStore.prepend(symbol, interval, klines_to_records(head))
+            # a symbol listed after startTime has no older candles, they are not asked for again
+            self.backfilled[(symbol, interval)] = startTime
+        lastTime = self.klineStore.lastTime(symbol, interval)
+        rawData = self.fetchKlines(symbol, interval, startTime if lastTime is None else lastTime + 1)
+        now = self.clock() * 1000
+        closed = 0
+        while closed < len(rawData) and rawData[closed][6] < now:
+            closed += 1
+        with PARSE_SECONDS.time():
+            closedRecords = klines_to_records(rawData[:closed])
+            formingRecords = klines_to_records(rawData[closed:])
+        self.klineStore.append(symbol, interval, closedRecords)
+        records = np.concatenate([self.klineStore.read(symbol, interval, startTime), formingRecords])
+        if len(records) == 0:
+            records = klines_to_records([[self.clock() * 1000,0,0,0,0,0]])
+            self.logger.warning(f'fetchKlines for symbol {symbol} returned no data')
+        return records
+
+    def fetchKlines(self, symbol, interval, startTime, endTime=None) -> List:
+        """Page through the klines endpoint from startTime up to endTime (ms) or now."""
+        rawData = []
+        for batch in self.klinePages(symbol, interval, startTime, endTime):
+            rawData += batch
+        return rawData
+
+    def klinePages(self, symbol, interval, startTime, endTime=None):
+        """Yield the pages of the klines endpoint from startTime up to endTime (ms) or now, oldest first."""
+        bounds = {} if endTime is None else {'endTime': endTime}
+        while True:
+            self.weightLimiter.acquire(KLINES_WEIGHT)
+            REST_WEIGHT.inc(KLINES_WEIGHT)
+            with FETCH_SECONDS.time():
+                batch = self.client.get_klines(symbol=symbol, interval=interval, startTime=startTime, limit=KLINES_LIMIT, **bounds)
+            self.syncUsedWeight()
+            if len(batch) > 0:
+                yield batch
+            if len(batch) < KLINES_LIMIT or (endTime is not None and batch[-1][0] >= endTime):
+                return
+            startTime = batch[-1][0] + 1
+
+    def downloadKlines(self, interval, start, symbol) -> int:
+        """Write the closed candles from start missing in the kline store page by page, returns the rows written.
+
+        Nothing but the current page is held in memory, the head older than the first
+        stored candle is fetched newest page first so every page can be prepended.
+        """
+        startTime = startToMilliseconds(start, self.clock())
+        now = self.clock() * 1000
+        written = 0
+        firstTime = self.klineStore.firstTime(symbol, interval)
+        pageSpan = KLINES_LIMIT * intervalToMilliseconds(interval)
+        pageEnd = None if firstTime is None else firstTime - 1
+        while pageEnd is not None and pageEnd >= startTime:
+            pageStart = max(startTime, pageEnd - pageSpan + 1)
+            # the window holds one page at most, a second request would come back empty
+            batch = next(self.klinePages(symbol, interval, pageStart, pageEnd), [])
+            written += self.klineStore.prepend(symbol, interval, klines_to_records(batch))
+            pageEnd = pageStart - 1
+        lastTime = self.klineStore.lastTime(symbol, interval)
+        for batch in self.klinePages(symbol, interval, startTime if lastTime is None else lastTime + 1):
+            closed = [row for row in batch if row[6] < now]
+            written += self.klineStore.append(symbol, interval, klines_to_records(closed))
+        return written
+
+    def convertRecordsToFrame(self, records) -> 'pd.DataFrame':
+        """DataFrame view (Time index, OHLCV columns) of KLINE_DTYPE records."""
+        import pandas as pd
+        frame = pd.DataFrame({'Open': records['open'], 'High': records['high'], 'Low': records['low'],
+                              'Close': records['close'], 'Volume': records['volume']},
+                             index=pd.DatetimeIndex(records['time'].astype('datetime64[ms]'), name='Time'), copy=False)
         return frame
+
+    # https://binance-docs.github.io/apidocs/spot/en/#compressed-aggregate-trades-list
+    def convertKlinesToFrame(self, rawData) -> 'pd.DataFrame':
+        return self.convertRecordsToFrame(klines_to_records(rawData))
     
 
     def calcMACD(self, interval, start, symbol):
@@ -53,32 +182,125 @@ class BinanceClient:
         frame = MACD(frame)
         return  frame
 
-    def ema_signal(self, interval, start, symbol):
-        frame = self.getHistoricalData(interval, start, symbol)
-        frame = EMA(frame)
-        buy = False
-        sell = False
-        if (len(frame) > 1):
-             buy = frame['EMA_Fast'][-1] > frame['EMA_Signal'][-1] # and frame['EMA_Fast'][-2] > frame['EMA_Signal'][-2]
-             sell = frame['EMA_Fast'][-1] < frame['EMA_Signal'][-1] # and frame['EMA_Fast'][-2] < frame['EMA_Signal'][-2]   
-             self.logger.info(f'Symbol:  {symbol} Fast: {frame["EMA_Fast"][-1]} Signal: { frame["EMA_Signal"][-1]}')
-        return {"buy":buy, "sell": sell, "fast":  frame['EMA_Fast'][-1], "signal": frame['EMA_Signal'][-1]}
+    def ema_closed_signal(self, interval, symbol, times, closes):
+        """Advance the indicator state of symbol with closed candles only and return its ema signal."""
+        with COMPUTE_SECONDS.time():
+            state = self.indicators.advance((symbol, interval), times, closes)
+            values = state.values()
+        fast = values['EMA_Fast']
+        signal = values['EMA_Signal']
+        enough = state.ema_fast.nobs > 1
+        return {"buy": bool(enough and fast > signal), "sell": bool(enough and fast < signal), "fast": fast, "signal": signal,
+                "updated": self.clock()}
         
 
-    def ema_checker(self, interval, start, tickers):
-        result = {}
-        for ticker in tickers:
+    def syncUsedWeight(self) -> None:
+        """Align the weight limiter with the weight Binance reports for the last response."""
+        response = getattr(self.client, 'response', None)
+        usedWeight = response.headers.get('x-mbx-used-weight-1m') if response is not None else None
+        if usedWeight is not None:
+            self.weightLimiter.sync(usedWeight)
+            USED_WEIGHT.set(int(usedWeight))
+
+    def getHistoricalRecordsWithRetry(self, interval, start, symbol) -> np.ndarray:
+        """getHistoricalRecords with exponential backoff, honouring Retry-After on 429/418."""
+        from binance.exceptions import BinanceAPIException, BinanceRequestException
+        for attempt in range(self.retries + 1):
+            try:
+                return self.getHistoricalRecords(interval=interval, start=start, symbol=symbol)
+            except BinanceAPIException as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.retryDelay * 2 ** attempt
+                if e.status_code in RETRY_STATUS_CODES:
+                    retryAfter = e.response.headers.get('Retry-After') if e.response is not None else None
+                    delay = max(delay, float(retryAfter or 0))
+                    self.weightLimiter.block(delay)
+                self.logger.warning(f'klines for {symbol} failed with {e.status_code}, retry in {delay}s')
+                time.sleep(delay)
+            except (BinanceRequestException, requests.exceptions.RequestException) as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.retryDelay * 2 ** attempt
+                self.logger.warning(f'klines for {symbol} failed with {e}, retry in {delay}s')
+                time.sleep(delay)
+
+    def fetchRecords(self, interval, start, tickers) -> dict:
+        """Klines of every ticker that could be fetched, using the worker pool."""
+        def fetch(ticker):
             try:
-                result[ticker] = self.ema_signal(interval=interval, start=start, symbol=ticker)
+                return ticker, self.getHistoricalRecordsWithRetry(interval=interval, start=start, symbol=ticker)
             except Exception:
-                print(f'failed to get ema signal for ticker {ticker}')    
-        return result    
-        
+                self.logger.exception(f'failed to get klines for ticker {ticker}')
+                SYMBOL_FAILURES.inc(labelValue=ticker)
+                return ticker, None
+
+        if self.workers > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                fetched = list(pool.map(fetch, tickers))
+        else:
+            fetched = [fetch(ticker) for ticker in tickers]
+        return {ticker: records for ticker, records in fetched if records is not None}
+
+    def timeframes_checker(self, baseInterval, start, tickers, timeframes, candles=SIGNAL_CANDLES, strategies=None) -> dict:
+        """Strategy signals of several timeframes, returns {signal_key(timeframe, strategy): {ticker: signal}}.
+
+        Only baseInterval klines are fetched, the candles of every timeframe are
+        resampled from them in memory. strategies lists the strategies to evaluate,
+        or maps a timeframe to its strategies, the ema crossover when None. Each
+        strategy looks at its own lookback of the last candles, the forming one
+        included, start has to cover the longest of them. Every signal is stamped
+        with the time it was computed.
+        """
+        if strategies is None:
+            strategies = (DEFAULT_STRATEGY,)
+        if not isinstance(strategies, dict):
+            strategies = {timeframe: strategies for timeframe in timeframes}
+        records = self.fetchRecords(baseInterval, start, tickers)
+        symbols = [ticker for ticker in tickers if ticker in records]
+        resampler = self.resamplerOf(baseInterval)
+        count = max([candles] + [lookback(strategies[timeframe]) for timeframe in timeframes])
+        windows = {timeframe: [] for timeframe in timeframes}
+        for symbol in symbols:
+            # every row but the last is a closed candle, the last one is still forming
+            resampler.update(symbol, records[symbol][:-1], timeframes)
+            for timeframe in timeframes:
+                windows[timeframe].append(resampler.window(symbol, timeframe, records[symbol][-1:], count - 1))
+        result = {}
+        now = self.clock()
+        with COMPUTE_SECONDS.time():
+            for timeframe in timeframes:
+                inputs = {column for strategy in strategies[timeframe] for column in INDICATORS[strategy].inputs}
+                series = {column: [window[column] for window in windows[timeframe]] for column in inputs}
+                for strategy, signals in strategy_signals(symbols, series, strategies[timeframe]).items():
+                    for signal in signals.values():
+                        signal["updated"] = now
+                    result[signal_key(timeframe, strategy)] = signals
+        return result
+
+    def closed_timeframe_signals(self, baseInterval, symbol, records, timeframes) -> dict:
+        """Feed closed baseInterval candles, returns {timeframe: signal} of the timeframes that completed a candle."""
+        completed = self.resamplerOf(baseInterval).update(symbol, records, timeframes)
+        return {timeframe: self.ema_closed_signal(timeframe, symbol, candles['time'], candles['close'])
+                for timeframe, candles in completed.items() if len(candles) > 0}
+
+    def resamplerOf(self, baseInterval) -> KlineResampler:
+        resampler = self.resamplers.get(baseInterval)
+        if resampler is None:
+            resampler = self.resamplers.setdefault(baseInterval, KlineResampler(baseInterval))
+        return resampler
+
+    def get_exchange_info(self) -> dict:
+        """Trading rules and status of every symbol, the source of the SymbolRegistry."""
+        self.weightLimiter.acquire(EXCHANGE_INFO_WEIGHT)
+        REST_WEIGHT.inc(EXCHANGE_INFO_WEIGHT)
+        return self.client.get_exchange_info()
+
     def get_usdt_tickers(self) -> List:
         prices = self.client.get_all_tickers()
-        frame = pd.DataFrame(prices)
-        frame = frame.loc[ (frame.symbol.str.endswith("USDT")) & (frame.symbol.str.contains('DOWN') == False) & (frame.symbol.str.contains('UP') == False) & (frame.symbol.str.contains('BEAR') == False) & (frame.symbol.str.contains('BULL') == False), ['symbol']]
-        symbols = frame.symbol.values.tolist()
+        # leveraged tokens are skipped
+        symbols = [price['symbol'] for price in prices
+                   if price['symbol'].endswith("USDT") and not any(word in price['symbol'] for word in ('DOWN', 'UP', 'BEAR', 'BULL'))]
         return symbols
                 
 
@@ -20,4 +20,47 @@ def convertToInterval(value, unit) -> str:
 
 def convertToStartTime(value, unit, timezone = 'UTC') -> str:
     start = f'{value} {unit} ago {timezone}'
-    return start    
\ No newline at end of file
+    return start    
+
+START_UNITS_MS = {'minute': 60 * 1000, 'hour': 60 * 60 * 1000, 'day': 24 * 60 * 60 * 1000, 'week': 7 * 24 * 60 * 60 * 1000}
+
+def startToMilliseconds(start, now) -> int:
+    """Time (ms) of a start string, the relative ones of convertToStartTime count back from now (seconds)."""
+    parts = start.split()
+    if len(parts) in (3, 4) and parts[0].isdigit() and parts[1].rstrip('s') in START_UNITS_MS and parts[2] == 'ago':
+        return int(now * 1000) - int(parts[0]) * START_UNITS_MS[parts[1].rstrip('s')]
+    from binance.helpers import date_to_milliseconds
+    return date_to_milliseconds(start)
+
+DEFAULT_TIMEFRAME = '1d'
+# kept local so the bot can start without importing python-binance
+INTERVAL_UNITS_MS = {'m': 60 * 1000, 'h': 60 * 60 * 1000, 'd': 24 * 60 * 60 * 1000, 'w': 7 * 24 * 60 * 60 * 1000}
+# 1970-01-01 was a Thursday, Binance weekly candles open on Monday 00:00 UTC
+WEEK_OFFSET_MS = 4 * 24 * 60 * 60 * 1000
+
+def intervalToMilliseconds(interval) -> int:
+    """Length of a kline interval in ms, months have no fixed length and are not supported."""
+    unit = INTERVAL_UNITS_MS.get(interval[-1:])
+    if unit is None or not interval[:-1].isdigit():
+        raise ValueError(f'unsupported interval {interval}')
+    return int(interval[:-1]) * unit
+
+def bucketStart(times, interval):
+    """Open time (ms) of the interval candle holding each of times."""
+    offset = WEEK_OFFSET_MS if interval.endswith('w') else 0
+    return times - (times - offset) % intervalToMilliseconds(interval)
+
+def isTimeframeOf(baseInterval, interval) -> bool:
+    """Whether interval candles can be built from baseInterval candles."""
+    baseMs = intervalToMilliseconds(baseInterval)
+    ms = intervalToMilliseconds(interval)
+    return ms % baseMs == 0 and (not interval.endswith('w') or WEEK_OFFSET_MS % baseMs == 0)
+
+def convertToCandlesStart(candles, intervals, timezone = 'UTC') -> str:
+    """Start time covering the last `candles` candles of the longest of intervals."""
+    minutes = candles * max(intervalToMilliseconds(interval) for interval in intervals) // 60000
+    return convertToStartTime(minutes, 'minutes', timezone)
+
+def refreshPause(intervals, maxPause = 3600) -> float:
+    """Seconds between two polls: as often as the shortest interval closes a candle, at most maxPause."""
+    return min(maxPause, min(intervalToMilliseconds(interval) for interval in intervals) / 1000)
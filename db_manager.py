@@ -1,59 +1,147 @@
 import sqlite3
+import threading
 import atexit
+import json
+import time
+from typing import List
+from binance_time_utils import DEFAULT_TIMEFRAME
+from indicators import DEFAULT_STRATEGY
 
 sql_create_jobs_table = """ CREATE TABLE IF NOT EXISTS jobs (
                                         id integer PRIMARY KEY AUTOINCREMENT,
                                         chat_id text NOT NULL,
-                                        ticker text NOT NULL
+                                        ticker text NOT NULL,
+                                        timeframe text NOT NULL DEFAULT '1d',
+                                        strategy text NOT NULL DEFAULT 'ema'
                                     ); """
+
+# older databases may hold duplicated subscriptions, keep the first one before adding the unique index
+sql_delete_duplicated_jobs = """ DELETE FROM jobs WHERE id NOT IN (SELECT MIN(id) FROM jobs GROUP BY chat_id, ticker, timeframe, strategy); """
+
+sql_create_jobs_index = """ CREATE UNIQUE INDEX IF NOT EXISTS jobs_subscription ON jobs (chat_id, ticker, timeframe, strategy); """
+
+sql_create_signals_table = """ CREATE TABLE IF NOT EXISTS sent_signals (
+                                        chat_id text NOT NULL,
+                                        ticker text NOT NULL,
+                                        timeframe text NOT NULL DEFAULT '1d',
+                                        strategy text NOT NULL DEFAULT 'ema',
+                                        signal text NOT NULL,
+                                        PRIMARY KEY (chat_id, ticker, timeframe, strategy)
+                                    ) WITHOUT ROWID; """
+
+sql_create_state_table = """ CREATE TABLE IF NOT EXISTS bot_state (
+                                        name text PRIMARY KEY,
+                                        value text NOT NULL,
+                                        updated real NOT NULL
+                                    ); """
+
+# databases from before timeframes and strategies only had the daily ema subscriptions
+sql_upgrade_jobs_table = """ BEGIN;
+                             ALTER TABLE jobs ADD COLUMN timeframe text NOT NULL DEFAULT '1d';
+                             ALTER TABLE jobs ADD COLUMN strategy text NOT NULL DEFAULT 'ema';
+                             COMMIT; """
+
 class DbManager:
     db_file = None
-    
+
     def __init__(self, db_file):
       self.db_file = db_file
+      self.lock = threading.Lock()
+      # one connection for the lifetime of the bot, shared by the handler threads under the lock
+      self.con = sqlite3.connect(self.db_file, check_same_thread=False)
+      self.con.execute("PRAGMA journal_mode=WAL")
+      self.con.execute("PRAGMA synchronous=NORMAL")
       self.create_table(sql_create_jobs_table)
-    
-    
+      if 'strategy' not in self.columns('jobs'):
+          self.executescript(sql_upgrade_jobs_table)
+      self.execute(sql_delete_duplicated_jobs)
+      self.execute(sql_create_jobs_index)
+      self.create_table(sql_create_signals_table)
+      self.create_table(sql_create_state_table)
+      atexit.register(self.close)
+
+
     def create_table(self, create_table_sql):
-        con = sqlite3.connect(self.db_file)  
-        cursor = con.cursor()
-        cursor.execute(create_table_sql)
-        con.commit()
-        con.close()
-
-    def insertJob(self, chat_id, ticker) -> None:
-        con =sqlite3.connect(self.db_file)  
-        cursor = con.cursor()
-        cursor.execute("INSERT INTO jobs VALUES (?,?,?)", (None,chat_id, ticker))
-        con.commit()
-        con.close()  
-
-    def deleteJob(self, chat_id, ticker) -> None:
-        con = sqlite3.connect(self.db_file)  
-        cursor = con.cursor()
-        cursor.execute("DELETE FROM jobs WHERE chat_id=? AND ticker=?", (chat_id, ticker))
-        con.commit()
-        con.close()
+        self.execute(create_table_sql)
+
+    def execute(self, sql, parameters=()):
+        with self.lock, self.con:
+            self.con.execute(sql, parameters)
+
+    def executescript(self, sql):
+        with self.lock:
+            self.con.executescript(sql)
+
+    def columns(self, table, missing=()) -> List[str]:
+        """Column names of a table, `missing` when the table does not exist."""
+        with self.lock:
+            columns = [row[1] for row in self.con.execute(f"PRAGMA table_info({table})")]
+        return columns or list(missing)
+
+    def close(self) -> None:
+        with self.lock:
+            self.con.close()
+
+    def insertJob(self, chat_id, ticker, timeframe=DEFAULT_TIMEFRAME, strategy=DEFAULT_STRATEGY) -> None:
+        self.insertJobs([(chat_id, ticker, timeframe, strategy)])
+
+    def insertJobs(self, jobs: List) -> None:
+        """Insert (chat_id, ticker, timeframe, strategy) subscriptions in one transaction, existing ones are kept as they are."""
+        with self.lock, self.con:
+            self.con.executemany("INSERT INTO jobs (chat_id, ticker, timeframe, strategy) VALUES (?,?,?,?) "
+                                 "ON CONFLICT (chat_id, ticker, timeframe, strategy) DO NOTHING", jobs)
+
+    def deleteJob(self, chat_id, ticker, timeframe=DEFAULT_TIMEFRAME, strategy=DEFAULT_STRATEGY) -> None:
+        self.execute("DELETE FROM jobs WHERE chat_id=? AND ticker=? AND timeframe=? AND strategy=?",
+                     (chat_id, ticker, timeframe, strategy))
 
     def getJobs(self):
-        con = sqlite3.connect(self.db_file)
-        cursor = con.cursor()
-        cursor.execute("SELECT * from jobs")
-        rows = cursor.fetchall()
-        con.close()
-        return rows
+        with self.lock:
+            return self.con.execute("SELECT id, chat_id, ticker, timeframe, strategy from jobs").fetchall()
+
+    def saveSignalChanges(self, timeframe, strategy, clearedChats: List, signals: List) -> None:
+        """Apply changes of the last sent signals of one timeframe and strategy in one transaction.
+
+        The rows of clearedChats are deleted first, then the (chat_id, ticker, signal)
+        rows are upserted, an empty signal deletes its row.
+        """
+        with self.lock, self.con:
+            self.con.executemany("DELETE FROM sent_signals WHERE chat_id=? AND timeframe=? AND strategy=?",
+                                 [(chat_id, timeframe, strategy) for chat_id in clearedChats])
+            self.con.executemany("DELETE FROM sent_signals WHERE chat_id=? AND ticker=? AND timeframe=? AND strategy=?",
+                                 [(chat_id, ticker, timeframe, strategy) for chat_id, ticker, signal in signals if not signal])
+            self.con.executemany("INSERT INTO sent_signals (chat_id, ticker, timeframe, strategy, signal) VALUES (?,?,?,?,?) "
+                                 "ON CONFLICT (chat_id, ticker, timeframe, strategy) DO UPDATE SET signal=excluded.signal",
+                                 [(chat_id, ticker, timeframe, strategy, signal) for chat_id, ticker, signal in signals if signal])
+
+    def getSignals(self):
+        with self.lock:
+            return self.con.execute("SELECT chat_id, ticker, timeframe, strategy, signal from sent_signals").fetchall()
+
+    def saveState(self, name, value, updated=None) -> None:
+        """Persist a json serializable value under name, replacing the previous one."""
+        self.execute("INSERT INTO bot_state (name, value, updated) VALUES (?,?,?) "
+                     "ON CONFLICT (name) DO UPDATE SET value=excluded.value, updated=excluded.updated",
+                     (name, json.dumps(value), time.time() if updated is None else updated))
+
+    def getState(self, name):
+        """(value, updated) of a persisted value, None when it was never saved."""
+        with self.lock:
+            row = self.con.execute("SELECT value, updated FROM bot_state WHERE name=?", (name,)).fetchone()
+        return None if row is None else (json.loads(row[0]), row[1])
 
 
 if __name__ == '__main__':
     db = DbManager('test.db')
     db.insertJob("chat1", "BTCUSDT")
     db.insertJob("chat2", "DOGE")
-    db.insertJob("chat3", "ETH")
+    db.insertJob("chat3", "ETH", "4h")
+    db.insertJob("chat3", "ETH", "4h", "macd")
     rows = db.getJobs()
     for row in rows:
         print(row)
-    db.deleteJob("chat1", "BTCUSDT")    
+    db.deleteJob("chat1", "BTCUSDT")
     print("job deleted")
     rows = db.getJobs()
     for row in rows:
-        print(row)
\ No newline at end of file
+        print(row)
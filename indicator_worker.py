@@ -0,0 +1,121 @@
+"""Indicator worker: computes the signals of one hash shard of the traded symbols.
+
+Every worker owns the symbols whose crc32 falls into its shard and publishes their
+{timeframe: {ticker: signal}} to the shared SnapshotStore after each cycle. The
+Telegram bot reads that store when SNAPSHOT_STORE is set in .env, so ingest scales
+with the number of workers while the bot process only answers users.
+
+    python indicator_worker.py --shards 4               # 4 local processes, one per shard
+    python indicator_worker.py --shards 4 --shard 2     # only shard 2, e.g. on another node
+"""
+import argparse
+import logging
+import multiprocessing
+import time
+import zlib
+from typing import List
+from dotenv import dotenv_values
+from binance_client import BinanceClient, SIGNAL_CANDLES
+from binance_time_utils import convertToCandlesStart, refreshPause
+from indicators import DEFAULT_STRATEGY, lookback
+from kline_store import KlineStore
+from metrics import REGISTRY, MetricsServer
+from snapshot_store import SnapshotStore
+from symbol_registry import SymbolRegistry
+
+CYCLE_SECONDS = REGISTRY.histogram('bot_cycle_seconds', 'Duration of one indicator cycle over all tickers')
+CYCLE_FAILURES = REGISTRY.counter('bot_cycle_failures', 'Indicator cycles that raised')
+WEIGHT_LIMIT = 1200
+
+
+def shard_of(symbol, shards) -> int:
+    # crc32 rather than hash(), which is salted per process
+    return zlib.crc32(symbol.encode()) % shards
+
+
+def shard_symbols(symbols: List, shard, shards) -> List:
+    return [symbol for symbol in symbols if shard_of(symbol, shards) == shard]
+
+
+class IndicatorWorker:
+    """Recomputes the signals of one shard in a loop and publishes them to a SnapshotStore."""
+
+    def __init__(self, bClient, store: SnapshotStore, shard=0, shards=1, baseInterval='15m', timeframes=('1d',),
+                 candles=SIGNAL_CANDLES, sleep=time.sleep, registry: SymbolRegistry = None, strategies=(DEFAULT_STRATEGY,)):
+        self.logger = logging.getLogger(f'trading_bot.indicator_worker.{shard}')
+        self.bClient = bClient
+        self.store = store
+        self.shard = shard
+        self.shards = shards
+        self.baseInterval = baseInterval
+        self.timeframes = list(timeframes)
+        self.candles = candles
+        self.sleep = sleep
+        # the workers do not know the subscriptions, they compute every strategy they are given
+        self.strategies = list(strategies)
+        self.registry = SymbolRegistry() if registry is None else registry
+        self.start = convertToCandlesStart(max(candles, lookback(self.strategies)), self.timeframes)
+
+    def symbols(self) -> List:
+        # exchangeInfo is asked again once the registry ttl expired, so new listings are picked up
+        self.registry.refresh(self.bClient.get_exchange_info)
+        return shard_symbols(self.registry.symbols, self.shard, self.shards)
+
+    def runCycle(self) -> int:
+        """Compute and publish the signals of the shard once, returns the published version."""
+        started = time.perf_counter()
+        signals = self.bClient.timeframes_checker(self.baseInterval, self.start, self.symbols(), self.timeframes,
+                                                  self.candles, self.strategies)
+        version = self.store.publish(self.shard, self.shards, signals)
+        CYCLE_SECONDS.observe(time.perf_counter() - started)
+        self.logger.info(f'published version {version} of shard {self.shard}/{self.shards} in {CYCLE_SECONDS.last:.2f}s')
+        return version
+
+    def run(self, config) -> None:
+        pause = refreshPause(self.timeframes)
+        while config["keepRunning"]:
+            try:
+                self.runCycle()
+            except Exception:
+                self.logger.exception("An exception was thrown!")
+                CYCLE_FAILURES.inc()
+            self.sleep(pause)
+
+
+def worker_main(shard, shards, args, weightLimit) -> None:
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    env = dotenv_values('.env')
+    if args.metrics_port:
+        MetricsServer(args.metrics_port + shard).start()
+    bClient = BinanceClient(testnet=False, klineStore=KlineStore(args.klines), weightLimit=weightLimit)
+    registry = SymbolRegistry(env.get('QUOTE_ASSETS', 'USDT').split(','), int(env.get('SYMBOLS_TTL', 3600)))
+    worker = IndicatorWorker(bClient, SnapshotStore(args.store), shard, shards,
+                             env.get('BASE_INTERVAL', '15m'), env.get('TIMEFRAMES', '15m,1h,4h,1d').split(','),
+                             registry=registry, strategies=env.get('STRATEGIES', 'ema,macd,rsi,bollinger').split(','))
+    worker.run({"keepRunning": True})
+
+
+def main(argv=None) -> None:
+    env = dotenv_values('.env')
+    parser = argparse.ArgumentParser(description='Compute the signals of hash shards of the traded symbols')
+    parser.add_argument('--shards', type=int, default=1)
+    parser.add_argument('--shard', type=int, help='run only this shard, otherwise one local process per shard')
+    parser.add_argument('--store', default=env.get('SNAPSHOT_STORE', 'snapshots.db'))
+    parser.add_argument('--klines', default='klines')
+    parser.add_argument('--metrics-port', type=int, help='shard i serves /metrics on this port + i')
+    args = parser.parse_args(argv)
+
+    if args.shard is not None:
+        worker_main(args.shard, args.shards, args, WEIGHT_LIMIT)
+        return
+    # local processes share the request weight budget of one IP
+    processes = [multiprocessing.Process(target=worker_main, args=(shard, args.shards, args, WEIGHT_LIMIT // args.shards))
+                 for shard in range(args.shards)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""Indicator plugins evaluated over (symbols x time) panels of the candles of one timeframe.
+
+Every indicator declares the candle columns it reads and how many of the last
+candles it looks at. A batch builds the panels of the requested inputs once and
+the indicators share intermediate series through the PanelContext, e.g. an EMA
+used by two strategies is computed once. Strategies nobody asked for cost nothing.
+"""
+from typing import Dict, Iterable, List
+import numpy as np
+from algo_utils import closes_to_panel, ewm_panel
+
+DEFAULT_STRATEGY = 'ema'
+INDICATORS = {}
+
+
+def register(indicator):
+    INDICATORS[indicator.name] = indicator
+    return indicator
+
+
+def signal_key(timeframe, strategy=DEFAULT_STRATEGY) -> str:
+    """Key of the signals of a strategy in {key: {ticker: signal}} snapshots, ema signals keep the bare timeframe."""
+    return timeframe if strategy == DEFAULT_STRATEGY else f'{timeframe}:{strategy}'
+
+
+def lookback(strategies: Iterable) -> int:
+    """Candles the given strategies need, the forming one included."""
+    return max((INDICATORS[strategy].lookback for strategy in strategies), default=1)
+
+
+class PanelContext:
+    """Right aligned (symbols x time) panels of candle columns, intermediate results are computed once."""
+
+    def __init__(self, series: Dict[str, List]):
+        self.panels = {column: closes_to_panel(values) for column, values in series.items()}
+        self.cache = {}
+
+    def memo(self, key, compute):
+        if key not in self.cache:
+            self.cache[key] = compute()
+        return self.cache[key]
+
+    def column(self, name, lookback) -> np.ndarray:
+        return self.panels[name][:, -lookback:]
+
+    def observed(self, name, lookback) -> np.ndarray:
+        """Candles each row holds within the lookback."""
+        return self.memo(('observed', name, lookback), lambda: (~np.isnan(self.column(name, lookback))).sum(axis=1))
+
+    def ewm(self, name, lookback, span, adjust=False, min_periods=0) -> np.ndarray:
+        return self.memo(('ewm', name, lookback, span, adjust, min_periods),
+                         lambda: ewm_panel(self.column(name, lookback), span, adjust, min_periods))
+
+
+class Indicator:
+    """A strategy giving buy/sell flags from the last values of an indicator.
+
+    compute() returns {field: array with one value per row}, buy and sell included.
+    labels names the other fields for /ticker.
+    """
+    name = None
+    inputs = ('close',)
+    lookback = 1
+    labels = {}
+
+    def compute(self, context: PanelContext) -> Dict[str, np.ndarray]:
+        raise NotImplementedError
+
+
+class EmaCrossover(Indicator):
+    """Buy while the fast EMA is above the signal EMA."""
+    name = 'ema'
+    labels = {'fast': 'EMA fast', 'signal': 'EMA Signal'}
+
+    def __init__(self, fast=5, signal=10, lookback=30):
+        self.fast = fast
+        self.signal = signal
+        self.lookback = lookback
+
+    def compute(self, context):
+        fast = context.ewm('close', self.lookback, self.fast)[:, -1]
+        signal = context.ewm('close', self.lookback, self.signal)[:, -1]
+        # a single candle gives no signal
+        enough = context.observed('close', self.lookback) > 1
+        return {'buy': enough & (fast > signal), 'sell': enough & (fast < signal), 'fast': fast, 'signal': signal}
+
+
+class MacdCrossover(Indicator):
+    """Buy while the MACD line is above its signal line, same EMAs as algo_utils.MACD."""
+    name = 'macd'
+    labels = {'macd': 'MACD', 'macd_signal': 'MACD Signal'}
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = fast
+        self.slow = slow
+        self.signal = signal
+        self.lookback = slow + signal
+
+    def compute(self, context):
+        macd = context.memo(('macd', self.lookback, self.fast, self.slow), lambda:
+                            context.ewm('close', self.lookback, self.fast, adjust=True, min_periods=self.fast) -
+                            context.ewm('close', self.lookback, self.slow, adjust=True, min_periods=self.slow))
+        signal = ewm_panel(macd, self.signal, adjust=True, min_periods=self.signal)[:, -1]
+        macd = macd[:, -1]
+        return {'buy': macd > signal, 'sell': macd < signal, 'macd': macd, 'macd_signal': signal}
+
+
+class RsiReversal(Indicator):
+    """Buy when the RSI is oversold, sell when it is overbought."""
+    name = 'rsi'
+    labels = {'rsi': 'RSI'}
+
+    def __init__(self, period=14, oversold=30, overbought=70):
+        self.period = period
+        self.oversold = oversold
+        self.overbought = overbought
+        # Wilder's smoothing needs about two periods to forget its seed
+        self.lookback = 2 * period + 2
+
+    def compute(self, context):
+        delta = np.diff(context.column('close', self.lookback), axis=1)
+        # Wilder's smoothing is an EMA with alpha 1 / period, np.maximum keeps the NaN padding
+        span = 2 * self.period - 1
+        gain = ewm_panel(np.maximum(delta, 0), span, min_periods=self.period)[:, -1]
+        loss = ewm_panel(np.maximum(-delta, 0), span, min_periods=self.period)[:, -1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = 100 * gain / (gain + loss)
+        return {'buy': rsi < self.oversold, 'sell': rsi > self.overbought, 'rsi': rsi}
+
+
+class BollingerBreakout(Indicator):
+    """Buy when the close drops below the lower band, sell when it rises above the upper band."""
+    name = 'bollinger'
+    labels = {'middle': 'BB middle', 'upper': 'BB upper', 'lower': 'BB lower'}
+
+    def __init__(self, period=20, width=2.0):
+        self.period = period
+        self.width = width
+        self.lookback = period
+
+    def compute(self, context):
+        closes = context.column('close', self.lookback)
+        # rows with fewer than period candles hold NaN padding and get NaN bands
+        with np.errstate(invalid='ignore'):
+            middle = closes.mean(axis=1)
+            deviation = closes.std(axis=1, ddof=1)
+        upper = middle + self.width * deviation
+        lower = middle - self.width * deviation
+        close = closes[:, -1]
+        return {'buy': close < lower, 'sell': close > upper, 'middle': middle, 'upper': upper, 'lower': lower}
+
+
+register(EmaCrossover())
+register(MacdCrossover())
+register(RsiReversal())
+register(BollingerBreakout())
+
+
+def strategy_signals(symbols: List, series: Dict[str, List], strategies: Iterable) -> Dict[str, dict]:
+    """{strategy: {symbol: signal}} of the candle columns in series, one array per symbol and column."""
+    if not symbols:
+        return {strategy: {} for strategy in strategies}
+    context = PanelContext(series)
+    result = {}
+    for strategy in strategies:
+        values = {field: array.tolist() for field, array in INDICATORS[strategy].compute(context).items()}
+        result[strategy] = {symbol: {field: column[row] for field, column in values.items()}
+                            for row, symbol in enumerate(symbols)}
+    return result
@@ -0,0 +1,94 @@
+import threading
+from typing import Dict, List
+import numpy as np
+from binance_time_utils import bucketStart, intervalToMilliseconds, isTimeframeOf
+from kline_store import KLINE_DTYPE
+
+EMPTY = np.empty(0, dtype=KLINE_DTYPE)
+
+
+def resample(records: np.ndarray, interval) -> np.ndarray:
+    """OHLCV candles of interval built from time sorted KLINE_DTYPE records, one per bucket holding records."""
+    if len(records) == 0:
+        return EMPTY.copy()
+    buckets = bucketStart(records['time'], interval)
+    starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+    ends = np.append(starts[1:], len(records)) - 1
+    candles = np.empty(len(starts), dtype=KLINE_DTYPE)
+    candles['time'] = buckets[starts]
+    candles['open'] = records['open'][starts]
+    candles['high'] = np.maximum.reduceat(records['high'], starts)
+    candles['low'] = np.minimum.reduceat(records['low'], starts)
+    candles['close'] = records['close'][ends]
+    candles['volume'] = np.add.reduceat(records['volume'], starts)
+    return candles
+
+
+class KlineResampler:
+    """Incremental OHLCV resampling of closed base interval candles into higher timeframes.
+
+    For every (symbol, interval) it keeps the last `keep` completed candles and the
+    base candles of the bucket that is still open, so an update only resamples the
+    new base candles. A bucket is complete once its last base candle has closed.
+    """
+
+    def __init__(self, baseInterval, keep=64):
+        self.baseInterval = baseInterval
+        self.baseMs = intervalToMilliseconds(baseInterval)
+        self.keep = keep
+        self.closed: Dict[tuple, np.ndarray] = {}
+        self.partial: Dict[tuple, np.ndarray] = {}
+        self.lastTime: Dict[tuple, int] = {}
+        self.lock = threading.Lock()
+
+    def update(self, symbol, records: np.ndarray, intervals: List) -> Dict[str, np.ndarray]:
+        """Add closed base candles of symbol, returns {interval: candles they completed}."""
+        completed = {}
+        with self.lock:
+            for interval in intervals:
+                completed[interval] = self._update((symbol, interval), records, interval)
+        return completed
+
+    def _update(self, key, records, interval) -> np.ndarray:
+        if not isTimeframeOf(self.baseInterval, interval):
+            raise ValueError(f'{interval} candles can not be built from {self.baseInterval} candles')
+        last = self.lastTime.get(key)
+        if last is None and len(records) > 0:
+            # the first bucket is only whole when the history starts at its open
+            first = bucketStart(records['time'][0], interval)
+            if first != records['time'][0]:
+                records = records[bucketStart(records['time'], interval) != first]
+        elif last is not None:
+            records = records[records['time'] > last]
+        if len(records) == 0:
+            return EMPTY
+        self.lastTime[key] = int(records['time'][-1])
+        pending = np.concatenate([self.partial.get(key, EMPTY), records])
+        candles = resample(pending, interval)
+        done = candles['time'] + intervalToMilliseconds(interval) <= self.lastTime[key] + self.baseMs
+        self.partial[key] = EMPTY if done[-1] else pending[bucketStart(pending['time'], interval) == candles['time'][-1]]
+        completed = candles[done]
+        if len(completed) > 0:
+            self.closed[key] = np.concatenate([self.closed.get(key, EMPTY), completed])[-self.keep:]
+        return completed
+
+    def window(self, symbol, interval, forming: np.ndarray = None, count=None) -> np.ndarray:
+        """The last count completed candles followed by the candle still forming, if any.
+
+        forming holds base candles newer than the closed ones passed to update, e.g.
+        the base candle that is still open.
+        """
+        key = (symbol, interval)
+        with self.lock:
+            closed = self.closed.get(key, EMPTY)
+            pending = self.partial.get(key, EMPTY)
+            last = self.lastTime.get(key)
+        if forming is not None and len(forming) > 0:
+            pending = np.concatenate([pending, forming if last is None else forming[forming['time'] > last]])
+        closed = closed if count is None else closed[max(len(closed) - count, 0):]
+        return np.concatenate([closed, resample(pending, interval)])
+
+    def reset(self, symbol, interval) -> None:
+        with self.lock:
+            for state in (self.closed, self.partial, self.lastTime):
+                state.pop((symbol, interval), None)
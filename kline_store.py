@@ -0,0 +1,117 @@
+import os
+from typing import List
+import numpy as np
+
+KLINE_COLUMNS = ['time', 'open', 'high', 'low', 'close', 'volume']
+KLINE_DTYPE = np.dtype([('time', '<i8'), ('open', '<f8'), ('high', '<f8'),
+                        ('low', '<f8'), ('close', '<f8'), ('volume', '<f8')])
+
+
+def klines_to_records(rawData: List) -> np.ndarray:
+    """Parse raw klines (open time, open, high, low, close, volume, ...) straight into KLINE_DTYPE records.
+
+    The payload is transposed once with zip and every column is converted into its
+    slot of a preallocated array, prices arrive as strings and are parsed by numpy.
+    """
+    records = np.empty(len(rawData), dtype=KLINE_DTYPE)
+    if len(rawData) == 0:
+        return records
+    columns = list(zip(*rawData))
+    for i, column in enumerate(KLINE_COLUMNS):
+        records[column] = np.array(columns[i], dtype=KLINE_DTYPE[column])
+    return records
+
+
+class KlineStore:
+    """Append-only columnar kline files, one directory per interval/symbol and one raw file per column.
+
+    Only closed candles are stored, open times are strictly increasing so the
+    first and last stored open times tell what is missing. Columns are read back through
+    np.memmap so a window read only touches the pages it needs.
+    """
+    root = None
+
+    def __init__(self, root):
+        self.root = root
+
+    def _dir(self, symbol, interval) -> str:
+        return os.path.join(self.root, interval, symbol)
+
+    def _path(self, symbol, interval, column) -> str:
+        return os.path.join(self._dir(symbol, interval), f'{column}.bin')
+
+    def size(self, symbol, interval) -> int:
+        # a crash between column writes can leave columns of different length, the shortest one wins
+        sizes = []
+        for column in KLINE_COLUMNS:
+            path = self._path(symbol, interval, column)
+            sizes.append(os.path.getsize(path) // 8 if os.path.exists(path) else 0)
+        return min(sizes)
+
+    def _column(self, symbol, interval, column, length):
+        if length == 0:
+            return np.empty(0, dtype=KLINE_DTYPE[column])
+        return np.memmap(self._path(symbol, interval, column), dtype=KLINE_DTYPE[column], mode='r', shape=(length,))
+
+    def lastTime(self, symbol, interval):
+        """Open time (ms) of the last stored candle or None if nothing is stored."""
+        length = self.size(symbol, interval)
+        if length == 0:
+            return None
+        return int(self._column(symbol, interval, 'time', length)[-1])
+
+    def firstTime(self, symbol, interval):
+        """Open time (ms) of the first stored candle or None if nothing is stored."""
+        length = self.size(symbol, interval)
+        if length == 0:
+            return None
+        return int(self._column(symbol, interval, 'time', 1)[0])
+
+    def append(self, symbol, interval, records: np.ndarray) -> int:
+        """Append closed candles newer than the last stored one, returns the number of rows written."""
+        length = self.size(symbol, interval)
+        if length > 0:
+            last = int(self._column(symbol, interval, 'time', length)[-1])
+            records = records[records['time'] > last]
+        if len(records) == 0:
+            return 0
+        os.makedirs(self._dir(symbol, interval), exist_ok=True)
+        for column in KLINE_COLUMNS:
+            path = self._path(symbol, interval, column)
+            with open(path, 'r+b' if os.path.exists(path) else 'wb') as file:
+                file.truncate(length * 8)
+                file.seek(length * 8)
+                file.write(np.ascontiguousarray(records[column]).tobytes())
+        return len(records)
+
+    def prepend(self, symbol, interval, records: np.ndarray) -> int:
+        """Insert closed candles older than the first stored one, returns the number of rows written.
+
+        Only needed when the lookback grows, so the columns are simply rewritten.
+        """
+        length = self.size(symbol, interval)
+        if length == 0:
+            return self.append(symbol, interval, records)
+        stored = self.read(symbol, interval)
+        records = records[records['time'] < stored['time'][0]]
+        if len(records) == 0:
+            return 0
+        # every column is written before any is replaced, so a crash leaves the old columns
+        for column in KLINE_COLUMNS:
+            with open(self._path(symbol, interval, column) + '.new', 'wb') as file:
+                file.write(np.ascontiguousarray(records[column]).tobytes())
+                file.write(np.ascontiguousarray(stored[column]).tobytes())
+        for column in KLINE_COLUMNS:
+            path = self._path(symbol, interval, column)
+            os.replace(path + '.new', path)
+        return len(records)
+
+    def read(self, symbol, interval, startTime=None) -> np.ndarray:
+        """Return the stored candles with open time >= startTime (ms) as KLINE_DTYPE records."""
+        length = self.size(symbol, interval)
+        times = self._column(symbol, interval, 'time', length)
+        first = 0 if startTime is None else int(np.searchsorted(times, startTime, side='left'))
+        records = np.empty(length - first, dtype=KLINE_DTYPE)
+        for column in KLINE_COLUMNS:
+            records[column] = self._column(symbol, interval, column, length)[first:]
+        return records
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+import websockets
+from binance_time_utils import intervalToMilliseconds
+from kline_store import klines_to_records
+
+STREAM_URL = 'wss://stream.binance.com:9443/stream'
+# Binance allows 1024 streams per connection and 5 incoming messages per second
+MAX_STREAMS_PER_CONNECTION = 1024
+STREAMS_PER_SUBSCRIBE = 200
+SUBSCRIBE_PAUSE = 0.25
+
+
+class KlineStream:
+    """Streams closed klines of the tracked symbols over combined WebSocket streams.
+
+    Every closed candle advances the indicator state of BinanceClient and the new
+    signal of every timeframe that completed a candle with it is handed to
+    onSignal(symbol, timeframe, signal) right away. Each (re)connect first
+    backfills the candles missed while disconnected over REST, so the indicator
+    state never has a gap. onStatus(connected) is told when a connection drops and
+    when all of them are streaming again.
+    """
+
+    def __init__(self, bClient, symbols: List, interval, start, onSignal: Callable, url=STREAM_URL,
+                 reconnectDelay=1.0, maxReconnectDelay=60.0, timeframes: List = None, onStatus: Callable = None):
+        self.logger = logging.getLogger('trading_bot.kline_stream')
+        self.bClient = bClient
+        self.symbols = list(symbols)
+        self.interval = interval
+        self.intervalMs = intervalToMilliseconds(interval)
+        self.start = start
+        self.onSignal = onSignal
+        self.onStatus = onStatus
+        # connections not streaming yet or any more
+        self.down = set()
+        self.timeframes = list(timeframes or [interval])
+        self.url = url
+        self.reconnectDelay = reconnectDelay
+        self.maxReconnectDelay = maxReconnectDelay
+        self.keepRunning = True
+        self.connections = 0
+        self.loop = None
+        self.thread = None
+
+    def backfill(self, symbols: List) -> None:
+        """Feed the closed candles missing from the indicator state through REST."""
+        def fill(symbol):
+            try:
+                records = self.bClient.getHistoricalRecordsWithRetry(interval=self.interval, start=self.start, symbol=symbol)
+                closed = records[records['time'] + self.intervalMs <= self.bClient.clock() * 1000]
+                self.publish(symbol, closed)
+            except Exception:
+                self.logger.exception(f'failed to backfill klines for {symbol}')
+
+        with ThreadPoolExecutor(max_workers=max(self.bClient.workers, 1)) as pool:
+            list(pool.map(fill, symbols))
+
+    def handle(self, message) -> None:
+        data = json.loads(message).get('data')
+        if data is None or data.get('e') != 'kline':
+            return
+        kline = data['k']
+        if not kline['x']:
+            return
+        symbol = kline['s']
+        records = klines_to_records([[kline['t'], kline['o'], kline['h'], kline['l'], kline['c'], kline['v']]])
+        if self.bClient.klineStore is not None:
+            self.bClient.klineStore.append(symbol, self.interval, records)
+        self.publish(symbol, records)
+
+    def publish(self, symbol, records) -> None:
+        """Advance the timeframes of symbol with closed candles and hand over the new signals."""
+        if len(records) == 0:
+            return
+        for timeframe, signal in self.bClient.closed_timeframe_signals(self.interval, symbol, records, self.timeframes).items():
+            self.onSignal(symbol, timeframe, signal)
+
+    async def subscribe(self, websocket, symbols: List) -> None:
+        streams = [f'{symbol.lower()}@kline_{self.interval}' for symbol in symbols]
+        for i in range(0, len(streams), STREAMS_PER_SUBSCRIBE):
+            await websocket.send(json.dumps({'method': 'SUBSCRIBE', 'params': streams[i:i + STREAMS_PER_SUBSCRIBE], 'id': i + 1}))
+            await asyncio.sleep(SUBSCRIBE_PAUSE)
+
+    def status(self, connection, up) -> None:
+        if up:
+            self.down.discard(connection)
+        else:
+            self.down.add(connection)
+        if self.onStatus is not None:
+            self.onStatus(not self.down)
+
+    async def runConnection(self, connection, symbols: List) -> None:
+        delay = self.reconnectDelay
+        while self.keepRunning:
+            try:
+                async with websockets.connect(self.url) as websocket:
+                    self.connections += 1
+                    # subscribe first so nothing closes unseen while the backfill runs
+                    await self.subscribe(websocket, symbols)
+                    await asyncio.get_running_loop().run_in_executor(None, self.backfill, symbols)
+                    self.status(connection, True)
+                    delay = self.reconnectDelay
+                    async for message in websocket:
+                        self.handle(message)
+                self.logger.info('kline stream closed, reconnecting')
+                self.status(connection, False)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.logger.exception(f'kline stream failed, reconnecting in {delay}s')
+                self.status(connection, False)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.maxReconnectDelay)
+
+    async def run(self) -> None:
+        groups = [self.symbols[i:i + MAX_STREAMS_PER_CONNECTION]
+                  for i in range(0, len(self.symbols), MAX_STREAMS_PER_CONNECTION)]
+        self.down = set(range(len(groups)))
+        await asyncio.gather(*[self.runConnection(connection, group) for connection, group in enumerate(groups)])
+
+    def __run__(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.loop.run_until_complete(self.run())
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.loop.close()
+
+    def startThread(self) -> threading.Thread:
+        self.thread = threading.Thread(target=self.__run__, daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self) -> None:
+        self.keepRunning = False
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(lambda: [task.cancel() for task in asyncio.all_tasks(self.loop)])
+        if self.thread is not None:
+            self.thread.join(timeout=5)
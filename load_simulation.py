@@ -0,0 +1,591 @@
+"""Record and replay load simulation of the whole bot pipeline.
+
+`record` writes the closed klines of the Binance stream to a recording, the bot
+appends the commands it receives to one when RECORD_COMMANDS names a file in .env.
+`synthesize` writes random walk klines instead. `replay` serves recordings from
+stand-in Binance and Telegram HTTP endpoints on localhost and runs them through
+BinanceClient, runBBot, the job queue, subscribe_response and the MessageSender
+of telegram-bot.py, `--speed` times faster than real time. `--chats` adds
+synthetic chats subscribing at the start of the replay.
+
+The report gives the latency from runBBot publishing a signal change to the
+delivery of its alert at the stand-in Telegram endpoint, in wall seconds, and the
+delivery throughput. Alerts of signals older than the last command of a chat, like
+the current signals a new subscriber gets, are counted as initial alerts without
+latency. Telegram limits are not scaled by the speed, a candle should last longer
+in wall time than the delivery of its alerts or the replay measures a backlog that
+real time would not have.
+
+    python load_simulation.py record --symbols BTCUSDT,ETHUSDT --minutes 120 --out klines.jsonl
+    python load_simulation.py synthesize --symbols 400 --candles 96 --out synthetic.jsonl
+    python load_simulation.py replay synthetic.jsonl commands.jsonl --chats 5000 --speed 300 --save report.json
+
+A recording is JSON lines, every event has the unix time it was seen at:
+
+    {"time": ..., "type": "klines", "symbol": "BTCUSDT", "interval": "15m", "rows": [[open time, open, high, low, close, volume, close time], ...]}
+    {"time": ..., "type": "command", "chat": 42, "text": "/subscribe BTCUSDT 1h"}
+"""
+import argparse
+import bisect
+import importlib.util
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+from binance_client import BinanceClient
+from binance_time_utils import convertToCandlesStart, intervalToMilliseconds, isTimeframeOf
+from db_manager import DbManager
+from indicators import INDICATORS, lookback, signal_key
+from kline_store import KlineStore
+from kline_stream import KlineStream
+from message_sender import MessageSender
+from refresh_scheduler import RefreshScheduler
+from signal_dispatcher import signal_of
+
+BOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'telegram-bot.py')
+# the stand-in Telegram endpoint tells command replies from alerts by the token
+COMMANDS_TOKEN = '100:commands'
+ALERTS_TOKEN = '200:alerts'
+# ids of the synthetic chats, far from real chat ids
+SYNTHETIC_CHAT = 10 ** 12
+ALERT_LINE = re.compile(r'^(?:BUY|SELL) ALERT (\S+) ?(.*)$')
+
+
+class RecordingWriter:
+    """Appends events to a recording, stamped with the time they were seen at."""
+
+    def __init__(self, path, clock=time.time):
+        self.file = open(path, 'a')
+        self.clock = clock
+        self.lock = threading.Lock()
+
+    def write(self, event: dict) -> None:
+        line = json.dumps({'time': self.clock(), **event})
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+
+    def close(self) -> None:
+        with self.lock:
+            self.file.close()
+
+
+def read_recording(paths: List) -> List[dict]:
+    """Events of several recordings in time order."""
+    events = []
+    for path in paths:
+        with open(path) as file:
+            events += [json.loads(line) for line in file if line.strip()]
+    return sorted(events, key=lambda event: event['time'])
+
+
+def recorded_klines(events: List[dict]) -> tuple:
+    """({symbol: rows in open time order}, interval) of the kline events, a candle recorded twice is kept once."""
+    intervals = {event['interval'] for event in events if event['type'] == 'klines'}
+    if len(intervals) != 1:
+        raise ValueError(f'a replay needs the klines of one interval, the recordings have {sorted(intervals)}')
+    klines = {}
+    for event in events:
+        if event['type'] == 'klines':
+            rows = klines.setdefault(event['symbol'], {})
+            for row in event['rows']:
+                rows[row[0]] = row
+    return {symbol: [rows[openTime] for openTime in sorted(rows)] for symbol, rows in klines.items()}, intervals.pop()
+
+
+class KlineRecorder(KlineStream):
+    """KlineStream writing the candles it backfills and streams to a recording instead of computing signals."""
+
+    def __init__(self, writer: RecordingWriter, bClient, symbols: List, interval, start, **kwargs):
+        super().__init__(bClient, symbols, interval, start, None, **kwargs)
+        self.writer = writer
+
+    def publish(self, symbol, records) -> None:
+        if len(records) == 0:
+            return
+        rows = [[*row, row[0] + self.intervalMs - 1] for row in records.tolist()]
+        self.writer.write({'type': 'klines', 'symbol': symbol, 'interval': self.interval, 'rows': rows})
+
+
+def synthesize(symbols: List, candles, interval='15m', history=None, seed=0, end=None) -> List[dict]:
+    """Recording of random walk klines, history closed candles then `candles` more closing one by one."""
+    from benchmark import synthetic_klines
+    step = intervalToMilliseconds(interval)
+    if history is None:
+        # enough for every strategy on the daily timeframe
+        history = lookback(INDICATORS) * intervalToMilliseconds('1d') // step
+    end = int(time.time() * 1000) if end is None else end
+    events = []
+    for symbolSeed, symbol in enumerate(symbols, seed):
+        rows = [row[:7] for row in synthetic_klines(history + candles, symbolSeed, step, end)]
+        events.append({'time': rows[history][0] / 1000, 'type': 'klines', 'symbol': symbol, 'interval': interval,
+                       'rows': rows[:history]})
+        events += [{'time': (row[0] + step) / 1000, 'type': 'klines', 'symbol': symbol, 'interval': interval, 'rows': [row]}
+                   for row in rows[history:]]
+    return sorted(events, key=lambda event: event['time'])
+
+
+def synthetic_commands(chats, symbols: List, timeframes: List, allShare=0.5, seed=0, at=0.0) -> List[dict]:
+    """Subscriptions of synthetic chats, to all tickers or to one, at a random timeframe."""
+    rng = random.Random(seed)
+    return [{'time': at, 'type': 'command', 'chat': SYNTHETIC_CHAT + chat,
+             'text': f'/subscribe {"all" if rng.random() < allShare else rng.choice(symbols)} {rng.choice(timeframes)}'}
+            for chat in range(chats)]
+
+
+class VirtualClock:
+    """Time of a replay, runs `speed` times faster than the wall clock once begun.
+
+    sleep() takes replay seconds and sleeps at least `pause` wall seconds, so loops
+    waiting for the next candle do not spin at high speeds.
+    """
+
+    def __init__(self, start, speed, pause=0.05):
+        self.start = start
+        self.speed = speed
+        self.pause = pause
+        self.begun = None
+
+    def begin(self) -> None:
+        self.begun = time.time()
+
+    def time(self) -> float:
+        return self.start if self.begun is None else self.start + (time.time() - self.begun) * self.speed
+
+    def sleep(self, seconds) -> None:
+        time.sleep(max(seconds / self.speed, self.pause))
+
+    def sleepUntil(self, when) -> None:
+        while self.time() < when:
+            time.sleep(max((when - self.time()) / self.speed, 0))
+
+
+class StandInServer:
+    """Local HTTP server answering GET and JSON POST requests with answer(path, query, body)."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def answer(self, path, query, body) -> tuple:
+        """(status, json answer) of a request."""
+        raise NotImplementedError
+
+    def _handler(self):
+        standIn = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _answer(self, body):
+                url = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                time.sleep(standIn.delay)
+                status, answer = standIn.answer(url.path, query, body)
+                data = json.dumps(answer).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._answer({})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                self._answer(json.loads(self.rfile.read(length) or b'{}'))
+
+        return Handler
+
+
+class StandInBinance(StandInServer):
+    """Public Binance endpoints serving recorded klines, the candle open at the replay time is the forming one."""
+
+    def __init__(self, klines: Dict[str, list], clock: Callable, delay=0.0):
+        super().__init__(delay)
+        self.klines = klines
+        self.times = {symbol: [row[0] for row in rows] for symbol, rows in klines.items()}
+        self.clock = clock
+        self.requests = 0
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.port}/api'
+
+    def answer(self, path, query, body) -> tuple:
+        self.requests += 1
+        if path.endswith('/ping'):
+            return 200, {}
+        if not path.endswith('/klines'):
+            return 404, {'code': -1, 'msg': 'not found'}
+        symbol = query.get('symbol')
+        if symbol not in self.klines:
+            return 400, {'code': -1121, 'msg': 'Invalid symbol.'}
+        times = self.times[symbol]
+        first = bisect.bisect_left(times, int(query.get('startTime', 0)))
+        last = bisect.bisect_right(times, self.clock() * 1000)
+        if 'endTime' in query:
+            last = min(last, bisect.bisect_right(times, int(query['endTime'])))
+        return 200, self.klines[symbol][first:min(last, first + int(query.get('limit', 500)))]
+
+
+class StandInTelegram(StandInServer):
+    """Telegram Bot API stand-in: getUpdates serves the queued commands, sendMessage calls onMessage(token, chat_id, text, time)."""
+
+    def __init__(self, onMessage: Callable, delay=0.0, poll=1.0):
+        super().__init__(delay)
+        self.onMessage = onMessage
+        self.poll = poll
+        self.updates = []
+        self.nextUpdate = 1
+        self.nextMessage = 1
+        self.condition = threading.Condition()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.port}/bot'
+
+    def command(self, chat_id, text) -> None:
+        """Queue a message of chat_id for getUpdates."""
+        with self.condition:
+            self.updates.append({'update_id': self.nextUpdate, 'message': {
+                'message_id': self.nextUpdate, 'date': int(time.time()), 'text': text,
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': {'id': chat_id, 'is_bot': False, 'first_name': f'chat {chat_id}'},
+                'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]}})
+            self.nextUpdate += 1
+            self.condition.notify_all()
+
+    def pending(self) -> int:
+        """Updates the bot did not confirm yet."""
+        with self.condition:
+            return len(self.updates)
+
+    def answer(self, path, query, body) -> tuple:
+        token, method = path.split('/')[-2:]
+        token = token[len('bot'):]
+        if method == 'getMe':
+            return 200, {'ok': True, 'result': {'id': 1, 'is_bot': True, 'first_name': 'load simulation',
+                                                'username': 'load_simulation_bot'}}
+        if method == 'getUpdates':
+            with self.condition:
+                # updates below the offset were received by the bot, python-telegram-bot sends numbers as strings
+                offset = int(body.get('offset') or 0)
+                self.updates = [update for update in self.updates if update['update_id'] >= offset]
+                if not self.updates:
+                    self.condition.wait(min(float(body.get('timeout') or 0), self.poll))
+                return 200, {'ok': True, 'result': self.updates[:int(body.get('limit') or 100)]}
+        if method == 'sendMessage':
+            at = time.time()
+            chat_id = int(body['chat_id'])
+            self.onMessage(token, chat_id, body['text'], at)
+            with self.condition:
+                messageId = self.nextMessage
+                self.nextMessage += 1
+            return 200, {'ok': True, 'result': {'message_id': messageId, 'date': int(at), 'text': body['text'],
+                                                'chat': {'id': chat_id, 'type': 'private'}}}
+        return 200, {'ok': True, 'result': True}
+
+
+def alerts_of(text) -> List[tuple]:
+    """(channel label, ticker) of the alerts of a delivered message, messages joined by the sender included."""
+    alerts = []
+    label = ''
+    inTable = False
+    for line in text.split('\n'):
+        if line.startswith('<pre>'):
+            inTable = True
+            line = line[len('<pre>'):]
+        if inTable:
+            if line.startswith('|'):
+                symbol = line.split('|')[1].strip()
+                if symbol != 'Symbol':
+                    alerts.append((label, symbol))
+            if line.endswith('</pre>'):
+                inTable = False
+                label = ''
+            continue
+        match = ALERT_LINE.match(line)
+        if match:
+            alerts.append((match.group(2), match.group(1)))
+        else:
+            # the timeframe and strategy of the next table
+            label = line
+    return alerts
+
+
+class DeliveryTracker:
+    """Matches the alerts delivered to the stand-in Telegram endpoint with the time their signal changed.
+
+    labels maps the channel label of a message to its (timeframe, strategy).
+    """
+
+    def __init__(self, labels: Dict[str, tuple]):
+        self.labels = labels
+        self.signals = {}
+        # (timeframe, strategy, ticker) -> wall time the signal changed, chat -> wall time of its last command
+        self.changed = {}
+        self.commanded = {}
+        self.latencies = []
+        self.initial = 0
+        self.messages = 0
+        self.replies = 0
+        self.lastDelivery = 0
+        self.lock = threading.Lock()
+
+    def cycle(self, snapshot: dict) -> None:
+        """Note the signals of a new snapshot that changed."""
+        now = time.time()
+        with self.lock:
+            for timeframe, strategy in self.labels.values():
+                previous = self.signals.setdefault((timeframe, strategy), {})
+                for ticker, data in snapshot.get(signal_key(timeframe, strategy), {}).items():
+                    signal = signal_of(data)
+                    if signal and previous.get(ticker) != signal:
+                        self.changed[(timeframe, strategy, ticker)] = now
+                    previous[ticker] = signal
+
+    def command(self, chat_id) -> None:
+        with self.lock:
+            self.commanded[chat_id] = time.time()
+
+    def delivered(self, token, chat_id, text, at) -> None:
+        with self.lock:
+            if token != ALERTS_TOKEN:
+                self.replies += 1
+                return
+            self.messages += 1
+            self.lastDelivery = at
+            for label, ticker in alerts_of(text):
+                timeframe, strategy = self.labels.get(label, (None, None))
+                changed = self.changed.get((timeframe, strategy, ticker))
+                if changed is None or changed < self.commanded.get(chat_id, 0):
+                    self.initial += 1
+                else:
+                    self.latencies.append(at - changed)
+
+
+def load_bot(path=BOT_PATH):
+    """Import telegram-bot.py, its file name is not a module name."""
+    spec = importlib.util.spec_from_file_location('telegram_bot', path)
+    bot = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(bot)
+    return bot
+
+
+def wait_for(condition: Callable, timeout, pause=0.05) -> bool:
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(pause)
+    return True
+
+
+def percentile(values, q) -> float:
+    return float(np.percentile(values, q)) if len(values) else float('nan')
+
+
+def replay(events: List[dict], chats=0, allShare=0.5, speed=60.0, globalRate=30, chatRate=1, weightLimit=1200,
+           binanceDelay=0.0, telegramDelay=0.0, drain=120.0, warmup=600.0, seed=0) -> dict:
+    """Run the events of recordings through the bot and return the report.
+
+    The REST weight limit is scaled by the speed like the candles, the Telegram
+    limits are not. The klines go through a kline store in a temporary directory,
+    the way the bot refreshes them.
+    """
+    from binance.client import Client
+    from telegram import Bot
+    from telegram.ext import Updater
+    klines, interval = recorded_klines(events)
+    symbols = sorted(klines)
+    bot = load_bot()
+    timeframes = [timeframe for timeframe in bot.TIMEFRAMES if isTimeframeOf(interval, timeframe)]
+    if not timeframes:
+        raise ValueError(f'none of the timeframes {bot.TIMEFRAMES} can be built from {interval} klines')
+    start = events[0]['time']
+    intervalMs = intervalToMilliseconds(interval)
+    clock = VirtualClock(start, speed)
+    scheduler = RefreshScheduler(None if bot.UNFOLLOWED_REFRESH == 'off' else bot.UNFOLLOWED_REFRESH,
+                                 jitter=bot.REFRESH_JITTER, clock=clock.time)
+    # the last candle is refreshed after its close
+    end = max([events[-1]['time']] + [(rows[-1][0] + intervalMs) / 1000 for rows in klines.values()])
+    end += scheduler.delay + scheduler.jitter + 1
+    commands = [event for event in events if event['type'] == 'command']
+    commands = sorted(commands + synthetic_commands(chats, symbols, timeframes, allShare, seed, start),
+                      key=lambda event: event['time'])
+    tracker = DeliveryTracker({bot.channel_label(*key): key for key in bot.alertDispatchers})
+    directory = tempfile.mkdtemp(prefix='load_simulation_')
+    bot.db = DbManager(os.path.join(directory, 'bot.db'))
+    bot.registry.load(symbols)
+    bot.clock = clock.time
+    config = {"keepRunning": True}
+    cycles = []
+    with StandInBinance(klines, clock.time, binanceDelay) as binance, \
+            StandInTelegram(tracker.delivered, telegramDelay) as telegram:
+        client = Client(ping=False)
+        client.API_URL = binance.url
+        bClient = BinanceClient(client=client, klineStore=KlineStore(os.path.join(directory, 'klines')),
+                                weightLimit=int(weightLimit * speed), clock=clock.time)
+        updater = Updater(COMMANDS_TOKEN, base_url=telegram.url)
+        bot.add_handlers(updater.dispatcher)
+        bot.sender = MessageSender(Bot(ALERTS_TOKEN, base_url=telegram.url), globalRate, chatRate)
+
+        def onCycle():
+            cycles.append((time.time(), bot.CYCLE_SECONDS.last))
+            tracker.cycle(bot.tickers_ema)
+            bot.notify_subscribers(updater.job_queue)
+
+        def inject(command):
+            tracker.command(command['chat'])
+            telegram.command(command['chat'], command['text'])
+
+        def drained():
+            return bot.sender.queued() == 0 and not updater.job_queue.get_jobs_by_name('subscribe_response')
+
+        thread = threading.Thread(target=bot.runBBot, args=(config, interval, timeframes, symbols, bClient, onCycle,
+                                                            scheduler, clock.sleep), daemon=True)
+        bot.sender.start()
+        updater.start_polling(timeout=1)
+        try:
+            thread.start()
+            if not wait_for(lambda: cycles, warmup):
+                raise TimeoutError(f'no indicator cycle within {warmup}s')
+            # the commands from before the first candle are handled before the clock runs
+            early = [command for command in commands if command['time'] <= start]
+            for command in early:
+                inject(command)
+            wait_for(lambda: telegram.pending() == 0 and updater.dispatcher.update_queue.empty(), warmup)
+            clock.begin()
+            began = time.time()
+            for command in commands[len(early):]:
+                clock.sleepUntil(command['time'])
+                inject(command)
+            clock.sleepUntil(end)
+            config["keepRunning"] = False
+            thread.join(timeout=60)
+            replayed = time.time()
+            # the alerts of the last cycle are still on the job queue or in the send queue
+            wait_for(drained, drain)
+            wait_for(lambda: drained() and time.time() - tracker.lastDelivery > 1, drain)
+        finally:
+            config["keepRunning"] = False
+            updater.stop()
+            bot.sender.stop()
+            shutil.rmtree(directory, ignore_errors=True)
+    wall = max(tracker.lastDelivery, replayed) - began
+    durations = [duration for at, duration in cycles if at >= began]
+    alerts = len(tracker.latencies)
+    return {'symbols': len(symbols), 'interval': interval, 'speed': speed,
+            'chats': len({command['chat'] for command in commands}), 'commands': len(commands), 'replies': tracker.replies,
+            'replay_seconds': end - start, 'wall_seconds': wall, 'wall_seconds_per_candle': intervalMs / 1000 / speed,
+            'binance_requests': binance.requests, 'cycles': len(durations),
+            'cycle_p50_s': percentile(durations, 50), 'cycle_max_s': max(durations, default=float('nan')),
+            'messages': tracker.messages, 'alerts': alerts, 'initial_alerts': tracker.initial,
+            'messages_per_s': tracker.messages / wall, 'alerts_per_s': (alerts + tracker.initial) / wall,
+            'latency_p50_s': percentile(tracker.latencies, 50), 'latency_p99_s': percentile(tracker.latencies, 99),
+            'latency_max_s': max(tracker.latencies, default=float('nan')), 'undelivered': bot.sender.queued()}
+
+
+def record(symbols: List, interval, start, seconds, path) -> None:
+    """Record the klines of symbols from the Binance stream for `seconds`, history from start included."""
+    from binance.client import Client
+    writer = RecordingWriter(path)
+    recorder = KlineRecorder(writer, BinanceClient(client=Client(ping=False)), symbols, interval, start)
+    recorder.startThread()
+    try:
+        time.sleep(seconds)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.stop()
+        writer.close()
+
+
+def print_report(report) -> None:
+    for key, value in report.items():
+        print(f'{key:24} {value:.3f}' if isinstance(value, float) else f'{key:24} {value}')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Record and replay load simulation of the bot pipeline')
+    commands = parser.add_subparsers(dest='command', required=True)
+    recordParser = commands.add_parser('record', help='record the Binance kline stream')
+    recordParser.add_argument('--symbols', required=True, help='comma separated symbols')
+    recordParser.add_argument('--interval', default='15m')
+    recordParser.add_argument('--start', default=convertToCandlesStart(lookback(INDICATORS), ['1d']),
+                              help='history to record first, covers every strategy on 1d by default')
+    recordParser.add_argument('--minutes', type=float, default=60)
+    recordParser.add_argument('--out', required=True)
+    synthesizeParser = commands.add_parser('synthesize', help='write a recording of random walk klines')
+    synthesizeParser.add_argument('--symbols', type=int, default=200)
+    synthesizeParser.add_argument('--candles', type=int, default=96)
+    synthesizeParser.add_argument('--interval', default='15m')
+    synthesizeParser.add_argument('--history', type=int, help='closed candles before the replay')
+    synthesizeParser.add_argument('--seed', type=int, default=0)
+    synthesizeParser.add_argument('--out', required=True)
+    replayParser = commands.add_parser('replay', help='replay recordings through the bot')
+    replayParser.add_argument('recordings', nargs='+')
+    replayParser.add_argument('--chats', type=int, default=0, help='synthetic chats to add')
+    replayParser.add_argument('--all-share', type=float, default=0.5, help='share of synthetic chats subscribing to all')
+    replayParser.add_argument('--speed', type=float, default=60)
+    replayParser.add_argument('--global-rate', type=float, default=30, help='Telegram messages per second')
+    replayParser.add_argument('--chat-rate', type=float, default=1, help='Telegram messages per second and chat')
+    replayParser.add_argument('--weight-limit', type=int, default=1200, help='Binance REST weight per minute')
+    replayParser.add_argument('--binance-delay', type=float, default=0.0, help='seconds the stand-in Binance takes to answer')
+    replayParser.add_argument('--telegram-delay', type=float, default=0.0, help='seconds the stand-in Telegram takes to answer')
+    replayParser.add_argument('--drain', type=float, default=120, help='seconds to wait for the last alerts')
+    replayParser.add_argument('--seed', type=int, default=0)
+    replayParser.add_argument('--save', help='write the report as json')
+    replayParser.add_argument('--verbose', action='store_true', help='log the bot at INFO level')
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        record(args.symbols.split(','), args.interval, args.start, args.minutes * 60, args.out)
+    elif args.command == 'synthesize':
+        events = synthesize([f'S{i}USDT' for i in range(args.symbols)], args.candles, args.interval, args.history, args.seed)
+        with open(args.out, 'w') as file:
+            file.writelines(json.dumps(event) + '\n' for event in events)
+    else:
+        # configured before the bot is loaded, its basicConfig call keeps this level
+        logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                            level=logging.INFO if args.verbose else logging.WARNING)
+        report = replay(read_recording(args.recordings), args.chats, args.all_share, args.speed, args.global_rate,
+                        args.chat_rate, args.weight_limit, args.binance_delay, args.telegram_delay, args.drain, seed=args.seed)
+        print_report(report)
+        if args.save:
+            with open(args.save, 'w') as file:
+                json.dump(report, file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
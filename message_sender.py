@@ -0,0 +1,179 @@
+import html
+import logging
+import threading
+import time
+from collections import deque
+from telegram import ParseMode
+from telegram.error import RetryAfter, TelegramError
+from metrics import REGISTRY
+
+MAX_MESSAGE_LENGTH = 4096
+
+SEND_SECONDS = REGISTRY.histogram('bot_send_seconds', 'Latency of one Telegram send_message call')
+SEND_FAILURES = REGISTRY.counter('bot_send_failures', 'Telegram messages that failed or hit flood control', 'reason')
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second up to `capacity`."""
+
+    def __init__(self, rate, capacity=1, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait(self) -> float:
+        """Seconds until a token is available, 0 when one can be taken now."""
+        self._refill()
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self._refill()
+        self.tokens -= 1
+
+    def full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+def coalesce(messages, limit=MAX_MESSAGE_LENGTH):
+    """Join as many pending (text, parse_mode) messages as fit into one, returns (message, rest)."""
+    html_mode = any(parse_mode == ParseMode.HTML for _, parse_mode in messages)
+    parse_mode = ParseMode.HTML if html_mode else messages[0][1]
+    parts = []
+    length = 0
+    for text, mode in messages:
+        if html_mode and mode != ParseMode.HTML:
+            text = html.escape(text)
+        if parts and length + len(text) + 1 > limit:
+            break
+        parts.append(text)
+        length += len(text) + 1
+    return ('\n'.join(parts), parse_mode), messages[len(parts):]
+
+
+class MessageSender:
+    """Thread backed outbound queue for bot messages.
+
+    send() only enqueues. A worker thread drains the queue while keeping under the
+    global and the per chat Telegram limits (token buckets), joins the messages
+    pending for the same chat into one and retries after RetryAfter flood errors.
+    """
+
+    def __init__(self, bot, globalRate=30, chatRate=1, chatBurst=1, clock=time.monotonic):
+        self.logger = logging.getLogger('trading_bot.message_sender')
+        self.bot = bot
+        self.chatRate = chatRate
+        self.chatBurst = chatBurst
+        self.clock = clock
+        self.globalBucket = TokenBucket(globalRate, globalRate, clock)
+        self.buckets = {}
+        self.pending = {}
+        self.ready = deque()
+        self.pausedUntil = 0
+        self.sent = 0
+        self.keepRunning = True
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def send(self, chat_id, text, parse_mode=None) -> None:
+        with self.condition:
+            messages = self.pending.setdefault(chat_id, [])
+            if not messages:
+                self.ready.append(chat_id)
+            messages.append((text, parse_mode))
+            self.condition.notify()
+
+    def _bucket(self, chat_id) -> TokenBucket:
+        bucket = self.buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chatRate, self.chatBurst, self.clock)
+            self.buckets[chat_id] = bucket
+        return bucket
+
+    def _next(self):
+        """Pick the first chat allowed to send, returns (chat_id, message) or (None, seconds to wait)."""
+        wait = max(self.pausedUntil - self.clock(), self.globalBucket.wait())
+        if wait > 0:
+            return None, wait
+        for _ in range(len(self.ready)):
+            chat_id = self.ready[0]
+            chatWait = self._bucket(chat_id).wait()
+            if chatWait == 0:
+                self.ready.popleft()
+                message, rest = coalesce(self.pending.pop(chat_id))
+                if rest:
+                    self.pending[chat_id] = rest
+                    self.ready.append(chat_id)
+                self._bucket(chat_id).take()
+                self.globalBucket.take()
+                return chat_id, message
+            wait = chatWait if wait == 0 else min(wait, chatWait)
+            self.ready.rotate(-1)
+        return None, wait if self.ready else None
+
+    def _requeue(self, chat_id, message) -> None:
+        messages = self.pending.setdefault(chat_id, [])
+        if not messages:
+            self.ready.appendleft(chat_id)
+        messages.insert(0, message)
+
+    def _forget_idle_buckets(self) -> None:
+        for chat_id in [chat_id for chat_id, bucket in self.buckets.items()
+                        if chat_id not in self.pending and bucket.full()]:
+            del self.buckets[chat_id]
+
+    def process(self, block=True) -> bool:
+        """Send at most one message, returns False when there is nothing to send."""
+        with self.condition:
+            while True:
+                chat_id, message = self._next()
+                if chat_id is not None:
+                    break
+                if message is None and len(self.buckets) > 1000:
+                    self._forget_idle_buckets()
+                if not block or not self.keepRunning:
+                    return False
+                self.condition.wait(message)
+        text, parse_mode = message
+        try:
+            with SEND_SECONDS.time():
+                self.bot.send_message(chat_id, text=text, parse_mode=parse_mode)
+            self.sent += 1
+        except RetryAfter as e:
+            SEND_FAILURES.inc(labelValue='retry_after')
+            self.logger.warning(f'flood control, retry in {e.retry_after}s')
+            with self.condition:
+                self.pausedUntil = self.clock() + e.retry_after
+                self._requeue(chat_id, message)
+        except TelegramError:
+            SEND_FAILURES.inc(labelValue='error')
+            self.logger.exception(f'failed to send message to chat {chat_id}')
+        return True
+
+    def queued(self) -> int:
+        """Number of messages waiting to be sent."""
+        with self.condition:
+            return sum(len(messages) for messages in self.pending.values())
+
+    def run(self) -> None:
+        while self.keepRunning:
+            self.process()
+
+    def start(self) -> threading.Thread:
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self) -> None:
+        with self.condition:
+            self.keepRunning = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
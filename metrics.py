@@ -0,0 +1,205 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def _labels(labels: Dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{str(value)}"' for key, value in sorted(labels.items())) + '}'
+
+
+class Counter:
+    """Monotonic counter, optionally split by one label (e.g. symbol)."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, label=None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.values: Dict = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, labelValue=None) -> None:
+        with self.lock:
+            self.values[labelValue] = self.values.get(labelValue, 0) + amount
+
+    def value(self, labelValue=None):
+        return self.values.get(labelValue, 0)
+
+    def total(self):
+        return sum(self.values.values())
+
+    def samples(self) -> List[tuple]:
+        with self.lock:
+            values = sorted(self.values.items(), key=lambda item: str(item[0])) or [(None, 0)]
+        return [(self.name + '_total', {self.label: key} if key is not None else {}, value) for key, value in values]
+
+
+class Gauge:
+    """Last set value, or the value of a function evaluated when scraped."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, function: Callable = None):
+        self.name = name
+        self.help = help
+        self.function = function
+        self.current = 0.0
+
+    def set(self, value) -> None:
+        self.current = value
+
+    def value(self):
+        return self.function() if self.function is not None else self.current
+
+    def samples(self) -> List[tuple]:
+        return [(self.name, {}, self.value())]
+
+
+class Histogram:
+    """Cumulative bucket histogram of durations in seconds, also keeps the last observation."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.last = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value) -> None:
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.last = value
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q) -> float:
+        """Upper bound of the bucket holding the q quantile, the same estimate as histogram_quantile without interpolation."""
+        with self.lock:
+            rank = q * self.count
+            seen = 0
+            for bound, count in zip(self.buckets, self.counts):
+                seen += count
+                if seen >= rank and seen > 0:
+                    return bound
+        return float('inf') if self.count else 0.0
+
+    def samples(self) -> List[tuple]:
+        with self.lock:
+            counts, total, count = tuple(self.counts), self.sum, self.count
+        samples = []
+        seen = 0
+        for bound, bucketCount in zip(self.buckets, counts):
+            seen += bucketCount
+            samples.append((self.name + '_bucket', {'le': repr(float(bound))}, seen))
+        samples.append((self.name + '_bucket', {'le': '+Inf'}, count))
+        samples.append((self.name + '_sum', {}, total))
+        samples.append((self.name + '_count', {}, count))
+        return samples
+
+
+class Registry:
+    """Named metrics of the process, asking twice for the same name returns the same metric."""
+
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+        self.lock = threading.Lock()
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = cls(name, *args, **kwargs)
+                self.metrics[name] = metric
+            return metric
+
+    def counter(self, name, help, label=None) -> Counter:
+        return self._get(Counter, name, help, label)
+
+    def gauge(self, name, help, function: Callable = None) -> Gauge:
+        gauge = self._get(Gauge, name, help)
+        if function is not None:
+            gauge.function = function
+        return gauge
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, buckets)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f'# HELP {name} {metric.help}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for sampleName, labels, value in metric.samples():
+                lines.append(f'{sampleName}{_labels(labels)} {float(value)!r}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class MetricsServer:
+    """Serves registry.render() on GET /metrics from a daemon thread."""
+
+    def __init__(self, port, registry=REGISTRY, host='0.0.0.0'):
+        self.logger = logging.getLogger('trading_bot.metrics')
+        self.registry = registry
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = server.registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = None
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def start(self) -> threading.Thread:
+        self.logger.info(f'serving metrics on port {self.port}')
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,48 @@
+import threading
+import time
+
+
+class WeightLimiter:
+    """Client side view of the Binance request weight budget.
+
+    Binance counts request weight in fixed one minute windows (x-mbx-used-weight-1m),
+    acquire() blocks the calling thread until the current window has room for the
+    request. sync() lets the limiter catch up with the weight reported by the server
+    and block() pauses everybody after a 429/418 with Retry-After.
+    """
+
+    def __init__(self, limit=1200, window=60, clock=time.time, sleep=time.sleep):
+        self.limit = limit
+        self.window = window
+        self.clock = clock
+        self.sleep = sleep
+        self.used = 0
+        self.windowStart = 0
+        self.blockedUntil = 0
+        self.lock = threading.Lock()
+
+    def _roll(self, now) -> None:
+        windowStart = now - now % self.window
+        if windowStart != self.windowStart:
+            self.windowStart = windowStart
+            self.used = 0
+
+    def acquire(self, weight=1) -> None:
+        while True:
+            with self.lock:
+                now = self.clock()
+                self._roll(now)
+                if now >= self.blockedUntil and self.used + weight <= self.limit:
+                    self.used += weight
+                    return
+                wait = max(self.blockedUntil, self.windowStart + self.window) - now
+            self.sleep(max(wait, 0.01))
+
+    def sync(self, usedWeight) -> None:
+        with self.lock:
+            self._roll(self.clock())
+            self.used = max(self.used, int(usedWeight))
+
+    def block(self, seconds) -> None:
+        with self.lock:
+            self.blockedUntil = max(self.blockedUntil, self.clock() + seconds)
@@ -0,0 +1,120 @@
+import heapq
+import random
+import threading
+import time
+from typing import Dict, Iterable, List
+from binance_time_utils import bucketStart, intervalToMilliseconds
+
+FOLLOWED = 0
+UNFOLLOWED = 1
+
+
+class RefreshScheduler:
+    """Min-heap of symbol refreshes, each due right after a candle of its interval closes.
+
+    Followed symbols are refreshed at the shortest timeframe somebody subscribed to,
+    the other symbols at idleInterval or not at all when it is None. A symbol is also
+    due right away when somebody starts following it for another (timeframe, strategy). The refreshes
+    of one close are spread over `jitter` seconds (`idleJitter` for unfollowed
+    symbols) and a due batch lists the followed symbols first. A symbol has at most
+    one live heap entry, entries replaced by update() are skipped when popped.
+    """
+
+    def __init__(self, idleInterval='1d', delay=2.0, jitter=10.0, idleJitter=60.0, clock=time.time, rng=None):
+        self.idleInterval = idleInterval
+        self.delay = delay
+        self.jitter = jitter
+        self.idleJitter = idleJitter
+        self.clock = clock
+        self.random = random.Random() if rng is None else rng
+        self.heap = []
+        # symbol -> (interval, priority) and symbol -> due time of its live heap entry
+        self.intervals: Dict[str, tuple] = {}
+        self.dueAt: Dict[str, float] = {}
+        # symbol -> the (timeframe, strategy) keys it is followed for
+        self.demand: Dict[str, frozenset] = {}
+        self.lock = threading.Lock()
+
+    def nextClose(self, interval, priority, now) -> float:
+        """When to refresh a symbol for the candle of interval that closes after now."""
+        nowMs = int(now * 1000)
+        close = (bucketStart(nowMs, interval) + intervalToMilliseconds(interval)) / 1000
+        return close + self.delay + self.random.uniform(0, self.jitter if priority == FOLLOWED else self.idleJitter)
+
+    def _push(self, symbol, due, priority) -> None:
+        self.dueAt[symbol] = due
+        heapq.heappush(self.heap, (due, priority, symbol))
+
+    def update(self, universe: Iterable, followed: Dict[str, str], demand: Dict[str, frozenset] = None) -> set:
+        """Schedule the symbols of universe, followed maps a symbol to the interval it is watched at.
+
+        New symbols are due right away, and so is a symbol that became followed or whose
+        interval shrank, its signals of the shorter timeframes may be a whole idle
+        interval old. demand maps a followed symbol to the (timeframe, strategy) keys it
+        is followed for, a symbol that gained one is due right away as well, its signals
+        of the new strategy are missing. Returns the symbols no longer scheduled.
+        """
+        now = self.clock()
+        universe = set(universe)
+        demand = demand or {}
+        with self.lock:
+            removed = set(self.intervals) - universe
+            for symbol in universe:
+                priority = FOLLOWED if symbol in followed else UNFOLLOWED
+                interval = followed.get(symbol, self.idleInterval)
+                if interval is None:
+                    if symbol in self.intervals:
+                        removed.add(symbol)
+                    continue
+                wanted = demand.get(symbol, frozenset())
+                grew = not wanted <= self.demand.get(symbol, frozenset())
+                if wanted:
+                    self.demand[symbol] = wanted
+                else:
+                    self.demand.pop(symbol, None)
+                previous = self.intervals.get(symbol)
+                if previous == (interval, priority) and not grew:
+                    continue
+                self.intervals[symbol] = (interval, priority)
+                if previous is None or grew or priority < previous[1] or \
+                        intervalToMilliseconds(interval) < intervalToMilliseconds(previous[0]):
+                    self._push(symbol, now, priority)
+                else:
+                    self._push(symbol, min(self.dueAt[symbol], self.nextClose(interval, priority, now)), priority)
+            for symbol in removed:
+                self.intervals.pop(symbol, None)
+                self.dueAt.pop(symbol, None)
+                self.demand.pop(symbol, None)
+        return removed
+
+    def _stale(self, due, symbol) -> bool:
+        return self.dueAt.get(symbol) != due
+
+    def wait(self) -> float:
+        """Seconds until the next refresh is due, inf when nothing is scheduled."""
+        with self.lock:
+            while self.heap and self._stale(self.heap[0][0], self.heap[0][2]):
+                heapq.heappop(self.heap)
+            return max(self.heap[0][0] - self.clock(), 0) if self.heap else float('inf')
+
+    def due(self) -> List:
+        """Pop the symbols due now, followed ones first, and schedule their next refresh."""
+        now = self.clock()
+        batch = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                due, priority, symbol = heapq.heappop(self.heap)
+                if self._stale(due, symbol):
+                    continue
+                batch.append((priority, due, symbol))
+                interval, priority = self.intervals[symbol]
+                self._push(symbol, self.nextClose(interval, priority, now), priority)
+        return [symbol for priority, due, symbol in sorted(batch)]
+
+    def retry(self, symbols: Iterable, pause) -> None:
+        """Refresh symbols again in pause seconds, e.g. after their batch failed."""
+        due = self.clock() + pause
+        with self.lock:
+            for symbol in symbols:
+                if symbol in self.intervals and self.dueAt[symbol] > due:
+                    self._push(symbol, due, self.intervals[symbol][1])
@@ -0,0 +1,245 @@
+import threading
+from typing import Dict, List
+import numpy as np
+
+ALL_TICKERS = 'all'
+# last signal sent per (chat, ticker), as stored in the sent matrix
+NONE, BUY, SELL = 0, 1, 2
+SIGNAL_NAMES = ('', 'buy', 'sell')
+SIGNAL_CODES = {name: code for code, name in enumerate(SIGNAL_NAMES)}
+
+
+def signal_of(data: dict) -> str:
+    if data['buy']:
+        return 'buy'
+    if data['sell']:
+        return 'sell'
+    return ''
+
+
+def signal_code(data: dict) -> int:
+    return BUY if data['buy'] else SELL if data['sell'] else NONE
+
+
+class SignalDispatcher:
+    """Fans out buy/sell transitions to subscribed chats.
+
+    Chats are interned to rows and tickers to columns. sent is a (chats x tickers)
+    int8 matrix of the last signal sent, follows marks the tickers a chat subscribed
+    to by name and allRows the chats subscribed to all tickers. dispatch() turns a
+    new tickers_ema snapshot into a signal vector, compares it with the previous one
+    and checks only the columns that changed against sent, for all chats at once.
+    Chats that subscribed since the last dispatch are checked against the whole
+    vector once so they get the current signals. A chat never gets the same alert
+    twice and the state costs three bytes per (chat, ticker), the third one marks
+    the sent cells changed since the last changes(), so only those are persisted.
+    """
+
+    def __init__(self, chats=64, tickers=512):
+        self.tickerIds: Dict[str, int] = {}
+        self.tickers: List[str] = []
+        self.chatRows: Dict[int, int] = {}
+        # chat id of every row, None for a released row
+        self.rowChats: List = []
+        self.freeRows: List[int] = []
+        self.sent = np.zeros((chats, tickers), dtype=np.int8)
+        self.follows = np.zeros((chats, tickers), dtype=bool)
+        self.dirty = np.zeros((chats, tickers), dtype=bool)
+        # chats whose row was released since the last changes(), all their sent signals are gone
+        self.clearedChats = []
+        self.allRows = np.zeros(chats, dtype=bool)
+        # chats subscribed to every ticker by name
+        self.followers = np.zeros(tickers, dtype=np.int32)
+        self.signals = np.zeros(tickers, dtype=np.int8)
+        self.newRows = set()
+        self.lock = threading.Lock()
+
+    def _grow(self, rows, columns) -> None:
+        rows = max(rows, self.sent.shape[0])
+        columns = max(columns, self.sent.shape[1])
+
+        def resized(array, shape):
+            grown = np.zeros(shape, dtype=array.dtype)
+            grown[tuple(slice(0, size) for size in array.shape)] = array
+            return grown
+
+        self.sent = resized(self.sent, (rows, columns))
+        self.follows = resized(self.follows, (rows, columns))
+        self.dirty = resized(self.dirty, (rows, columns))
+        self.allRows = resized(self.allRows, (rows,))
+        self.followers = resized(self.followers, (columns,))
+        self.signals = resized(self.signals, (columns,))
+
+    def _column(self, ticker) -> int:
+        column = self.tickerIds.get(ticker)
+        if column is None:
+            column = len(self.tickers)
+            if column == self.sent.shape[1]:
+                self._grow(0, 2 * column)
+            self.tickerIds[ticker] = column
+            self.tickers.append(ticker)
+        return column
+
+    def _row(self, chat_id) -> int:
+        row = self.chatRows.get(chat_id)
+        if row is None:
+            if self.freeRows:
+                row = self.freeRows.pop()
+                self.rowChats[row] = chat_id
+            else:
+                row = len(self.rowChats)
+                if row == self.sent.shape[0]:
+                    self._grow(2 * row, 0)
+                self.rowChats.append(chat_id)
+            self.chatRows[chat_id] = row
+        return row
+
+    def _release(self, row) -> None:
+        """Free the row of a chat without subscriptions."""
+        if self.allRows[row] or self.follows[row].any():
+            return
+        self.sent[row] = NONE
+        self.dirty[row] = False
+        self.clearedChats.append(self.rowChats[row])
+        del self.chatRows[self.rowChats[row]]
+        self.rowChats[row] = None
+        self.freeRows.append(row)
+        self.newRows.discard(row)
+
+    def subscribe(self, chat_id, ticker) -> bool:
+        """Add a subscription, returns whether it already existed."""
+        with self.lock:
+            row = self._row(chat_id)
+            if ticker == ALL_TICKERS:
+                exists = self.allRows[row]
+                self.allRows[row] = True
+            else:
+                column = self._column(ticker)
+                exists = self.follows[row, column]
+                if not exists:
+                    self.follows[row, column] = True
+                    self.followers[column] += 1
+            self.newRows.add(row)
+            return bool(exists)
+
+    def unsubscribe(self, chat_id, ticker) -> bool:
+        """Remove a subscription and its sent signals, returns whether it existed."""
+        with self.lock:
+            row = self.chatRows.get(chat_id)
+            if row is None:
+                return False
+            if ticker == ALL_TICKERS:
+                exists = self.allRows[row]
+                self.allRows[row] = False
+                cleared = ~self.follows[row] & (self.sent[row] != NONE)
+                self.sent[row, cleared] = NONE
+                self.dirty[row, cleared] = True
+            else:
+                column = self.tickerIds.get(ticker)
+                exists = column is not None and self.follows[row, column]
+                if exists:
+                    self.follows[row, column] = False
+                    self.followers[column] -= 1
+                    if not self.allRows[row] and self.sent[row, column] != NONE:
+                        self.sent[row, column] = NONE
+                        self.dirty[row, column] = True
+            self._release(row)
+            return bool(exists)
+
+    def _alerts(self, rows, columns, vector, order, alerts) -> None:
+        """Record the alerts of the (row, column) pairs in snapshot order and mark their signals as sent."""
+        if len(rows) == 0:
+            return
+        pairs = np.lexsort((order[columns], rows))
+        rows, columns = rows[pairs], columns[pairs]
+        codes = vector[columns]
+        self.sent[rows, columns] = codes
+        self.dirty[rows, columns] = True
+        # every chat shares the (ticker, buy, sell) tuple of a column, SELL ones follow the BUY ones
+        tuples = [(ticker, True, False) for ticker in self.tickers] + [(ticker, False, True) for ticker in self.tickers]
+        entries = columns + (codes == SELL) * len(self.tickers)
+        direct = self.follows[rows, columns]
+        bounds = np.flatnonzero(np.diff(rows)) + 1
+        for start, end in zip([0] + bounds.tolist(), bounds.tolist() + [len(rows)]):
+            directAlerts, tableAlerts = alerts.setdefault(self.rowChats[rows[start]], ([], []))
+            rowDirect = direct[start:end]
+            directAlerts += map(tuples.__getitem__, entries[start:end][rowDirect].tolist())
+            tableAlerts += map(tuples.__getitem__, entries[start:end][~rowDirect].tolist())
+
+    def dispatch(self, tickers_ema: dict) -> Dict[str, tuple]:
+        """Return {chat_id: (direct alerts, alerts from the all subscription)} for a new snapshot.
+
+        Alerts are (ticker, buy, sell) tuples, direct alerts are for tickers the chat
+        subscribed to by name.
+        """
+        alerts = {}
+        with self.lock:
+            columns = [self._column(ticker) for ticker in tickers_ema]
+            vector = np.zeros(self.sent.shape[1], dtype=np.int8)
+            vector[columns] = [signal_code(data) for data in tickers_ema.values()]
+            order = np.zeros(len(vector), dtype=np.int64)
+            order[columns] = np.arange(len(columns))
+            changed = np.flatnonzero((vector != self.signals) & (vector != NONE))
+            self.signals = vector
+            chats = len(self.rowChats)
+            if len(changed) > 0 and chats > 0:
+                wanted = self.follows[:chats, changed] | self.allRows[:chats, None]
+                rows, hits = np.nonzero(wanted & (self.sent[:chats, changed] != vector[changed]))
+                self._alerts(rows, changed[hits], vector, order, alerts)
+            if self.newRows:
+                newRows = np.array(sorted(self.newRows))
+                wanted = self.follows[newRows] | self.allRows[newRows, None]
+                rows, columns = np.nonzero(wanted & (vector != NONE) & (self.sent[newRows] != vector))
+                self._alerts(newRows[rows], columns, vector, order, alerts)
+                self.newRows = set()
+        return alerts
+
+    def changes(self) -> tuple:
+        """(cleared chats, (chat_id, ticker, signal) rows) of the sent signals changed since the last call.
+
+        A cleared chat has no sent signals left, an empty signal means the row has none anymore.
+        """
+        with self.lock:
+            chats, tickers = len(self.rowChats), len(self.tickers)
+            rows, columns = np.nonzero(self.dirty[:chats, :tickers])
+            codes = self.sent[rows, columns].tolist()
+            self.dirty[rows, columns] = False
+            signals = [(self.rowChats[row], self.tickers[column], SIGNAL_NAMES[code])
+                       for row, column, code in zip(rows.tolist(), columns.tolist(), codes)]
+            clearedChats, self.clearedChats = self.clearedChats, []
+            return clearedChats, signals
+
+    def restoreSent(self, rows: List) -> None:
+        """Load persisted (chat_id, ticker, signal) rows of subscribed chats so a restart does not send old alerts again."""
+        with self.lock:
+            for chat_id, ticker, signal in rows:
+                row = self.chatRows.get(chat_id)
+                if row is not None:
+                    # _column() may grow sent, it has to run before sent is looked up
+                    column = self._column(ticker)
+                    self.sent[row, column] = SIGNAL_CODES[signal]
+
+    def sentSignals(self, chat_id) -> List[tuple]:
+        """(ticker, signal) rows of the last signals sent to a chat."""
+        with self.lock:
+            row = self.chatRows.get(chat_id)
+            if row is None:
+                return []
+            sent = self.sent[row, :len(self.tickers)]
+            return [(self.tickers[column], SIGNAL_NAMES[sent[column]]) for column in np.flatnonzero(sent).tolist()]
+
+    def followed(self) -> tuple:
+        """(tickers subscribed by name, whether a chat subscribed to all tickers)."""
+        with self.lock:
+            return {self.tickers[column] for column in np.flatnonzero(self.followers).tolist()}, bool(self.allRows.any())
+
+    def subscriptions(self) -> List[tuple]:
+        with self.lock:
+            rows = []
+            for row, chat_id in enumerate(self.rowChats):
+                if chat_id is None:
+                    continue
+                rows += [(chat_id, self.tickers[column]) for column in np.flatnonzero(self.follows[row]).tolist()]
+                if self.allRows[row]:
+                    rows.append((chat_id, ALL_TICKERS))
+            return rows
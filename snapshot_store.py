@@ -0,0 +1,80 @@
+import atexit
+import json
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+sql_create_snapshots_table = """ CREATE TABLE IF NOT EXISTS snapshots (
+                                        shard integer PRIMARY KEY,
+                                        shards integer NOT NULL,
+                                        version integer NOT NULL,
+                                        updated real NOT NULL,
+                                        signals text NOT NULL
+                                    ); """
+
+Snapshot = namedtuple('Snapshot', ['version', 'signals', 'updated'])
+
+
+class SnapshotStore:
+    """Signals published by the indicator workers, one row per hash shard of the symbol universe.
+
+    A worker replaces the row of its shard with a single upsert, so a reader sees
+    either the previous or the new signals of a shard, never a mix. Every publish
+    bumps the version of the shard and the tuple of shard versions is the version
+    of the merged snapshot, readers only decode the rows when it changed.
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.lock = threading.Lock()
+        self.con = sqlite3.connect(self.db_file, check_same_thread=False, timeout=30)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        with self.lock, self.con:
+            self.con.execute(sql_create_snapshots_table)
+        atexit.register(self.close)
+
+    def close(self) -> None:
+        with self.lock:
+            self.con.close()
+
+    def publish(self, shard, shards, signals: dict, updated=None) -> int:
+        """Swap in the {timeframe: {ticker: signal}} of a shard, returns its new version."""
+        data = json.dumps(signals)
+        with self.lock, self.con:
+            row = self.con.execute("INSERT INTO snapshots (shard, shards, version, updated, signals) VALUES (?,?,1,?,?) "
+                                   "ON CONFLICT (shard) DO UPDATE SET shards=excluded.shards, version=version+1, "
+                                   "updated=excluded.updated, signals=excluded.signals RETURNING version",
+                                   (shard, shards, time.time() if updated is None else updated, data)).fetchone()
+        return row[0]
+
+    def version(self) -> tuple:
+        """((shard, version), ...) of the shards of the current layout."""
+        with self.lock:
+            rows = self.con.execute("SELECT shard, shards, version, updated FROM snapshots ORDER BY shard").fetchall()
+        return tuple((shard, version) for shard, shards, version, updated in self._current(rows))
+
+    @staticmethod
+    def _current(rows):
+        # after a change of the shard count rows of the old layout may linger, the last published layout wins
+        if not rows:
+            return []
+        shards = max(rows, key=lambda row: row[3])[1]
+        return [row for row in rows if row[1] == shards and row[0] < shards]
+
+    def read(self, known=None):
+        """Merged Snapshot of all shards, None when its version is still `known`.
+
+        updated is the publish time of the stalest shard.
+        """
+        if known is not None and self.version() == known:
+            return None
+        with self.lock:
+            rows = self.con.execute("SELECT shard, shards, version, updated, signals FROM snapshots ORDER BY shard").fetchall()
+        rows = self._current(rows)
+        signals = {}
+        for shard, shards, version, updated, data in rows:
+            for timeframe, tickers in json.loads(data).items():
+                signals.setdefault(timeframe, {}).update(tickers)
+        return Snapshot(tuple((row[0], row[2]) for row in rows), signals, min((row[3] for row in rows), default=0))
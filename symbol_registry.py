@@ -0,0 +1,119 @@
+import bisect
+import logging
+import threading
+import time
+from typing import Callable, List
+from utils import list_to_tables, symbols_to_table
+
+LEVERAGED_SUFFIXES = ('UP', 'DOWN', 'BULL', 'BEAR')
+MAX_CACHED_PREFIXES = 256
+RETRY_PAUSE = 60
+
+
+def symbols_from_exchange_info(info: dict, quotes=('USDT',)) -> List:
+    """Spot symbols trading against one of quotes, leveraged tokens (BTCUP, ETHBULL, BULL...) are skipped.
+
+    A base asset is a leveraged token when it is another base asset followed by
+    one of LEVERAGED_SUFFIXES, so JUP or SUPER are kept.
+    """
+    symbols = [symbol for symbol in info['symbols']
+               if symbol.get('status') == 'TRADING' and symbol.get('quoteAsset') in quotes
+               and symbol.get('isSpotTradingAllowed', True)]
+    bases = {symbol['baseAsset'] for symbol in symbols}
+    bases.add('')
+
+    def leveraged(base):
+        return any(base.endswith(suffix) and base[:-len(suffix)] in bases for suffix in LEVERAGED_SUFFIXES)
+
+    return sorted(symbol['symbol'] for symbol in symbols if not leveraged(symbol['baseAsset']))
+
+
+class SymbolRegistry:
+    """Tradable symbols with O(1) membership, prefix search and precomputed /list pages.
+
+    The symbols are kept as a frozenset for validation and as a sorted tuple, where
+    the symbols starting with a prefix are one contiguous slice found by bisect.
+    Rendered pages are built once per refresh (and per searched prefix) instead of
+    on every /list. refresh() only asks exchangeInfo again once `ttl` expired.
+    """
+
+    def __init__(self, quotes=('USDT',), ttl=3600, pageSize=50, clock=time.time):
+        self.logger = logging.getLogger('trading_bot.symbol_registry')
+        self.quotes = tuple(quotes)
+        self.ttl = ttl
+        self.pageSize = pageSize
+        self.clock = clock
+        self.symbols = ()
+        self.index = frozenset()
+        self.updated = 0
+        self.version = 0
+        self.pageCache = {}
+        self.lock = threading.Lock()
+        # the refresh thread and the indicator startup may both find the symbols expired
+        self.refreshLock = threading.Lock()
+
+    def __contains__(self, symbol) -> bool:
+        return symbol in self.index
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def load(self, symbols: List, updated=None) -> None:
+        """Replace the symbols, e.g. with the ones persisted by the last run."""
+        symbols = tuple(sorted(symbols))
+        pages = {'': list_to_tables(symbols, self.pageSize, symbols_to_table)}
+        with self.lock:
+            self.symbols = symbols
+            self.index = frozenset(symbols)
+            self.updated = self.clock() if updated is None else updated
+            self.version += 1
+            self.pageCache = pages
+
+    def expired(self) -> bool:
+        return self.clock() - self.updated >= self.ttl
+
+    def refresh(self, fetchExchangeInfo: Callable, force=False) -> bool:
+        """Reload the symbols from exchangeInfo when the ttl expired, returns whether they were reloaded."""
+        with self.refreshLock:
+            if not force and not self.expired():
+                return False
+            self.load(symbols_from_exchange_info(fetchExchangeInfo(), self.quotes))
+        self.logger.info(f'{len(self.symbols)} symbols trading against {",".join(self.quotes)}')
+        return True
+
+    def run(self, config, fetchExchangeInfo: Callable, onRefresh: Callable = None, sleep=time.sleep) -> None:
+        """Keep the symbols fresh until config["keepRunning"] turns False."""
+        while config["keepRunning"]:
+            try:
+                if self.refresh(fetchExchangeInfo) and onRefresh is not None:
+                    onRefresh()
+                pause = self.updated + self.ttl - self.clock()
+            except Exception:
+                self.logger.exception('failed to refresh the symbols')
+                pause = min(RETRY_PAUSE, self.ttl)
+            sleep(max(pause, 1))
+
+    def startThread(self, config, fetchExchangeInfo: Callable, onRefresh: Callable = None) -> threading.Thread:
+        thread = threading.Thread(target=self.run, args=(config, fetchExchangeInfo, onRefresh), daemon=True)
+        thread.start()
+        return thread
+
+    def prefix(self, prefix) -> tuple:
+        """Symbols starting with prefix, in order."""
+        symbols = self.symbols
+        start = bisect.bisect_left(symbols, prefix)
+        end = bisect.bisect_left(symbols, prefix + '\uffff', start)
+        return symbols[start:end]
+
+    def pages(self, prefix='') -> List:
+        """Rendered /list tables of the symbols starting with prefix."""
+        prefix = prefix.upper()
+        with self.lock:
+            pages = self.pageCache.get(prefix)
+        if pages is None:
+            pages = list_to_tables(self.prefix(prefix), self.pageSize, symbols_to_table)
+            with self.lock:
+                if len(self.pageCache) > MAX_CACHED_PREFIXES:
+                    self.pageCache = {'': self.pageCache['']}
+                self.pageCache[prefix] = pages
+        return pages
@@ -4,21 +4,28 @@ import logging
 import time
 import threading
 
-from telegram import Update,ParseMode
-from telegram.ext import Updater, CommandHandler, CallbackContext
+from telegram import Update,ParseMode, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
+from telegram.ext import Updater, CommandHandler, CallbackContext, CallbackQueryHandler, MessageHandler, Filters
 
 from dotenv import dotenv_values
 
-from binance_client import BinanceClient
-from binance_time_utils import convertToStartTime, convertToInterval
+from binance_client import BinanceClient, SIGNAL_CANDLES
+from binance_time_utils import convertToCandlesStart, DEFAULT_TIMEFRAME, intervalToMilliseconds, isTimeframeOf
 from db_manager import DbManager
-from utils import symbols_alerts_to_table, symbols_to_table, list_to_tables
+from indicators import DEFAULT_STRATEGY, INDICATORS, lookback, signal_key
+from kline_store import KlineStore
+from message_sender import MessageSender
+from metrics import REGISTRY, MetricsServer
+from refresh_scheduler import RefreshScheduler
+from signal_dispatcher import SignalDispatcher
+from snapshot_store import SnapshotStore
+from symbol_registry import SymbolRegistry
+from utils import symbols_alerts_to_table, list_to_tables, TablesCache
 
 
 env = dotenv_values('.env')
 
-db = DbManager("bot.db")
-
 # Enable logging
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO
@@ -27,12 +34,55 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 MAX_ROWS_IN_TABLE = 50
+# one base series is fetched per ticker, the candles of every timeframe are resampled from it
+BASE_INTERVAL = env.get('BASE_INTERVAL', '15m')
+TIMEFRAMES = env.get('TIMEFRAMES', '15m,1h,4h,1d').split(',')
+# strategies chats can subscribe to, the ema crossover is always computed, the others only while somebody follows them
+STRATEGIES = [DEFAULT_STRATEGY] + [strategy for strategy in env.get('STRATEGIES', 'ema,macd,rsi,bollinger').split(',')
+                                   if strategy != DEFAULT_STRATEGY]
+# the kline stream only computes the ema crossover
+KLINE_STREAMING = env.get('KLINE_STREAMING', 'false').lower() == 'true'
+# {signal_key(timeframe, strategy): {ticker: signal}}
 tickers_ema = {}
+tickers_ema_version = 0
+tickers_ema_updated = 0
+# time the signals are stamped with (their "updated" field), the load simulation runs a virtual one
+clock = time.time
 bbotHasError = False
-supported_tickets = ['BTCUSDT']
-sent_signals = {}
-db = DbManager("bot.db")
-bClient = BinanceClient(testnet=False)
+# symbols of these quote assets can be subscribed, exchangeInfo is asked again after SYMBOLS_TTL seconds
+QUOTE_ASSETS = env.get('QUOTE_ASSETS', 'USDT').split(',')
+SYMBOLS_TTL = int(env.get('SYMBOLS_TTL', 3600))
+MAX_PREFIX_LENGTH = 20
+registry = SymbolRegistry(QUOTE_ASSETS, SYMBOLS_TTL, MAX_ROWS_IN_TABLE)
+# until the first refresh, updated=0 makes it expired right away
+registry.load(['BTCUSDT'], updated=0)
+ticker_tables = {(timeframe, strategy): TablesCache(MAX_ROWS_IN_TABLE, symbols_alerts_to_table)
+                 for timeframe in TIMEFRAMES for strategy in STRATEGIES}
+alertDispatchers = {(timeframe, strategy): SignalDispatcher() for timeframe in TIMEFRAMES for strategy in STRATEGIES}
+sender = None
+# opened by main(), importing the bot (e.g. by the load simulation) must not touch bot.db
+db = None
+# created by the background startup thread, connecting to Binance must not delay serving users
+bClient = None
+# the symbol refresh runs in every mode and has a client of its own, created on first use
+symbolsClient = None
+# persisting the snapshot on every streamed candle would be wasteful, it is saved at most this often (seconds)
+SNAPSHOT_SAVE_INTERVAL = 60
+snapshot_saved = 0
+# symbols nobody subscribed to are refreshed after every close of this interval, never when it is 'off'
+UNFOLLOWED_REFRESH = env.get('UNFOLLOWED_REFRESH', max(TIMEFRAMES, key=intervalToMilliseconds))
+# the refreshes after a candle close are spread over this many seconds
+REFRESH_JITTER = float(env.get('REFRESH_JITTER', 10))
+# subscriptions are looked at least this often (seconds), a failed batch is retried after RETRY_PAUSE
+MAX_PAUSE = 60
+RETRY_PAUSE = 30
+
+CYCLE_SECONDS = REGISTRY.histogram('bot_cycle_seconds', 'Duration of one indicator cycle over all tickers')
+FANOUT_SECONDS = REGISTRY.histogram('bot_fanout_seconds', 'Time to dispatch one snapshot and enqueue its alerts')
+CYCLE_FAILURES = REGISTRY.counter('bot_cycle_failures', 'Indicator cycles that raised')
+REGISTRY.gauge('bot_snapshot_age_seconds', 'Seconds since tickers_ema was last updated', lambda: snapshot_age())
+REGISTRY.gauge('bot_snapshot_tickers', 'Tickers in the tickers_ema snapshot', lambda: snapshot_size())
+REGISTRY.gauge('bot_send_queue', 'Messages waiting in the outbound queue', lambda: sender.queued() if sender else 0)
     
 
 
@@ -44,193 +94,442 @@ bClient = BinanceClient(testnet=False)
 # we decided to have it present as context.
 def start(update: Update, context: CallbackContext) -> None:
     """Sends explanation on how to use the bot."""
-    update.message.reply_text('Hi! Use /subscribe <ticker> to get buy/sell signal')
+    update.message.reply_text(f'Hi! Use /subscribe <ticker> {usage_options()} to get buy/sell signal, '
+                              f'the default timeframe is {DEFAULT_TIMEFRAME} and the default strategy {DEFAULT_STRATEGY}. '
+                              f'/list [prefix] shows the supported tickers')
+
+
+def usage_options() -> str:
+    return f'[{"|".join(TIMEFRAMES)}] [{"|".join(STRATEGIES)}]'
+
+def parse_options(args) -> tuple:
+    """(timeframe, strategy) of the arguments following the ticker, in any order, the defaults when not given."""
+    timeframe, strategy = DEFAULT_TIMEFRAME, DEFAULT_STRATEGY
+    for arg in args[1:]:
+        arg = str(arg)
+        if arg in TIMEFRAMES:
+            timeframe = arg
+        elif arg.lower() in STRATEGIES:
+            strategy = arg.lower()
+        else:
+            raise ValueError(f'unsupported timeframe or strategy {arg}')
+    if timeframe not in TIMEFRAMES:
+        raise ValueError(f'unsupported timeframe {timeframe}')
+    return timeframe, strategy
 
+def unavailable_reason(strategy):
+    """Why a strategy can not be subscribed to, None when its signals are computed."""
+    if KLINE_STREAMING and strategy != DEFAULT_STRATEGY:
+        return f'Sorry, only the {DEFAULT_STRATEGY} strategy is available while klines are streamed'
+    return None
 
-def subscribe_response(context: CallbackContext) -> None:
-    """Send the alarm message."""
-    global tickers_ema, bbotHasError, supported_tickets, sent_signals
-    job = context.job
-    ticker = job.name.split("_")[1]
-    chat = job.name.split("_")[0]
-    prev_signal = sent_signals.get(job.name, '')
-    logger.info(f'subscribe_response for ticket: {ticker}')
-    if ticker != 'all':
-        prev_signal = sent_signals.get(job.name, '')
-        curr_data = tickers_ema.get(ticker, {"buy": False, "sell": False, "fast": -1, "signal": -1})
-        logger.info(f'subscribe_response current ema data: {curr_data}, prev signal: { prev_signal}')
-        if bbotHasError:
-            logger.info(f'subscribe_response bot has error, response will not be sent')
-            return
-        if curr_data['buy'] and prev_signal != 'buy':
-            context.bot.send_message(job.context, text=f'BUY ALERT {ticker}')
-            sent_signals[job.name] = 'buy'
-        elif curr_data['sell'] and  prev_signal != 'sell':
-            context.bot.send_message(job.context, text=f'SELL ALERT {ticker}')
-            sent_signals[job.name] = 'sell'
-    else:
-        alert_data = []
-        for ticker_key in tickers_ema:
-             curr_data = tickers_ema.get(ticker_key, {"buy": False, "sell": False, "fast": -1, "signal": -1})
-             logger.info(f'{ticker_key} Curr data {curr_data}')
-             ticker_job_name = f'{chat}_{ticker_key}'
-             prev_signal = sent_signals.get(ticker_job_name, '')
-             if curr_data['buy'] and prev_signal != 'buy':
-                alert_data.append((ticker_key, True, False))
-                sent_signals[ticker_job_name] = 'buy'
-             elif curr_data['sell'] and  prev_signal != 'sell':
-                alert_data.append((ticker_key, False, True))
-                sent_signals[ticker_job_name] = 'sell'
-        if len(alert_data) > 0:
-             #update.message.reply_text(f'<pre>{table}</pre>', parse_mode=ParseMode.HTML)        
-             tables = list_to_tables(alert_data, MAX_ROWS_IN_TABLE, symbols_alerts_to_table)
-             for table in tables:
-                context.bot.send_message(job.context, text=f'{table}', parse_mode=ParseMode.HTML)
-        else:
-            logger.info(f'No new alert for job {job.name}')     
-             
+def channel_label(timeframe, strategy) -> str:
+    """Timeframe and strategy for messages, the defaults are left out."""
+    return ' '.join(part for part, default in ((timeframe, DEFAULT_TIMEFRAME), (strategy, DEFAULT_STRATEGY)) if part != default)
+
+def alert_text(ticker, timeframe, strategy, buy) -> str:
+    text = f'{"BUY" if buy else "SELL"} ALERT {ticker}'
+    label = channel_label(timeframe, strategy)
+    return f'{text} {label}' if label else text
 
-def remove_job_if_exists(name: str, context: CallbackContext) -> bool:
-    """Remove job with given name. Returns whether job was removed."""
-    current_jobs = context.job_queue.get_jobs_by_name(name)
-    if not current_jobs:
-        return False
-    for job in current_jobs:
-        job.schedule_removal()
-    return True
+
+def fresh_signals(snapshot, timeframe, now) -> dict:
+    """The signals of a snapshot computed within the last candle of timeframe.
+
+    Symbols nobody followed at timeframe are refreshed at UNFOLLOWED_REFRESH, their
+    older signals are held back until the refresh a new subscription asks for lands.
+    """
+    oldest = now - intervalToMilliseconds(timeframe) / 1000 - MAX_PAUSE
+    return {ticker: data for ticker, data in snapshot.items() if data.get('updated', 0) >= oldest}
+
+def subscribe_response(context: CallbackContext) -> None:
+    """Send the alert messages for the latest indicator cycle."""
+    global tickers_ema, bbotHasError
+    if bbotHasError:
+        logger.info(f'subscribe_response bot has error, response will not be sent')
+        return
+    now = clock()
+    with FANOUT_SECONDS.time():
+        for (timeframe, strategy), alertDispatcher in alertDispatchers.items():
+            alerts = alertDispatcher.dispatch(fresh_signals(tickers_ema.get(signal_key(timeframe, strategy), {}), timeframe, now))
+            if not alerts:
+                continue
+            label = channel_label(timeframe, strategy)
+            logger.info(f'subscribe_response sending {timeframe} {strategy} alerts to {len(alerts)} chats')
+            saveSent(timeframe, strategy)
+            for chat_id, (direct_alerts, table_alerts) in alerts.items():
+                for ticker, buy, sell in direct_alerts:
+                    sender.send(chat_id, alert_text(ticker, timeframe, strategy, buy))
+                if len(table_alerts) > 0:
+                    tables = list_to_tables(table_alerts, MAX_ROWS_IN_TABLE, symbols_alerts_to_table)
+                    for table in tables:
+                        text = f'{label}\n{table}' if label else f'{table}'
+                        sender.send(chat_id, text, parse_mode=ParseMode.HTML)
+
+
+def notify_subscribers(job_queue) -> None:
+    """Run the fan-out once on the job queue, notifications in quick succession are coalesced."""
+    if not job_queue.get_jobs_by_name('subscribe_response'):
+        job_queue.run_once(subscribe_response, 1, name='subscribe_response')
 
 
 def subscribe(update: Update, context: CallbackContext) -> None:
-    """Add a job to the queue."""
+    """Add a subscription, alerts are sent on the next indicator cycle."""
     chat_id = update.message.chat_id
     try:
-        # args[0] should contain the ticker
+        # args[0] should contain the ticker, then the optional timeframe and strategy
         ticker = str(context.args[0])
-        if ticker !='all' and ticker not in supported_tickets:
+        timeframe, strategy = parse_options(context.args)
+        if unavailable_reason(strategy):
+            update.message.reply_text(unavailable_reason(strategy))
+            return
+        if ticker !='all' and ticker not in registry:
             update.message.reply_text(f'Sorry we can not subscribe to your ticker! Please use one of the supported tickets or all,to get all supported tickers Use  /list')
             return
 
-        job_name = f'{str(chat_id)}_{ticker}'
-        job_removed = remove_job_if_exists(name=job_name, context=context)
-        # context.job_queue.run_once(alarm, due, context=chat_id, name=str(chat_id))
-        context.job_queue.run_repeating(subscribe_response, 300, context=chat_id, name=job_name)
-        db.insertJob(str(chat_id), ticker)
+        job_removed = alertDispatchers[(timeframe, strategy)].subscribe(chat_id, ticker)
+        db.insertJob(str(chat_id), ticker, timeframe, strategy)
+        notify_subscribers(context.job_queue)
         
 
-        text = f'You successfully subscribed to ticker: {ticker}'
+        text = f'You successfully subscribed to ticker: {ticker} {timeframe} {strategy}'
         if job_removed:
             text += ' Old one was removed.'
         update.message.reply_text(text)
 
     except (IndexError, ValueError):
-        update.message.reply_text('Usage: /subscribe <ticker|all>')
+        update.message.reply_text(f'Usage: /subscribe <ticker|all> {usage_options()}')
+
+def snapshot_size() -> int:
+    return max((len(snapshot) for snapshot in tuple(tickers_ema.values())), default=0)
+
+def snapshot_age() -> float:
+    return time.time() - tickers_ema_updated if tickers_ema_updated else float('nan')
+
+def status_text() -> str:
+    """Health of the pipeline: snapshot freshness, cycle time and the latency of every stage."""
+    metrics = REGISTRY.metrics
+    lines = [f'Error: {bbotHasError}',
+             f'Snapshot: {snapshot_size()} tickers in {len(tickers_ema)} timeframes, ' + (f'{snapshot_age():.0f}s old' if tickers_ema_updated else 'never updated'),
+             f'Last cycle: {CYCLE_SECONDS.last:.2f}s, mean {CYCLE_SECONDS.mean():.2f}s over {CYCLE_SECONDS.count} cycles, '
+             f'{CYCLE_FAILURES.total()} failed']
+    for stage in ('fetch', 'parse', 'compute', 'fanout', 'send'):
+        histogram = metrics.get(f'bot_{stage}_seconds')
+        if histogram is not None and histogram.count:
+            lines.append(f'{stage}: p50 <= {histogram.quantile(0.5)}s, p99 <= {histogram.quantile(0.99)}s, '
+                         f'mean {histogram.mean():.4f}s, n={histogram.count}')
+    if 'bot_symbol_failures' in metrics:
+        lines.append(f'Symbol failures: {metrics["bot_symbol_failures"].total()}')
+    if 'bot_rest_weight' in metrics:
+        lines.append(f'REST weight: {metrics["bot_rest_weight"].total()} spent, '
+                     f'{metrics["bot_rest_used_weight_1m"].value()} used this minute')
+    lines.append(f'Send queue: {sender.queued() if sender else 0} messages')
+    return '\n'.join(lines)
 
 def status(update: Update, context: CallbackContext) -> None:
     """ Get status of the bot"""
-    global bbotHasError
-    status_message = f'Error: {bbotHasError}' 
-    update.message.reply_text(status_message)
+    update.message.reply_text(status_text())
+
+def list_keyboard(prefix, page, pages):
+    """Prev/next buttons of a /list page, None when everything fits one page."""
+    if pages <= 1:
+        return None
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton('« Prev', callback_data=f'list:{prefix}:{page - 1}'))
+    buttons.append(InlineKeyboardButton(f'{page + 1}/{pages}', callback_data=f'list:{prefix}:{page}'))
+    if page < pages - 1:
+        buttons.append(InlineKeyboardButton('Next »', callback_data=f'list:{prefix}:{page + 1}'))
+    return InlineKeyboardMarkup([buttons])
 
 def list(update: Update, context: CallbackContext) -> None:
-    """ Get all tickers"""
-    tables  = list_to_tables(supported_tickets, MAX_ROWS_IN_TABLE, symbols_to_table) 
-    for table in tables:
-        update.message.reply_text(f'{table}',  parse_mode=ParseMode.HTML)
+    """ Get the tickers starting with the optional prefix, one page at a time"""
+    # callback data is limited to 64 bytes and split on ':'
+    prefix = ''.join(char for char in ' '.join(context.args or ()).upper() if char.isalnum())[:MAX_PREFIX_LENGTH]
+    pages = registry.pages(prefix)
+    if not pages:
+        update.message.reply_text(f'No supported ticker starts with {prefix}')
+        return
+    update.message.reply_text(f'{pages[0]}', parse_mode=ParseMode.HTML, reply_markup=list_keyboard(prefix, 0, len(pages)))
+
+def list_page(update: Update, context: CallbackContext) -> None:
+    """Show another page of a /list answer."""
+    query = update.callback_query
+    query.answer()
+    _, prefix, page = query.data.split(':')
+    pages = registry.pages(prefix)
+    if not pages:
+        return
+    # the symbols may have been refreshed since the page was sent
+    page = min(int(page), len(pages) - 1)
+    try:
+        query.edit_message_text(f'{pages[page]}', parse_mode=ParseMode.HTML, reply_markup=list_keyboard(prefix, page, len(pages)))
+    except BadRequest as error:
+        # pressing the button of the page already shown
+        if 'not modified' not in str(error):
+            raise
 
 def ticker(update: Update, context: CallbackContext) -> None:
     """Get ticker info."""
     chat_id = update.message.chat_id
     try:
-        # args[0] should contain the ticker
+        # args[0] should contain the ticker, then the optional timeframe and strategy
         ticker = str(context.args[0])
-        if ticker != 'all' and ticker not in supported_tickets:
+        timeframe, strategy = parse_options(context.args)
+        if unavailable_reason(strategy):
+            update.message.reply_text(unavailable_reason(strategy))
+            return
+        if ticker != 'all' and ticker not in registry:
             update.message.reply_text(f'Sorry we can not get info about your ticker! Please use one of the supported tickets or all,To get all tickets use /list')
             return
+        # writers swap the snapshot before bumping the version, reading the version first never caches old tables under a new version
+        version = tickers_ema_version
+        snapshot = tickers_ema.get(signal_key(timeframe, strategy), {})
         if ticker != 'all':
-            curr_data = tickers_ema.get(ticker, {"buy": False, "sell": False, "fast": -1, "signal": -1})
-            text = f'Ticker {ticker} info: Buy: {curr_data["buy"]}, Sell: {curr_data["sell"]}, EMA fast: {curr_data["fast"]}, EMA Signal: {curr_data["signal"]}'
+            curr_data = snapshot.get(ticker, {"buy": False, "sell": False})
+            values = ', '.join(f'{label}: {curr_data.get(field, -1)}' for field, label in INDICATORS[strategy].labels.items())
+            name = f'{timeframe} {strategy}' if strategy != DEFAULT_STRATEGY else timeframe
+            text = f'Ticker {ticker} {name} info: Buy: {curr_data["buy"]}, Sell: {curr_data["sell"]}, {values}'
+            if 'updated' in curr_data:
+                text += f', updated {clock() - curr_data["updated"]:.0f}s ago'
             update.message.reply_text(text)
         else:
-            tickers_data = []
-            for ticker_key in tickers_ema:
-                curr_data = tickers_ema.get(ticker_key, {"buy": False, "sell": False, "fast": -1, "signal": -1}) 
-                tickers_data.append((ticker_key, curr_data["buy"], curr_data["sell"]))
-            
-            tables = list_to_tables(tickers_data, MAX_ROWS_IN_TABLE, symbols_alerts_to_table)
+            tables = ticker_tables[(timeframe, strategy)].get(version, lambda: [(ticker_key, curr_data["buy"], curr_data["sell"])
+                                                                                   for ticker_key, curr_data in tuple(snapshot.items())])
             for table in tables:
                 update.message.reply_text(f'{table}',  parse_mode=ParseMode.HTML)
     except (IndexError, ValueError):
-        update.message.reply_text('Usage: /ticker <ticker>')
+        update.message.reply_text(f'Usage: /ticker <ticker|all> {usage_options()}')
 
 
 
 def unsubscribe(update: Update, context: CallbackContext) -> None:
-    """Remove the job if the user changed their mind."""
-    global sent_signals
+    """Remove the subscription if the user changed their mind."""
     chat_id = update.message.chat_id
     ticker = str(context.args[0])
     if not (ticker and ticker.strip()):
       update.message.reply_text('Sorry we can not guess your ticker! Usage: /unsubscribe <ticker>')
       return
-
-    job_name = f'{str(chat_id)}_{ticker}'
-    job_removed = remove_job_if_exists(name=job_name, context= context)
-    sent_signals.pop(job_name, None) 
-    text = f'You successfully unsubscribed from {ticker}' if job_removed else f'You have no active signal for ticker {ticker}'
+    try:
+        timeframe, strategy = parse_options(context.args)
+    except ValueError:
+        update.message.reply_text(f'Usage: /unsubscribe <ticker|all> {usage_options()}')
+        return
+
+    alertDispatcher = alertDispatchers[(timeframe, strategy)]
+    job_removed = alertDispatcher.unsubscribe(chat_id, ticker)
+    text = f'You successfully unsubscribed from {ticker} {timeframe} {strategy}' if job_removed else f'You have no active signal for ticker {ticker} {timeframe} {strategy}'
     update.message.reply_text(text)
     try:
-        db.deleteJob(str(chat_id), ticker)
+        db.deleteJob(str(chat_id), ticker, timeframe, strategy)
+        saveSent(timeframe, strategy)
     except Exception:
         logger.error(f'Failed to delete job from db for chat: {chat_id}, ticker: {ticker}')   
 
 
-def runBBot(config, interval, start, tickers, bClient):
-    global tickers_ema, bbotHasError
-    intervalStr = convertToInterval(interval,'d')
-    startStr=convertToStartTime(start, 'days')
+def followed_tickers(universe) -> tuple:
+    """({ticker: shortest timeframe somebody subscribed to it at}, {ticker: (timeframe, strategy) keys it is followed for})."""
+    intervals = {}
+    demand = {}
+    for timeframe, strategy in sorted(alertDispatchers, key=lambda key: intervalToMilliseconds(key[0]), reverse=True):
+        tickers, everything = alertDispatchers[(timeframe, strategy)].followed()
+        for ticker in (universe if everything else tickers):
+            intervals[ticker] = timeframe
+            demand.setdefault(ticker, set()).add((timeframe, strategy))
+    return intervals, {ticker: frozenset(keys) for ticker, keys in demand.items()}
+
+def active_strategies(timeframes) -> dict:
+    """{timeframe: strategies to compute}, the ema crossover and the strategies somebody subscribed to."""
+    strategies = {timeframe: [DEFAULT_STRATEGY] for timeframe in timeframes}
+    for (timeframe, strategy), alertDispatcher in alertDispatchers.items():
+        tickers, everything = alertDispatcher.followed()
+        if strategy != DEFAULT_STRATEGY and timeframe in strategies and (tickers or everything):
+            strategies[timeframe].append(strategy)
+    return strategies
+
+def merge_signals(snapshot, signals, removed=(), strategies=None) -> dict:
+    """New {signal_key: {ticker: signal}} with the signals of a batch, readers keep the previous one unchanged.
+
+    With strategies ({timeframe: strategies} as active_strategies returns) the signals
+    of strategies nobody follows any more are dropped.
+    """
+    keys = set(snapshot) | set(signals)
+    if strategies is not None:
+        keys &= {signal_key(timeframe, strategy) for timeframe, active in strategies.items() for strategy in active}
+    merged = {}
+    for key in keys:
+        tickers = dict(snapshot.get(key, {}))
+        for ticker in removed:
+            tickers.pop(ticker, None)
+        tickers.update(signals.get(key, {}))
+        merged[key] = tickers
+    return merged
+
+def runBBot(config, baseInterval, timeframes, tickers, bClient, onCycle=None, scheduler=None, sleep=time.sleep):
+    """Refresh the signals of tickers as their candles close, tickers may be a function to follow a changing list."""
+    global tickers_ema, tickers_ema_version, tickers_ema_updated, bbotHasError
+    startStr = convertToCandlesStart(lookback(STRATEGIES), timeframes)
+    if scheduler is None:
+        scheduler = RefreshScheduler(None if UNFOLLOWED_REFRESH == 'off' else UNFOLLOWED_REFRESH, jitter=REFRESH_JITTER)
     cycle = 0
     while (config["keepRunning"]):
-        cycle +=1
-        logger.info(f'Running step #{cycle}')
+        universe = tickers() if callable(tickers) else tickers
+        removed = scheduler.update(universe, *followed_tickers(universe))
+        batch = scheduler.due()
+        if batch or removed:
+            cycle +=1
+            logger.info(f'Running step #{cycle} for {len(batch)} tickers')
+            started = time.perf_counter()
+            try:
+                strategies = active_strategies(timeframes)
+                signals = bClient.timeframes_checker(baseInterval, startStr, batch, timeframes, SIGNAL_CANDLES,
+                                                     strategies) if batch else {}
+                tickers_ema = merge_signals(tickers_ema, signals, removed, strategies)
+                tickers_ema_version += 1
+                tickers_ema_updated = time.time()
+                CYCLE_SECONDS.observe(time.perf_counter() - started)
+                logger.info(f'Ema results for {len(batch)} of {snapshot_size()} tickers in {len(tickers_ema)} timeframes in {CYCLE_SECONDS.last:.2f}s')
+                saveSnapshot()
+                bbotHasError = False
+                if onCycle is not None:
+                    onCycle()
+            except Exception:
+                logger.exception("An exception was thrown!")
+                CYCLE_FAILURES.inc()
+                bbotHasError = True
+                scheduler.retry(batch, RETRY_PAUSE)
+        sleep(max(min(scheduler.wait(), MAX_PAUSE), 1))
+
+def __runBBot__(config):
+    """Connect to Binance and run the indicators, off the startup path of the bot."""
+    global bClient, bbotHasError
+    while (config["keepRunning"]):
         try:
-            tickers_ema = bClient.ema_checker(interval=intervalStr, start=startStr, tickers=tickers)
-            logger.info(f'Ema results #{tickers_ema}')
-            bbotHasError = False                   
+            bClient = BinanceClient(testnet=False, klineStore=KlineStore('klines'))
+            # the indicators start from fresh symbols, unless the registry thread already refreshed them
+            refreshTickers(bClient)
+            break
+        except Exception:
+            logger.exception("Binance is not reachable, retrying in 60s")
+            bbotHasError = True
+            time.sleep(60)
+    if not config["keepRunning"]:
+        return
+    if KLINE_STREAMING:
+        from kline_stream import KlineStream
+        logger.info('Streaming klines instead of polling')
+        # the stream subscribes the symbols known at start, new listings are followed after a restart
+        config["stream"] = KlineStream(bClient, registry.symbols, BASE_INTERVAL, convertToCandlesStart(SIGNAL_CANDLES, TIMEFRAMES),
+                                       lambda symbol, timeframe, signal: publish_signal(symbol, timeframe, signal, config["job_queue"]),
+                                       timeframes=TIMEFRAMES, onStatus=stream_status)
+        config["stream"].startThread()
+    else:
+        runBBot(config, BASE_INTERVAL, TIMEFRAMES, lambda: registry.symbols, bClient, config.get("onCycle"))
+
+def refreshTickers(bClient) -> None:
+    """Ask exchangeInfo for the symbols unless the ones of the last run are still fresh."""
+    if registry.refresh(bClient.get_exchange_info):
+        saveSymbols()
+
+def exchangeInfo() -> dict:
+    """exchangeInfo for the registry refresh thread, a Binance outage is retried by SymbolRegistry.run."""
+    global symbolsClient
+    if symbolsClient is None:
+        symbolsClient = BinanceClient(testnet=False)
+    return symbolsClient.get_exchange_info()
+
+def saveSymbols() -> None:
+    db.saveState('symbols', {"quotes": registry.quotes, "symbols": registry.symbols}, registry.updated)
+
+def saveSent(timeframe, strategy) -> None:
+    """Persist the sent signals of a timeframe and strategy that changed since the last save."""
+    clearedChats, signals = alertDispatchers[(timeframe, strategy)].changes()
+    if clearedChats or signals:
+        db.saveSignalChanges(timeframe, strategy, [str(chat_id) for chat_id in clearedChats],
+                             [(str(chat_id), ticker, signal) for chat_id, ticker, signal in signals])
+
+def saveSnapshot(force=False) -> None:
+    """Persist tickers_ema so the next start can serve it right away."""
+    global snapshot_saved
+    if force or time.time() - snapshot_saved >= SNAPSHOT_SAVE_INTERVAL:
+        snapshot_saved = time.time()
+        db.saveState('tickers_ema', tickers_ema, tickers_ema_updated)
+
+def loadState(db: DbManager) -> None:
+    """Serve the symbols and signals of the last run until the background refresh replaces them."""
+    global tickers_ema, tickers_ema_version, tickers_ema_updated
+    state = db.getState('symbols')
+    # symbols saved for other quote assets are refreshed right away
+    if state is not None and tuple(state[0]["quotes"]) == registry.quotes:
+        registry.load(state[0]["symbols"], state[1])
+    state = db.getState('tickers_ema')
+    if state is not None:
+        tickers_ema, tickers_ema_updated = state
+        tickers_ema_version += 1
+        logger.info(f'Loaded the snapshot of {snapshot_size()} tickers from {time.time() - tickers_ema_updated:.0f}s ago')
+
+def watchSnapshots(config, store: SnapshotStore, onCycle=None, pause=5):
+    """Follow the signals the indicator workers publish to the snapshot store instead of computing them here."""
+    global tickers_ema, tickers_ema_version, tickers_ema_updated, bbotHasError
+    version = None
+    while (config["keepRunning"]):
+        try:
+            snapshot = store.read(version)
+            if snapshot is not None:
+                version = snapshot.version
+                tickers_ema = snapshot.signals
+                tickers_ema_version += 1
+                tickers_ema_updated = snapshot.updated
+                logger.info(f'Snapshot {version} with {snapshot_size()} tickers in {len(tickers_ema)} timeframes')
+                bbotHasError = False
+                if onCycle is not None:
+                    onCycle()
         except Exception:
             logger.exception("An exception was thrown!")
-            bbotHasError = True   
-        time.sleep(3600)
-
-def __runBBot__(config):
-    runBBot(config,1, 30, supported_tickets, bClient) 
+            bbotHasError = True
+        time.sleep(pause)
+
+def publish_signal(symbol, timeframe, signal, job_queue) -> None:
+    """Store the signal of a candle that just closed on the kline stream and notify subscribers."""
+    global tickers_ema, tickers_ema_version, tickers_ema_updated
+    # readers on other threads keep iterating the previous dicts, only the changed timeframe is copied
+    signals = dict(tickers_ema.get(timeframe, {}))
+    signals[symbol] = signal
+    tickers_ema = {**tickers_ema, timeframe: signals}
+    tickers_ema_version += 1
+    tickers_ema_updated = time.time()
+    saveSnapshot()
+    notify_subscribers(job_queue)
+
+def stream_status(connected) -> None:
+    """Flag the error while a kline stream connection is down, until it reconnected and backfilled."""
+    global bbotHasError
+    if connected == bbotHasError:
+        logger.info(f'kline stream {"connected" if connected else "disconnected"}')
+    bbotHasError = not connected
 
-def loadJobs(updater: Updater, db: DbManager) -> None:
+def loadJobs(db: DbManager) -> None:
     jobs = db.getJobs()
     if len(jobs) > 0:
         for job in jobs:
-            job_name = f'{str(job[1])}_{job[2]}'
-            updater.job_queue.run_repeating(subscribe_response, 300, context=job[1], name=job_name)
+            if (job[3], job[4]) not in alertDispatchers or unavailable_reason(job[4]):
+                logger.warning(f'Skip job from db {job}, timeframe {job[3]} or strategy {job[4]} is not enabled')
+                continue
+            alertDispatchers[(job[3], job[4])].subscribe(int(job[1]), job[2])
             logger.info(f'Add job from db {job}')
-    
-def main() -> None:
-    """Run bot."""
-    global supported_tickets
-    
-    logger.info('Start running ema bot')
-    supported_tickets = bClient.get_usdt_tickers()
-    emaBotConfig = {"keepRunning": True}
-    run_app_thread = threading.Thread(target=__runBBot__, args=(emaBotConfig,))
-    run_app_thread.start()
-    
-    
-    # Create the Updater and pass it your bot's token.
-    token = env["TELEGRAM_BOT_TOKEN"]
-    updater = Updater(token)
-    logger.info("Loading jobs from db...")
-    loadJobs(updater, db)
-    # Get the dispatcher to register handlers
-    dispatcher = updater.dispatcher
-
+    sent = {}
+    for chat_id, ticker, timeframe, strategy, signal in db.getSignals():
+        sent.setdefault((timeframe, strategy), []).append((int(chat_id), ticker, signal))
+    for (timeframe, strategy), alertDispatcher in alertDispatchers.items():
+        rows = sent.get((timeframe, strategy), [])
+        # the rows of chats without subscriptions are left from earlier versions
+        stale = {chat_id for chat_id, ticker, signal in rows} - set(alertDispatcher.chatRows)
+        alertDispatcher.restoreSent(rows)
+        if stale:
+            db.saveSignalChanges(timeframe, strategy, [str(chat_id) for chat_id in stale], [])
+
+def add_handlers(dispatcher) -> None:
+    """Register the command handlers, the load simulation registers the same ones."""
     # on different commands - answer in Telegram
     dispatcher.add_handler(CommandHandler("start", start))
     dispatcher.add_handler(CommandHandler("help", start))
@@ -239,19 +538,68 @@ def main() -> None:
     dispatcher.add_handler(CommandHandler("status", status))
     dispatcher.add_handler(CommandHandler("ticker", ticker))
     dispatcher.add_handler(CommandHandler("list", list))
+    dispatcher.add_handler(CallbackQueryHandler(list_page, pattern='^list:'))
+
+def main() -> None:
+    """Run bot."""
+    global sender, db
     
-    
-    
+    logger.info('Start running ema bot')
+    for timeframe in TIMEFRAMES:
+        if not isTimeframeOf(BASE_INTERVAL, timeframe):
+            raise ValueError(f'timeframe {timeframe} can not be built from {BASE_INTERVAL} klines')
+    for strategy in STRATEGIES:
+        if strategy not in INDICATORS:
+            raise ValueError(f'unknown strategy {strategy}, the strategies are {", ".join(INDICATORS)}')
+    db = DbManager("bot.db")
+    loadState(db)
+    # Create the Updater and pass it your bot's token.
+    token = env["TELEGRAM_BOT_TOKEN"]
+    updater = Updater(token)
+    sender = MessageSender(updater.bot)
+    sender.start()
+    metricsServer = None
+    if env.get('METRICS_PORT'):
+        metricsServer = MetricsServer(int(env['METRICS_PORT']))
+        metricsServer.start()
+    logger.info("Loading jobs from db...")
+    loadJobs(db)
+
+    add_handlers(updater.dispatcher)
+    if env.get('RECORD_COMMANDS'):
+        from load_simulation import RecordingWriter
+        logger.info(f'Recording the commands to {env["RECORD_COMMANDS"]}')
+        recording = RecordingWriter(env['RECORD_COMMANDS'])
+        updater.dispatcher.add_handler(MessageHandler(Filters.command, lambda update, context: recording.write(
+            {"type": "command", "chat": update.message.chat_id, "text": update.message.text})), group=-1)
 
     # Start the Bot
     logger.info('Start running telegram bot')
     updater.start_polling()
 
+    # the indicators start after the bot already answers with the state of the last run
+    emaBotConfig = {"keepRunning": True, "onCycle": lambda: notify_subscribers(updater.job_queue),
+                    "job_queue": updater.job_queue, "stream": None}
+    # the symbols /subscribe, /ticker and /list accept are refreshed in every mode
+    registry.startThread(emaBotConfig, exchangeInfo, saveSymbols)
+    if env.get('SNAPSHOT_STORE'):
+        logger.info(f'Reading signals of the indicator workers from {env["SNAPSHOT_STORE"]}')
+        run_app_thread = threading.Thread(target=watchSnapshots, args=(emaBotConfig, SnapshotStore(env['SNAPSHOT_STORE']),
+                                                                      emaBotConfig["onCycle"]))
+    else:
+        run_app_thread = threading.Thread(target=__runBBot__, args=(emaBotConfig,))
+    run_app_thread.start()
+
     # Block until you press Ctrl-C or the process receives SIGINT, SIGTERM or
     # SIGABRT. This should be used most of the time, since start_polling() is
     # non-blocking and will stop the bot gracefully.
     updater.idle()
     emaBotConfig["keepRunning"] = False
+    if emaBotConfig["stream"] is not None:
+        emaBotConfig["stream"].stop()
+    sender.stop()
+    if metricsServer is not None:
+        metricsServer.stop()
     logger.info(f'Exiting from telegram bot...')
 
 
@@ -0,0 +1,83 @@
+import unittest
+import numpy as np
+import pandas as pd
+from algo_utils import *
+
+
+def random_closes(size, seed=1):
+    rng = np.random.default_rng(seed)
+    return np.cumsum(rng.normal(size=size)) + 100
+
+
+class TestAlgoUtils(unittest.TestCase):
+
+    def test_indicator_state_matches_pandas(self):
+        closes = random_closes(60)
+        frame = pd.DataFrame({'Close': closes})
+        ema = EMA(frame).iloc[-1]
+        macd = MACD(frame).iloc[-1]
+
+        engine = IndicatorEngine()
+        state = engine.advance('BTCUSDT', range(len(closes)), closes)
+        values = state.values()
+        self.assertAlmostEqual(values['EMA_Fast'], ema['EMA_Fast'])
+        self.assertAlmostEqual(values['EMA_Slow'], ema['EMA_Slow'])
+        self.assertAlmostEqual(values['EMA_Signal'], ema['EMA_Signal'])
+        self.assertAlmostEqual(values['MACD'], macd['MACD'])
+        self.assertAlmostEqual(values['SIGNAL'], macd['SIGNAL'])
+
+    def test_indicator_state_pending_candle(self):
+        closes = random_closes(40)
+        frame = pd.DataFrame({'Close': closes})
+        ema = EMA(frame).iloc[-1]
+
+        engine = IndicatorEngine()
+        state = engine.advance('BTCUSDT', range(len(closes) - 1), closes[:-1])
+        values = state.values(pending=closes[-1])
+        self.assertAlmostEqual(values['EMA_Fast'], ema['EMA_Fast'])
+        self.assertAlmostEqual(values['EMA_Signal'], ema['EMA_Signal'])
+        # peeking must not commit the pending candle
+        self.assertEqual(state.last_time, len(closes) - 2)
+
+    def test_indicator_engine_skips_seen_candles(self):
+        closes = random_closes(30)
+        engine = IndicatorEngine()
+        engine.advance('BTCUSDT', range(20), closes[:20])
+        state = engine.advance('BTCUSDT', range(30), closes)
+        expected = EMA(pd.DataFrame({'Close': closes})).iloc[-1]
+        self.assertAlmostEqual(state.values()['EMA_Fast'], expected['EMA_Fast'])
+        self.assertEqual(state.ema_fast.nobs, 30)
+
+    def test_macd_not_ready(self):
+        state = IndicatorEngine().advance('BTCUSDT', range(10), random_closes(10))
+        self.assertTrue(np.isnan(state.values()['MACD']))
+
+    def test_ewm_panel_matches_pandas(self):
+        series = [random_closes(size, seed) for seed, size in enumerate([60, 31, 5, 1])]
+        panel = closes_to_panel(series)
+        fast = ewm_panel(panel, 5)[:, -1]
+        signal = ewm_panel(panel, 10)[:, -1]
+        macd = ewm_panel(panel, 12, adjust=True, min_periods=12) - ewm_panel(panel, 26, adjust=True, min_periods=26)
+        macdSignal = ewm_panel(macd, 9, adjust=True, min_periods=9)[:, -1]
+        for row, closes in enumerate(series):
+            frame = pd.DataFrame({'Close': closes})
+            ema = EMA(frame).iloc[-1]
+            expected = MACD(frame).iloc[-1]
+            self.assertAlmostEqual(fast[row], ema['EMA_Fast'])
+            self.assertAlmostEqual(signal[row], ema['EMA_Signal'])
+            np.testing.assert_allclose(macd[row, -1], expected['MACD'])
+            np.testing.assert_allclose(macdSignal[row], expected['SIGNAL'])
+
+    def test_ema_series_matches_pandas(self):
+        closes = random_closes(5000)
+        expected = pd.Series(closes).ewm(span=10, adjust=False).mean().to_numpy()
+        np.testing.assert_allclose(ema_series(closes, 10), expected, rtol=1e-10)
+        # the windowed ema is the one of the last 30 values only
+        windowed = ema_series(closes, 5, window=30)
+        for end in (30, 31, 2999, 5000):
+            expected = pd.Series(closes[end - 30:end]).ewm(span=5, adjust=False).mean().iloc[-1]
+            self.assertAlmostEqual(windowed[end - 1], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
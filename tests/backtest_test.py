@@ -0,0 +1,79 @@
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from backtest import *
+from kline_store import KlineStore, klines_to_records
+from binance_client import BinanceClient
+from fake_binance import make_klines, FakeClient, DAY_MS
+
+
+def crossover_trades(closes, fee):
+    # reference: the alert of every candle from the pandas EMAs, traded one by one
+    frame = pd.Series(closes)
+    fast = frame.ewm(span=5, adjust=False).mean()
+    signal = frame.ewm(span=10, adjust=False).mean()
+    trades, entry, state = [], None, None
+    for i in range(1, len(closes)):
+        if fast[i] != signal[i]:
+            state = bool(fast[i] > signal[i])
+        if state and entry is None:
+            entry = i
+        elif state is False and entry is not None:
+            trades.append(closes[i] * (1 - fee) / (closes[entry] * (1 + fee)) - 1)
+            entry = None
+    if entry is not None:
+        trades.append(closes[-1] * (1 - fee) / (closes[entry] * (1 + fee)) - 1)
+    return trades
+
+
+class TestBacktest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.store = KlineStore(self.dir.name)
+        rng = np.random.default_rng(3)
+        for i, symbol in enumerate(['BTCUSDT', 'ETHUSDT', 'BNBUSDT']):
+            records = klines_to_records(make_klines(500))
+            records['close'] = 100 + np.cumsum(rng.normal(size=500))
+            self.store.append(symbol, '1d', records)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_simulate_matches_candle_by_candle_signals(self):
+        records = self.store.read('BTCUSDT', '1d')
+        trades = simulate(records['time'], records['close'], fee=0.001)
+        np.testing.assert_allclose(trades['return'], crossover_trades(records['close'], 0.001))
+        self.assertTrue((trades['exit_time'] > trades['entry_time']).all())
+        self.assertFalse(trades['open'][:-1].any())
+
+    def test_backtest_process_pool(self):
+        symbols = stored_symbols(self.dir.name, '1d')
+        self.assertEqual(symbols, ['BNBUSDT', 'BTCUSDT', 'ETHUSDT'])
+        results = backtest(self.dir.name, '1d', symbols, workers=2)
+        self.assertEqual(results.keys(), backtest(self.dir.name, '1d', symbols, workers=1).keys())
+        trades, summary = results['ETHUSDT']
+        self.assertEqual(summary['trades'], len(trades))
+        self.assertAlmostEqual(summary['pnl'], np.prod(1 + trades['return']) - 1)
+        universe = universe_summary(results)
+        self.assertEqual(universe['symbols'], 3)
+        self.assertEqual(universe['trades'], sum(summary['trades'] for _, summary in results.values()))
+
+    def test_download_writes_page_by_page(self):
+        klines = make_klines(2500, end=3000 * DAY_MS)
+        fake = FakeClient(klines)
+        with tempfile.TemporaryDirectory() as dir:
+            store = KlineStore(dir)
+            store.append('AUSDT', '1d', klines_to_records(klines[1200:1300]))
+            bClient = BinanceClient(client=fake, klineStore=store, workers=2, clock=lambda: 3000 * DAY_MS / 1000)
+            download(bClient, '1d', '2499 days ago UTC', ['AUSDT'])
+            records = store.read('AUSDT', '1d')
+        # the forming candle is not stored
+        np.testing.assert_array_equal(records['time'], [row[0] for row in klines[:-1]])
+        # two head pages newest first, then the tail pages after the stored candles
+        self.assertEqual(fake.calls, [klines[200][0], klines[0][0], klines[1299][0] + 1, klines[2299][0] + 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
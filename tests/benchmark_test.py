@@ -0,0 +1,23 @@
+import unittest
+import benchmark
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_run_small_scale(self):
+        results = benchmark.run({'symbols': 20, 'chats': 50, 'repeat': 2})
+        names = [result['name'] for result in results]
+        self.assertIn('timeframes_checker 20 symbols', names)
+        self.assertIn('subscribe_response fan-out 50 chats', names)
+        for result in results:
+            self.assertGreater(result['throughput'], 0)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+    def test_compare(self):
+        baseline = [{'name': 'a', 'p50_ms': 10.0}, {'name': 'b', 'p50_ms': 10.0}]
+        results = [{'name': 'a', 'p50_ms': 13.0}, {'name': 'b', 'p50_ms': 11.0}, {'name': 'c', 'p50_ms': 99.0}]
+        self.assertEqual(benchmark.compare(results, baseline, 0.2), ['a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
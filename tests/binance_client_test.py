@@ -0,0 +1,87 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+import pandas as pd
+from binance.client import Client
+from binance_client import BinanceClient, SYMBOL_FAILURES, REST_WEIGHT, FETCH_SECONDS
+from kline_store import KlineStore
+from binance_time_utils import startToMilliseconds
+from fake_binance import make_klines, FakeBinanceServer, FakeClient
+
+
+def fake_client(server):
+    client = Client(ping=False)
+    client.API_URL = server.url
+    return client
+
+
+class TestBinanceClient(unittest.TestCase):
+
+    def setUp(self):
+        self.tickers = [f'T{i}USDT' for i in range(40)]
+        self.klines = {ticker: make_klines(31, base=i) for i, ticker in enumerate(self.tickers)}
+
+    def test_convert_klines_to_frame(self):
+        raw = self.klines['T1USDT']
+        bClient = BinanceClient(client=object())
+        frame = bClient.convertKlinesToFrame(raw)
+        self.assertEqual(list(frame.columns), ['Open', 'High', 'Low', 'Close', 'Volume'])
+        self.assertEqual(frame.index[0], pd.to_datetime(raw[0][0], unit='ms'))
+        self.assertEqual(frame['Close'].iloc[-1], float(raw[-1][4]))
+        self.assertEqual(frame['High'].dtype, 'float64')
+
+    def test_store_start_counts_back_from_the_clock(self):
+        day = 24 * 60 * 60 * 1000
+        klines = make_klines(60, end=100 * day)
+        fake = FakeClient(klines)
+        with tempfile.TemporaryDirectory() as dir:
+            bClient = BinanceClient(client=fake, klineStore=KlineStore(dir), clock=lambda: 100 * day / 1000)
+            records = bClient.getHistoricalRecords('1d', '30 days ago UTC', 'BTCUSDT')
+        self.assertEqual(fake.calls, [70 * day])
+        self.assertEqual(records['time'][0], 70 * day)
+        self.assertEqual(records['time'][-1], 100 * day)
+        self.assertEqual(startToMilliseconds('2 hours ago UTC', 10), 10000 - 2 * 60 * 60 * 1000)
+        self.assertEqual(startToMilliseconds('1 Jan, 2024', 10), 1704067200000)
+
+    def test_timeframes_checker_concurrent(self):
+        with FakeBinanceServer(self.klines, delay=0.01) as server:
+            bClient = BinanceClient(client=fake_client(server), workers=8)
+            result = bClient.timeframes_checker('1d', '30 days ago UTC', self.tickers, ['1d'])['1d']
+        self.assertEqual(sorted(result), sorted(self.tickers))
+        self.assertGreater(server.maxActive, 1)
+        self.assertTrue(result['T0USDT']['buy'])
+        self.assertGreater(bClient.weightLimiter.used, 0)
+
+    def test_timeframes_checker_retries_rate_limited_ticker(self):
+        with tempfile.TemporaryDirectory() as dir, \
+                FakeBinanceServer(self.klines, failures={'T3USDT': 2, 'T4USDT': 10}) as server:
+            bClient = BinanceClient(client=fake_client(server), klineStore=KlineStore(dir), workers=4, retries=3,
+                                    retryDelay=0.001)
+            failures, weight, fetches = SYMBOL_FAILURES.value('T4USDT'), REST_WEIGHT.total(), FETCH_SECONDS.count
+            result = bClient.timeframes_checker('1d', '30 days ago UTC', self.tickers, ['1d'])['1d']
+        self.assertIn('T3USDT', result)
+        # still failing after all retries, the ticker is skipped
+        self.assertNotIn('T4USDT', result)
+        self.assertEqual(len(result), len(self.tickers) - 1)
+        self.assertEqual(SYMBOL_FAILURES.value('T4USDT'), failures + 1)
+        # every attempt is a klines request, the failed ones included
+        self.assertEqual(FETCH_SECONDS.count - fetches, len(self.tickers) + 2 + 3)
+        self.assertEqual(REST_WEIGHT.total() - weight, 2 * (len(self.tickers) + 2 + 3))
+
+    def test_get_usdt_tickers(self):
+        prices = [{'symbol': symbol, 'price': '1'} for symbol in
+                  ['BTCUSDT', 'ETHBTC', 'BTCUPUSDT', 'BTCDOWNUSDT', 'BULLUSDT', 'ETHBEARUSDT', 'SOLUSDT']]
+        client = type('PricesClient', (), {'get_all_tickers': lambda self: prices})()
+        self.assertEqual(BinanceClient(client=client).get_usdt_tickers(), ['BTCUSDT', 'SOLUSDT'])
+
+    def test_import_does_not_load_binance_or_pandas(self):
+        code = "import sys, binance_client; print('binance' in sys.modules, 'pandas' in sys.modules)"
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+        self.assertEqual(output.strip(), 'False False')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from db_manager import *
+
+# schema of the databases written before subscriptions had a timeframe and a strategy
+sql_create_legacy_tables = """ CREATE TABLE jobs (id integer PRIMARY KEY AUTOINCREMENT, chat_id text NOT NULL, ticker text NOT NULL); """
+
+class TestDbManager(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.dir.name, 'bot.db')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_jobs_are_unique(self):
+        db = DbManager(self.db_file)
+        db.insertJob('1', 'BTCUSDT')
+        db.insertJob('1', 'BTCUSDT')
+        db.insertJob('1', 'BTCUSDT', '4h')
+        db.insertJob('1', 'BTCUSDT', '4h', 'macd')
+        db.insertJobs([('1', 'ETHUSDT', '1d', 'ema'), ('2', 'all', '1d', 'ema'), ('2', 'all', '1d', 'ema')])
+        self.assertEqual(sorted(row[1:] for row in db.getJobs()),
+                         [('1', 'BTCUSDT', '1d', 'ema'), ('1', 'BTCUSDT', '4h', 'ema'), ('1', 'BTCUSDT', '4h', 'macd'),
+                          ('1', 'ETHUSDT', '1d', 'ema'), ('2', 'all', '1d', 'ema')])
+        db.deleteJob('1', 'BTCUSDT')
+        self.assertEqual(len(db.getJobs()), 4)
+        db.deleteJob('1', 'BTCUSDT', '4h')
+        self.assertEqual(len(db.getJobs()), 3)
+        db.deleteJob('1', 'BTCUSDT', '4h', 'macd')
+        self.assertEqual(len(db.getJobs()), 2)
+        db.close()
+
+    def test_upgrade_adds_timeframes_and_strategies(self):
+        con = sqlite3.connect(self.db_file)
+        con.executescript(sql_create_legacy_tables)
+        # the subscriptions were not unique yet, the first one of every duplicate is kept
+        con.executemany("INSERT INTO jobs VALUES (?,?,?)", [(None, '1', 'BTCUSDT'), (None, '1', 'BTCUSDT'), (None, '2', 'all')])
+        con.commit()
+        con.close()
+        db = DbManager(self.db_file)
+        self.assertEqual(db.getJobs(), [(1, '1', 'BTCUSDT', '1d', 'ema'), (3, '2', 'all', '1d', 'ema')])
+        db.insertJob('1', 'BTCUSDT', '4h', 'rsi')
+        db.insertJob('1', 'BTCUSDT', '4h', 'rsi')
+        db.saveSignalChanges('4h', 'rsi', [], [('1', 'BTCUSDT', 'sell')])
+        self.assertEqual(len(db.getJobs()), 3)
+        self.assertEqual(db.getSignals(), [('1', 'BTCUSDT', '4h', 'rsi', 'sell')])
+        db.close()
+        # upgraded once, the next start leaves it as it is
+        db = DbManager(self.db_file)
+        self.assertEqual(len(db.getJobs()), 3)
+        db.close()
+
+    def test_signals(self):
+        db = DbManager(self.db_file)
+        db.saveSignalChanges('1d', 'ema', [], [('1', 'BTCUSDT', 'buy'), ('1', 'ETHUSDT', 'sell'), ('2', 'ETHUSDT', 'sell')])
+        db.saveSignalChanges('4h', 'ema', [], [('1', 'ETHUSDT', 'buy')])
+        db.saveSignalChanges('1d', 'macd', [], [('1', 'ETHUSDT', 'sell')])
+        db.saveSignalChanges('1d', 'ema', [], [('1', 'BTCUSDT', 'sell')])
+        self.assertEqual(sorted(db.getSignals()),
+                         [('1', 'BTCUSDT', '1d', 'ema', 'sell'), ('1', 'ETHUSDT', '1d', 'ema', 'sell'),
+                          ('1', 'ETHUSDT', '1d', 'macd', 'sell'), ('1', 'ETHUSDT', '4h', 'ema', 'buy'),
+                          ('2', 'ETHUSDT', '1d', 'ema', 'sell')])
+        # the rows of the cleared chat go before the new ones are saved
+        db.saveSignalChanges('1d', 'ema', ['1'], [('1', 'ETHUSDT', 'buy'), ('2', 'ETHUSDT', '')])
+        db.close()
+        # persisted across connections
+        db = DbManager(self.db_file)
+        self.assertEqual(sorted(db.getSignals()), [('1', 'ETHUSDT', '1d', 'ema', 'buy'), ('1', 'ETHUSDT', '1d', 'macd', 'sell'),
+                                                   ('1', 'ETHUSDT', '4h', 'ema', 'buy')])
+        db.close()
+
+    def test_state(self):
+        db = DbManager(self.db_file)
+        self.assertIsNone(db.getState('tickers_ema'))
+        db.saveState('tickers_ema', {'1d': {'BTCUSDT': {'buy': True}}}, updated=10)
+        db.saveState('supported_tickets', ['BTCUSDT', 'ETHUSDT'])
+        db.saveState('tickers_ema', {'1d': {'BTCUSDT': {'buy': False}}}, updated=20)
+        db.close()
+        db = DbManager(self.db_file)
+        self.assertEqual(db.getState('tickers_ema'), ({'1d': {'BTCUSDT': {'buy': False}}}, 20))
+        self.assertEqual(db.getState('supported_tickets')[0], ['BTCUSDT', 'ETHUSDT'])
+        db.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from websockets.asyncio.server import serve
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def make_klines(count, end=None, step=DAY_MS, base=0.0):
+    """Raw klines ending with the candle that contains `end`, the way Binance returns them (prices as strings)."""
+    end = int(time.time() * 1000) if end is None else end
+    first = end - end % step - (count - 1) * step
+    return [[t, str(base + i), str(base + i + 1), str(base + i - 1), str(base + i + 0.5), '10', t + step - 1]
+            for i, t in enumerate(range(first, first + count * step, step))]
+
+
+def exchange_info(symbols, quote='USDT'):
+    """exchangeInfo answer listing symbols as trading spot pairs against quote."""
+    return {'symbols': [{'symbol': symbol, 'status': 'TRADING', 'baseAsset': symbol[:-len(quote)], 'quoteAsset': quote,
+                         'isSpotTradingAllowed': True} for symbol in symbols]}
+
+
+class FakeClient:
+    """Stand-in for binance.client.Client serving klines from memory."""
+
+    def __init__(self, klines):
+        self.klines = klines
+        self.calls = []
+
+    def get_klines(self, symbol, interval, startTime, limit, endTime=None):
+        self.calls.append(startTime)
+        klines = self.klines[symbol] if isinstance(self.klines, dict) else self.klines
+        return [row for row in klines if startTime <= row[0] and (endTime is None or row[0] <= endTime)][:limit]
+
+    def get_all_tickers(self):
+        return [{'symbol': symbol, 'price': klines[-1][4]} for symbol, klines in self.klines.items()]
+
+    def get_exchange_info(self):
+        return exchange_info(self.klines)
+
+
+class FakeBinanceServer:
+    """Local HTTP server answering the public endpoints BinanceClient uses.
+
+    `failures` maps a symbol to a number of 429 answers to send before serving it.
+    """
+
+    def __init__(self, klines, failures=None, delay=0.0):
+        self.klines = klines
+        self.failures = dict(failures or {})
+        self.delay = delay
+        self.requests = 0
+        self.active = 0
+        self.maxActive = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}/api'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, headers=None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                with fake.lock:
+                    fake.requests += 1
+                    fake.active += 1
+                    fake.maxActive = max(fake.maxActive, fake.active)
+                    used = fake.requests * 2
+                try:
+                    time.sleep(fake.delay)
+                    if url.path.endswith('/ping'):
+                        return self._send(200, {})
+                    if url.path.endswith('/exchangeInfo'):
+                        return self._send(200, exchange_info(fake.klines))
+                    if url.path.endswith('/klines'):
+                        symbol = query['symbol']
+                        with fake.lock:
+                            failing = fake.failures.get(symbol, 0)
+                            if failing:
+                                fake.failures[symbol] = failing - 1
+                        if failing:
+                            return self._send(429, {'code': -1003, 'msg': 'Too many requests'}, {'Retry-After': '0'})
+                        startTime = int(query.get('startTime', 0))
+                        endTime = int(query.get('endTime', 2 ** 62))
+                        limit = int(query.get('limit', 500))
+                        rows = [row for row in fake.klines[symbol] if startTime <= row[0] <= endTime][:limit]
+                        return self._send(200, rows, {'x-mbx-used-weight-1m': str(used)})
+                    self._send(404, {'code': -1, 'msg': 'not found'})
+                finally:
+                    with fake.lock:
+                        fake.active -= 1
+
+        return Handler
+
+
+def kline_event(symbol, row, interval='1d', closed=True):
+    """Combined stream kline message for a raw kline row."""
+    kline = {'t': row[0], 'T': row[6], 's': symbol, 'i': interval, 'o': row[1], 'h': row[2], 'l': row[3],
+             'c': row[4], 'v': row[5], 'x': closed}
+    return json.dumps({'stream': f'{symbol.lower()}@kline_{interval}',
+                       'data': {'e': 'kline', 'E': row[0], 's': symbol, 'k': kline}})
+
+
+class FakeStreamServer:
+    """Local WebSocket stand-in for the Binance combined stream endpoint.
+
+    `sessions` is a list of message lists, connection n gets sessions[n] after its
+    SUBSCRIBE and is closed by the server unless it is the last session.
+    """
+
+    def __init__(self, sessions):
+        self.sessions = sessions
+        self.subscriptions = []
+        self.connections = 0
+        self.loop = asyncio.new_event_loop()
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def url(self):
+        return f'ws://127.0.0.1:{self.port}/stream'
+
+    async def _handler(self, websocket):
+        session = self.connections
+        self.connections += 1
+        request = json.loads(await websocket.recv())
+        self.subscriptions.append(request['params'])
+        await websocket.send(json.dumps({'result': None, 'id': request['id']}))
+        for message in self.sessions[min(session, len(self.sessions) - 1)]:
+            await websocket.send(message)
+        if session < len(self.sessions) - 1:
+            await websocket.close()
+        else:
+            await websocket.wait_closed()
+
+    async def _serve(self):
+        self.server = await serve(self._handler, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.ready.set()
+        await self.server.wait_closed()
+
+    def _run(self):
+        self.loop.run_until_complete(self._serve())
+
+    def __enter__(self):
+        self.thread.start()
+        self.ready.wait(5)
+        return self
+
+    def __exit__(self, *args):
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.thread.join(5)
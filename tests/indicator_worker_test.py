@@ -0,0 +1,44 @@
+import os
+import tempfile
+import unittest
+from binance_client import BinanceClient
+from indicator_worker import *
+from kline_store import KlineStore
+from snapshot_store import SnapshotStore
+from fake_binance import make_klines, FakeClient, DAY_MS
+
+
+class TestIndicatorWorker(unittest.TestCase):
+
+    def test_shards_partition_the_symbols(self):
+        symbols = [f'S{i}USDT' for i in range(200)]
+        shards = [shard_symbols(symbols, shard, 4) for shard in range(4)]
+        self.assertEqual(sorted(sum(shards, [])), sorted(symbols))
+        self.assertTrue(all(shards))
+        # stable across processes and runs
+        self.assertEqual(shard_of('BTCUSDT', 4), zlib.crc32(b'BTCUSDT') % 4)
+
+    def test_workers_publish_their_shard(self):
+        symbols = [f'S{i}USDT' for i in range(20)]
+        klines = {symbol: make_klines(31, base=i) for i, symbol in enumerate(symbols)}
+        # the signals are stamped with the time they were computed
+        now = time.time()
+        with tempfile.TemporaryDirectory() as dir:
+            store = SnapshotStore(os.path.join(dir, 'snapshots.db'))
+            for shard in range(3):
+                bClient = BinanceClient(client=FakeClient(klines), klineStore=KlineStore(dir), workers=1, clock=lambda: now)
+                worker = IndicatorWorker(bClient, store, shard, 3, baseInterval='1d', timeframes=['1d'])
+                self.assertEqual(worker.symbols(), shard_symbols(sorted(symbols), shard, 3))
+                self.assertEqual(worker.runCycle(), 1)
+            snapshot = store.read()
+            self.assertEqual(len(snapshot.version), 3)
+            self.assertEqual(sorted(snapshot.signals['1d']), sorted(symbols))
+            expected = BinanceClient(client=FakeClient(klines), klineStore=KlineStore(dir), workers=1,
+                                     clock=lambda: now).timeframes_checker(
+                '1d', '30 days ago UTC', symbols, ['1d'])
+            self.assertEqual(snapshot.signals['1d'], expected['1d'])
+            store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
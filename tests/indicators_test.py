@@ -0,0 +1,81 @@
+import unittest
+import numpy as np
+import pandas as pd
+from algo_utils import EMA, MACD
+from indicators import *
+
+
+def random_closes(size, seed=1):
+    rng = np.random.default_rng(seed)
+    return np.cumsum(rng.normal(size=size)) + 100
+
+
+class TestIndicators(unittest.TestCase):
+
+    def setUp(self):
+        self.series = [random_closes(size, seed) for seed, size in enumerate([60, 36, 25, 5, 1])]
+        self.symbols = [f'S{i}USDT' for i in range(len(self.series))]
+        self.signals = strategy_signals(self.symbols, {'close': self.series}, list(INDICATORS))
+
+    def frame(self, closes, strategy):
+        return pd.DataFrame({'Close': closes[-INDICATORS[strategy].lookback:]})
+
+    def test_ema_matches_pandas(self):
+        for symbol, closes in zip(self.symbols, self.series):
+            ema = EMA(self.frame(closes, 'ema')).iloc[-1]
+            signal = self.signals['ema'][symbol]
+            self.assertAlmostEqual(signal['fast'], ema['EMA_Fast'])
+            self.assertAlmostEqual(signal['signal'], ema['EMA_Signal'])
+            self.assertEqual(signal['buy'], len(closes) > 1 and ema['EMA_Fast'] > ema['EMA_Signal'])
+        self.assertFalse(self.signals['ema']['S4USDT']['sell'])
+
+    def test_macd_matches_pandas(self):
+        for symbol, closes in zip(self.symbols, self.series):
+            macd = MACD(self.frame(closes, 'macd')).iloc[-1]
+            signal = self.signals['macd'][symbol]
+            np.testing.assert_allclose(signal['macd'], macd['MACD'])
+            np.testing.assert_allclose(signal['macd_signal'], macd['SIGNAL'])
+            self.assertEqual(signal['buy'], bool(macd['MACD'] > macd['SIGNAL']))
+        # not enough candles for the signal line
+        self.assertTrue(np.isnan(self.signals['macd']['S2USDT']['macd_signal']))
+
+    def test_rsi_matches_pandas(self):
+        for symbol, closes in zip(self.symbols, self.series):
+            delta = self.frame(closes, 'rsi')['Close'].diff()
+            gain = delta.clip(lower=0).ewm(alpha=1 / 14, adjust=False, min_periods=14).mean().iloc[-1]
+            loss = (-delta).clip(lower=0).ewm(alpha=1 / 14, adjust=False, min_periods=14).mean().iloc[-1]
+            np.testing.assert_allclose(self.signals['rsi'][symbol]['rsi'], 100 * gain / (gain + loss))
+        rsi = strategy_signals(['UP', 'DOWN'], {'close': [np.arange(40.0), np.arange(40.0)[::-1]]}, ['rsi'])['rsi']
+        self.assertEqual((rsi['UP']['rsi'], rsi['UP']['sell']), (100, True))
+        self.assertEqual((rsi['DOWN']['rsi'], rsi['DOWN']['buy']), (0, True))
+
+    def test_bollinger_matches_pandas(self):
+        for symbol, closes in zip(self.symbols, self.series):
+            frame = self.frame(closes, 'bollinger')['Close']
+            middle = frame.rolling(20).mean().iloc[-1]
+            deviation = frame.rolling(20).std().iloc[-1]
+            np.testing.assert_allclose(self.signals['bollinger'][symbol]['upper'], middle + 2 * deviation)
+            np.testing.assert_allclose(self.signals['bollinger'][symbol]['lower'], middle - 2 * deviation)
+        self.assertFalse(self.signals['bollinger']['S3USDT']['buy'] or self.signals['bollinger']['S3USDT']['sell'])
+        spike = np.append(np.full(19, 100.0) + np.arange(19) % 2, 120)
+        self.assertTrue(strategy_signals(['A'], {'close': [spike]}, ['bollinger'])['bollinger']['A']['sell'])
+
+    def test_shared_intermediates_are_computed_once(self):
+        context = PanelContext({'close': self.series})
+        INDICATORS['ema'].compute(context)
+        cached = len(context.cache)
+        INDICATORS['ema'].compute(context)
+        self.assertEqual(len(context.cache), cached)
+        INDICATORS['macd'].compute(context)
+        self.assertGreater(len(context.cache), cached)
+
+    def test_only_requested_strategies(self):
+        self.assertEqual(list(strategy_signals(self.symbols, {'close': self.series}, ['ema'])), ['ema'])
+        self.assertEqual(strategy_signals([], {'close': []}, ['ema', 'rsi']), {'ema': {}, 'rsi': {}})
+        self.assertEqual(signal_key('1d'), '1d')
+        self.assertEqual(signal_key('4h', 'macd'), '4h:macd')
+        self.assertEqual(lookback(['ema', 'macd']), 35)
+
+
+if __name__ == '__main__':
+    unittest.main()
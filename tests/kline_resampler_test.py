@@ -0,0 +1,97 @@
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from algo_utils import MACD
+from binance_client import BinanceClient
+from kline_resampler import *
+from kline_store import KlineStore, klines_to_records
+from fake_binance import make_klines, FakeClient, DAY_MS
+
+QUARTER_MS = 15 * 60 * 1000
+
+
+def random_klines(count, step=QUARTER_MS, seed=0, end=None):
+    klines = make_klines(count, end=end, step=step)
+    closes = 100 + np.cumsum(np.random.default_rng(seed).normal(size=count))
+    for row, close in zip(klines, closes):
+        row[1:6] = [str(close - 0.2), str(close + 1), str(close - 1), str(close), str(abs(close))]
+    return klines
+
+
+def pandas_resample(records, rule):
+    frame = pd.DataFrame({name: records[name] for name in ['open', 'high', 'low', 'close', 'volume']},
+                         index=pd.to_datetime(records['time'], unit='ms'))
+    frame = frame.resample(rule, label='left', closed='left').agg(
+        {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}).dropna()
+    return frame
+
+
+class TestKlineResampler(unittest.TestCase):
+
+    def test_resample_matches_pandas(self):
+        records = klines_to_records(random_klines(3000))
+        for interval, rule in (('1h', '1h'), ('4h', '4h'), ('1d', '1D'), ('1w', 'W-MON')):
+            candles = resample(records, interval)
+            expected = pandas_resample(records, rule)
+            np.testing.assert_array_equal(candles['time'], expected.index.as_unit('ms').asi8)
+            for name in ['open', 'high', 'low', 'close', 'volume']:
+                np.testing.assert_allclose(candles[name], expected[name].to_numpy())
+
+    def test_incremental_updates(self):
+        # the forming candle is inside a 4h bucket, one opening a bucket would close the previous one
+        records = klines_to_records(random_klines(1000, end=100 * DAY_MS + 2 * 60 * 60 * 1000))
+        resampler = KlineResampler('15m')
+        completed = []
+        for chunk in np.array_split(records[:-1], 37):
+            completed.append(resampler.update('BTCUSDT', chunk, ['1h', '4h'])['4h'])
+        completed = np.concatenate(completed)
+        expected = resample(records[:-1], '4h')
+        # the first 4h bucket is cut by the start of the history, the last one is still open
+        first = 1 if expected['time'][0] != records['time'][0] else 0
+        np.testing.assert_array_equal(completed, expected[first:-1][-len(completed):])
+        self.assertEqual(len(completed), len(expected) - first - 1)
+        window = resampler.window('BTCUSDT', '4h', records[-1:], count=5)
+        self.assertEqual(len(window), 6)
+        np.testing.assert_array_equal(window, resample(records, '4h')[-6:])
+        # candles already seen are skipped
+        self.assertEqual(len(resampler.update('BTCUSDT', records[:-1], ['4h'])['4h']), 0)
+
+    def test_rejects_unaligned_timeframe(self):
+        with self.assertRaises(ValueError):
+            KlineResampler('1h').update('BTCUSDT', klines_to_records(random_klines(10, step=3600000)), ['90m'])
+
+    def test_timeframes_checker_matches_pandas(self):
+        klines = random_klines(31 * 96)
+        records = klines_to_records(klines)
+        with tempfile.TemporaryDirectory() as dir:
+            bClient = BinanceClient(client=FakeClient(klines), klineStore=KlineStore(dir), workers=1)
+            result = bClient.timeframes_checker('15m', '30 days ago UTC', ['BTCUSDT'], ['15m', '4h', '1d'])
+        start = records['time'][-1] - records['time'][-1] % DAY_MS - 29 * DAY_MS
+        for timeframe, rule in (('15m', '15min'), ('4h', '4h'), ('1d', '1D')):
+            closes = pandas_resample(records[records['time'] >= start], rule)['close'].iloc[-30:]
+            fast = closes.ewm(span=5, adjust=False).mean().iloc[-1]
+            signal = closes.ewm(span=10, adjust=False).mean().iloc[-1]
+            self.assertAlmostEqual(result[timeframe]['BTCUSDT']['fast'], fast)
+            self.assertAlmostEqual(result[timeframe]['BTCUSDT']['signal'], signal)
+            self.assertEqual(result[timeframe]['BTCUSDT']['buy'], bool(fast > signal))
+
+    def test_timeframes_checker_strategies(self):
+        klines = random_klines(41 * 96)
+        records = klines_to_records(klines)
+        with tempfile.TemporaryDirectory() as dir:
+            bClient = BinanceClient(client=FakeClient(klines), klineStore=KlineStore(dir), workers=1)
+            result = bClient.timeframes_checker('15m', '40 days ago UTC', ['BTCUSDT'], ['4h', '1d'],
+                                                strategies={'4h': ['ema', 'rsi'], '1d': ['ema', 'macd']})
+        self.assertEqual(sorted(result), ['1d', '1d:macd', '4h', '4h:rsi'])
+        start = records['time'][-1] - records['time'][-1] % DAY_MS - 39 * DAY_MS
+        closes = pandas_resample(records[records['time'] >= start], '1D')['close']
+        macd = MACD(pd.DataFrame({'Close': closes.iloc[-35:]})).iloc[-1]
+        self.assertAlmostEqual(result['1d:macd']['BTCUSDT']['macd'], macd['MACD'])
+        self.assertAlmostEqual(result['1d:macd']['BTCUSDT']['macd_signal'], macd['SIGNAL'])
+        # the ema keeps its own 30 candles lookback
+        self.assertAlmostEqual(result['1d']['BTCUSDT']['fast'], closes.iloc[-30:].ewm(span=5, adjust=False).mean().iloc[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
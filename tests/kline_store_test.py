@@ -0,0 +1,66 @@
+import tempfile
+import unittest
+import numpy as np
+from binance_client import BinanceClient
+from kline_store import *
+from fake_binance import make_klines, FakeClient
+
+
+class TestKlineStore(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.store = KlineStore(self.dir.name)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_append_and_read(self):
+        self.assertIsNone(self.store.lastTime('BTCUSDT', '1d'))
+        records = klines_to_records(make_klines(10))
+        self.assertEqual(self.store.append('BTCUSDT', '1d', records[:6]), 6)
+        # overlapping rows are skipped
+        self.assertEqual(self.store.append('BTCUSDT', '1d', records[4:]), 4)
+        self.assertEqual(self.store.lastTime('BTCUSDT', '1d'), records['time'][-1])
+        window = self.store.read('BTCUSDT', '1d', records['time'][7])
+        self.assertEqual(len(window), 3)
+        np.testing.assert_array_equal(window['close'], records['close'][7:])
+
+    def test_stored_historical_data_fetches_delta(self):
+        fake = FakeClient(make_klines(40))
+        bClient = BinanceClient(klineStore=self.store, client=fake)
+        frame = bClient.getHistoricalData('1d', '30 days ago UTC', 'BTCUSDT')
+        self.assertEqual(frame['Close'].iloc[-1], 39.5)
+        self.assertLessEqual(len(frame), 31)
+        # the forming candle is not stored
+        self.assertEqual(self.store.size('BTCUSDT', '1d'), len(frame) - 1)
+
+        frame = bClient.getHistoricalData('1d', '30 days ago UTC', 'BTCUSDT')
+        self.assertEqual(fake.calls[-1], fake.klines[-2][0] + 1)
+        self.assertEqual(frame['Close'].iloc[-1], 39.5)
+
+    def test_stored_historical_data_backfills_a_wider_lookback(self):
+        fake = FakeClient(make_klines(50))
+        bClient = BinanceClient(klineStore=self.store, client=fake)
+        bClient.getHistoricalData('1d', '30 days ago UTC', 'BTCUSDT')
+        stored = self.store.size('BTCUSDT', '1d')
+        frame = bClient.getHistoricalData('1d', '40 days ago UTC', 'BTCUSDT')
+        self.assertEqual(self.store.size('BTCUSDT', '1d'), stored + 10)
+        self.assertEqual(len(frame), stored + 11)
+        np.testing.assert_array_equal(np.diff(frame['Close']), 1)
+        # the candles before the listing are only asked for once
+        bClient.getHistoricalData('1d', '60 days ago UTC', 'BTCUSDT')
+        calls = len(fake.calls)
+        bClient.getHistoricalData('1d', '60 days ago UTC', 'BTCUSDT')
+        self.assertEqual(len(fake.calls), calls + 1)
+
+    def test_prepend(self):
+        records = klines_to_records(make_klines(10))
+        self.store.append('BTCUSDT', '1d', records[5:])
+        self.assertEqual(self.store.prepend('BTCUSDT', '1d', records[:7]), 5)
+        self.assertEqual(self.store.firstTime('BTCUSDT', '1d'), records['time'][0])
+        np.testing.assert_array_equal(self.store.read('BTCUSDT', '1d'), records)
+
+
+if __name__ == '__main__':
+    unittest.main()
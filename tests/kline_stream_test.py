@@ -0,0 +1,70 @@
+import tempfile
+import threading
+import unittest
+from binance_client import BinanceClient
+from kline_store import KlineStore
+from kline_stream import KlineStream
+from fake_binance import make_klines, kline_event, FakeClient, FakeStreamServer, DAY_MS
+
+
+class TestKlineStream(unittest.TestCase):
+
+    def test_stream_updates_signals_and_reconnects(self):
+        klines = make_klines(31)
+        forming = list(klines[-1])
+        forming[4] = '100'
+        following = [forming[0] + DAY_MS, '100', '200', '100', '200', '10', forming[6] + DAY_MS]
+        sessions = [[kline_event('AUSDT', forming), kline_event('AUSDT', following, closed=False)],
+                    [kline_event('AUSDT', following)]]
+        fake = FakeClient(klines)
+        signals = []
+        statuses = []
+        done = threading.Event()
+
+        def onSignal(symbol, timeframe, signal):
+            self.assertEqual(timeframe, '1d')
+            signals.append((symbol, signal))
+            if signal['fast'] > 100:
+                done.set()
+
+        with tempfile.TemporaryDirectory() as dir, FakeStreamServer(sessions) as server:
+            store = KlineStore(dir)
+            bClient = BinanceClient(client=fake, klineStore=store, workers=2)
+            stream = KlineStream(bClient, ['AUSDT'], '1d', '30 days ago UTC', onSignal, url=server.url,
+                                 reconnectDelay=0.01, onStatus=statuses.append)
+            stream.startThread()
+            self.assertTrue(done.wait(10))
+            stream.stop()
+            self.assertEqual(store.lastTime('AUSDT', '1d'), following[0])
+
+        self.assertEqual(server.subscriptions[0], ['ausdt@kline_1d'])
+        self.assertGreaterEqual(server.connections, 2)
+        # down when the server closed the first connection, up again after the reconnect backfilled
+        self.assertEqual(statuses[:3], [True, False, True])
+        # the REST backfill ran on every connect
+        self.assertGreaterEqual(len(fake.calls), 2)
+        state = bClient.indicators.states[('AUSDT', '1d')]
+        # 29 closed candles inside the 30 day window, then the two streamed ones
+        self.assertEqual(state.ema_fast.nobs, 31)
+        self.assertEqual(state.last_time, following[0])
+        self.assertTrue(signals[-1][1]['buy'])
+
+    def test_stream_resamples_timeframes(self):
+        hour = 60 * 60 * 1000
+        klines = make_klines(9, end=10 * DAY_MS + 8 * hour, step=hour)
+        signals = []
+        bClient = BinanceClient(client=FakeClient([]), workers=1)
+        stream = KlineStream(bClient, ['AUSDT'], '1h', '1 day ago UTC',
+                             lambda symbol, timeframe, signal: signals.append((timeframe, signal)), timeframes=['1h', '4h'])
+        for row in klines[:-1]:
+            stream.handle(kline_event('AUSDT', row, interval='1h'))
+        stream.handle(kline_event('AUSDT', klines[-1], interval='1h', closed=False))
+        self.assertEqual([timeframe for timeframe, _ in signals].count('1h'), 8)
+        # a 4h signal once every fourth hourly candle closed
+        self.assertEqual([index for index, (timeframe, _) in enumerate(signals) if timeframe == '4h'], [4, 9])
+        self.assertEqual(bClient.indicators.states[('AUSDT', '4h')].last_time, klines[4][0])
+        self.assertEqual(bClient.resamplers['1h'].closed[('AUSDT', '4h')]['close'][-1], float(klines[7][4]))
+
+
+if __name__ == '__main__':
+    unittest.main()
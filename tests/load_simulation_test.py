@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+import load_simulation
+from load_simulation import *
+
+
+class TestLoadSimulation(unittest.TestCase):
+
+    def setUp(self):
+        # the recordings are written to the working directory
+        self.cwd = os.getcwd()
+        self.directory = tempfile.TemporaryDirectory()
+        os.chdir(self.directory.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def test_alerts_of_joined_messages(self):
+        text = ('BUY ALERT BTCUSDT\nSELL ALERT ETHUSDT 4h macd\n4h\n<pre>+---------+-----+------+\n'
+                '| Symbol  | Buy | Sell |\n+---------+-----+------+\n| XRPUSDT | Y   | N    |\n+---------+-----+------+</pre>\n'
+                '<pre>+---------+\n| ADAUSDT | N   | Y    |\n+---------+</pre>')
+        self.assertEqual(alerts_of(text), [('', 'BTCUSDT'), ('4h macd', 'ETHUSDT'), ('4h', 'XRPUSDT'), ('', 'ADAUSDT')])
+
+    def test_recordings_are_merged_in_time_order(self):
+        klines, commands = 'klines.jsonl', 'commands.jsonl'
+        times = iter([1.0, 3.0, 2.0])
+        writer = RecordingWriter(klines, clock=lambda: next(times))
+        writer.write({'type': 'klines', 'symbol': 'AUSDT', 'interval': '1h', 'rows': [[0, 1, 1, 1, 1, 1, 9]]})
+        writer.write({'type': 'klines', 'symbol': 'AUSDT', 'interval': '1h', 'rows': [[0, 1, 1, 1, 1, 1, 9], [10, 2, 2, 2, 2, 2, 19]]})
+        writer.close()
+        writer = RecordingWriter(commands, clock=lambda: next(times))
+        writer.write({'type': 'command', 'chat': 7, 'text': '/subscribe AUSDT'})
+        writer.close()
+        events = read_recording([klines, commands])
+        self.assertEqual([event['time'] for event in events], [1.0, 2.0, 3.0])
+        self.assertEqual(recorded_klines(events), ({'AUSDT': [[0, 1, 1, 1, 1, 1, 9], [10, 2, 2, 2, 2, 2, 19]]}, '1h'))
+
+    def test_stand_in_binance_serves_candles_open_at_the_replay_time(self):
+        rows = [[t, 1, 1, 1, 1, 1, t + 9] for t in range(0, 100, 10)]
+        now = [0.045]
+        with StandInBinance({'AUSDT': rows}, lambda: now[0]) as binance:
+            self.assertEqual(binance.answer('/api/v3/klines', {'symbol': 'AUSDT', 'startTime': '10'}, {}), (200, rows[1:5]))
+            now[0] = 1
+            self.assertEqual(binance.answer('/api/v3/klines', {'symbol': 'AUSDT', 'limit': '3'}, {}), (200, rows[:3]))
+            self.assertEqual(binance.answer('/api/v3/klines', {'symbol': 'BUSDT'}, {})[0], 400)
+
+    def test_replay_synthetic_load(self):
+        symbols = [f'S{i}USDT' for i in range(6)]
+        events = synthesize(symbols, 12, seed=1)
+        # every chat follows all symbols, so the crossovers of these candles always reach somebody
+        report = replay(events, chats=6, allShare=1.0, speed=3600, chatRate=100, drain=30)
+        self.assertEqual((report['symbols'], report['chats'], report['replies']), (6, 6, 6))
+        self.assertGreater(report['cycles'], 0)
+        self.assertGreater(report['messages'], 0)
+        self.assertGreater(report['initial_alerts'], 0)
+        self.assertGreater(report['alerts'], 0)
+        self.assertEqual(report['undelivered'], 0)
+        self.assertGreater(report['latency_p50_s'], 0)
+        self.assertLessEqual(report['latency_p50_s'], report['latency_p99_s'])
+        self.assertLessEqual(report['latency_p99_s'], report['latency_max_s'])
+        self.assertFalse(os.path.exists('bot.db'))
+
+
+if __name__ == '__main__':
+    unittest.main()
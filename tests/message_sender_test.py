@@ -0,0 +1,105 @@
+import time
+import unittest
+from telegram import ParseMode
+from telegram.error import RetryAfter
+from message_sender import *
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeBot:
+
+    def __init__(self, failures=0):
+        self.messages = []
+        self.failures = failures
+
+    def send_message(self, chat_id, text, parse_mode=None):
+        if self.failures:
+            self.failures -= 1
+            raise RetryAfter(5)
+        self.messages.append((chat_id, text, parse_mode))
+
+
+class TestMessageSender(unittest.TestCase):
+
+    def test_token_bucket(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+        bucket.take()
+        bucket.take()
+        self.assertAlmostEqual(bucket.wait(), 0.5)
+        clock.now = 0.5
+        self.assertEqual(bucket.wait(), 0)
+
+    def test_coalesce(self):
+        message, rest = coalesce([('BUY ALERT A<B', None), ('<pre>table</pre>', ParseMode.HTML)])
+        self.assertEqual(message, ('BUY ALERT A&lt;B\n<pre>table</pre>', ParseMode.HTML))
+        self.assertEqual(rest, [])
+        message, rest = coalesce([('a' * 3000, None), ('b' * 3000, None)])
+        self.assertEqual(message, ('a' * 3000, None))
+        self.assertEqual(len(rest), 1)
+
+    def test_pending_messages_of_a_chat_are_coalesced(self):
+        bot = FakeBot()
+        sender = MessageSender(bot, clock=FakeClock())
+        sender.send(1, 'BUY ALERT BTCUSDT')
+        sender.send(1, 'SELL ALERT ETHUSDT')
+        sender.send(2, 'BUY ALERT BTCUSDT')
+        while sender.process(block=False):
+            pass
+        self.assertEqual(bot.messages, [(1, 'BUY ALERT BTCUSDT\nSELL ALERT ETHUSDT', None), (2, 'BUY ALERT BTCUSDT', None)])
+
+    def test_rate_limits(self):
+        clock = FakeClock()
+        bot = FakeBot()
+        sender = MessageSender(bot, globalRate=2, chatRate=1, clock=clock)
+        for chat_id in range(3):
+            sender.send(chat_id, 'a' * 3000)
+            sender.send(chat_id, 'b' * 3000)
+        while sender.process(block=False):
+            pass
+        # the global bucket allows a burst of 2
+        self.assertEqual(len(bot.messages), 2)
+        clock.now = 0.5
+        while sender.process(block=False):
+            pass
+        self.assertEqual(len(bot.messages), 3)
+        self.assertEqual(bot.messages[2][0], 2)
+        clock.now = 1.0
+        sender.process(block=False)
+        # chat 0 may send its second message after one second
+        self.assertEqual(bot.messages[3][0], 0)
+
+    def test_retry_after(self):
+        clock = FakeClock()
+        bot = FakeBot(failures=1)
+        sender = MessageSender(bot, clock=clock)
+        sender.send(1, 'BUY ALERT BTCUSDT')
+        self.assertTrue(sender.process(block=False))
+        self.assertFalse(sender.process(block=False))
+        clock.now = 5
+        self.assertTrue(sender.process(block=False))
+        self.assertEqual(bot.messages, [(1, 'BUY ALERT BTCUSDT', None)])
+
+    def test_worker_thread(self):
+        bot = FakeBot()
+        sender = MessageSender(bot)
+        sender.start()
+        sender.send(1, 'BUY ALERT BTCUSDT')
+        for _ in range(100):
+            if bot.messages:
+                break
+            time.sleep(0.01)
+        sender.stop()
+        self.assertEqual(bot.messages, [(1, 'BUY ALERT BTCUSDT', None)])
+
+
+if __name__ == '__main__':
+    unittest.main()
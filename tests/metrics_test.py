@@ -0,0 +1,55 @@
+import unittest
+import urllib.request
+from metrics import *
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram(self):
+        histogram = Histogram('stage_seconds', 'Stage latency', buckets=(0.1, 1, 10))
+        for value in (0.05, 0.5, 0.5, 5, 50):
+            histogram.observe(value)
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.last, 50)
+        self.assertAlmostEqual(histogram.mean(), 56.05 / 5)
+        self.assertEqual(histogram.quantile(0.5), 1)
+        self.assertEqual(histogram.quantile(0.8), 10)
+        self.assertEqual(histogram.quantile(0.99), float('inf'))
+        with histogram.time():
+            pass
+        self.assertEqual(histogram.count, 6)
+        self.assertLess(histogram.last, 0.1)
+
+    def test_render(self):
+        registry = Registry()
+        counter = registry.counter('failures', 'Failed symbols', 'symbol')
+        self.assertIs(registry.counter('failures', 'Failed symbols', 'symbol'), counter)
+        registry.counter('errors', 'Errors')
+        counter.inc(labelValue='BTCUSDT')
+        counter.inc(2, labelValue='ETHUSDT')
+        registry.gauge('age_seconds', 'Snapshot age', lambda: 12)
+        registry.histogram('fetch_seconds', 'Fetch latency', buckets=(1,)).observe(0.5)
+        text = registry.render()
+        self.assertIn('# TYPE failures counter\nfailures_total{symbol="BTCUSDT"} 1.0\nfailures_total{symbol="ETHUSDT"} 2.0\n', text)
+        self.assertIn('errors_total 0.0\n', text)
+        self.assertIn('# TYPE age_seconds gauge\nage_seconds 12.0\n', text)
+        self.assertIn('fetch_seconds_bucket{le="1.0"} 1.0\nfetch_seconds_bucket{le="+Inf"} 1.0\n'
+                      'fetch_seconds_sum 0.5\nfetch_seconds_count 1.0\n', text)
+
+    def test_server(self):
+        registry = Registry()
+        registry.counter('cycles', 'Cycles').inc()
+        server = MetricsServer(0, registry, host='127.0.0.1')
+        server.start()
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{server.port}/metrics') as response:
+                self.assertTrue(response.headers['Content-Type'].startswith('text/plain; version=0.0.4'))
+                self.assertIn('cycles_total 1.0', response.read().decode())
+            with self.assertRaises(urllib.error.HTTPError):
+                urllib.request.urlopen(f'http://127.0.0.1:{server.port}/')
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
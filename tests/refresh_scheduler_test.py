@@ -0,0 +1,96 @@
+import random
+import unittest
+from refresh_scheduler import *
+
+HOUR = 3600
+# a Monday 00:00 UTC, candles of every interval close on multiples of their length from here
+MIDNIGHT = 1704067200.0
+
+
+class TestRefreshScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.now = MIDNIGHT + 10
+        self.scheduler = RefreshScheduler(idleInterval='1d', delay=2.0, jitter=0, idleJitter=0, clock=lambda: self.now)
+
+    def test_new_symbols_are_due_followed_first(self):
+        self.scheduler.update(['AUSDT', 'BUSDT', 'CUSDT'], {'CUSDT': '15m'})
+        self.assertEqual(self.scheduler.due(), ['CUSDT', 'AUSDT', 'BUSDT'])
+        self.assertEqual(self.scheduler.due(), [])
+
+    def test_refresh_after_each_close(self):
+        self.scheduler.update(['AUSDT', 'BUSDT'], {'BUSDT': '15m'})
+        self.scheduler.due()
+        self.assertEqual(self.scheduler.wait(), 15 * 60 + 2 - 10)
+        self.now = MIDNIGHT + 15 * 60 + 2
+        self.assertEqual(self.scheduler.due(), ['BUSDT'])
+        # the unfollowed symbol only after the daily close
+        self.now = MIDNIGHT + 24 * HOUR - 1
+        self.assertEqual(self.scheduler.due(), ['BUSDT'])
+        self.now = MIDNIGHT + 24 * HOUR + 2
+        self.assertEqual(self.scheduler.due(), ['BUSDT', 'AUSDT'])
+
+    def test_subscribing_refreshes_right_away(self):
+        self.scheduler.update(['AUSDT'], {})
+        self.scheduler.due()
+        self.assertGreater(self.scheduler.wait(), 23 * HOUR)
+        self.scheduler.update(['AUSDT'], {'AUSDT': '1h'})
+        self.assertEqual(self.scheduler.wait(), 0)
+        self.assertEqual(self.scheduler.due(), ['AUSDT'])
+        self.assertEqual(self.scheduler.wait(), HOUR + 2 - 10)
+        # a shorter timeframe too, a longer one keeps the next refresh
+        self.scheduler.update(['AUSDT'], {'AUSDT': '4h'})
+        self.assertEqual(self.scheduler.wait(), HOUR + 2 - 10)
+        self.scheduler.update(['AUSDT'], {'AUSDT': '15m'})
+        self.assertEqual(self.scheduler.due(), ['AUSDT'])
+        # stale heap entries are skipped
+        self.now = MIDNIGHT + 24 * HOUR + 2
+        self.assertEqual(self.scheduler.due(), ['AUSDT'])
+        self.assertEqual(len(self.scheduler.heap), 1)
+
+    def test_following_another_strategy_refreshes_right_away(self):
+        ema, macd = frozenset({('1h', 'ema')}), frozenset({('1h', 'ema'), ('1h', 'macd')})
+        self.scheduler.update(['AUSDT'], {'AUSDT': '1h'}, {'AUSDT': ema})
+        self.scheduler.due()
+        self.assertEqual(self.scheduler.wait(), HOUR + 2 - 10)
+        self.scheduler.update(['AUSDT'], {'AUSDT': '1h'}, {'AUSDT': macd})
+        self.assertEqual(self.scheduler.due(), ['AUSDT'])
+        # dropping a strategy keeps the next refresh
+        self.scheduler.update(['AUSDT'], {'AUSDT': '1h'}, {'AUSDT': ema})
+        self.assertEqual(self.scheduler.wait(), HOUR + 2 - 10)
+        self.scheduler.update(['AUSDT'], {'AUSDT': '1h'}, {'AUSDT': macd})
+        self.assertEqual(self.scheduler.wait(), 0)
+
+    def test_unfollowed_symbols_can_be_skipped(self):
+        scheduler = RefreshScheduler(idleInterval=None, clock=lambda: self.now)
+        self.assertEqual(scheduler.update(['AUSDT', 'BUSDT'], {'AUSDT': '1h'}), set())
+        self.assertEqual(scheduler.due(), ['AUSDT'])
+        self.assertEqual(scheduler.update(['AUSDT', 'BUSDT'], {}), {'AUSDT'})
+        self.assertEqual(scheduler.wait(), float('inf'))
+
+    def test_delisted_symbols_are_removed(self):
+        self.scheduler.update(['AUSDT', 'BUSDT'], {})
+        self.assertEqual(self.scheduler.update(['AUSDT'], {}), {'BUSDT'})
+        self.assertEqual(self.scheduler.due(), ['AUSDT'])
+
+    def test_jitter_spreads_a_close(self):
+        scheduler = RefreshScheduler(idleInterval='1h', delay=0, idleJitter=60, clock=lambda: self.now, rng=random.Random(1))
+        symbols = [f'S{i}USDT' for i in range(100)]
+        scheduler.update(symbols, {})
+        scheduler.due()
+        dues = sorted(scheduler.dueAt.values())
+        self.assertGreaterEqual(dues[0], MIDNIGHT + HOUR)
+        self.assertLessEqual(dues[-1], MIDNIGHT + HOUR + 60)
+        self.assertGreater(dues[-1] - dues[0], 30)
+
+    def test_retry_after_a_failure(self):
+        self.scheduler.update(['AUSDT'], {'AUSDT': '1h'})
+        self.scheduler.due()
+        self.scheduler.retry(['AUSDT', 'XUSDT'], 30)
+        self.assertEqual(self.scheduler.wait(), 30)
+        self.now += 30
+        self.assertEqual(self.scheduler.due(), ['AUSDT'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+from signal_dispatcher import SignalDispatcher
+
+
+def ema(buy=False, sell=False):
+    return {"buy": buy, "sell": sell, "fast": 1, "signal": 1}
+
+
+class TestSignalDispatcher(unittest.TestCase):
+
+    def test_new_subscriber_gets_current_signals(self):
+        dispatcher = SignalDispatcher()
+        dispatcher.subscribe(1, 'BTCUSDT')
+        dispatcher.subscribe(2, 'all')
+        alerts = dispatcher.dispatch({'BTCUSDT': ema(buy=True), 'ETHUSDT': ema(sell=True), 'XRPUSDT': ema()})
+        self.assertEqual(alerts[1], ([('BTCUSDT', True, False)], []))
+        self.assertEqual(alerts[2], ([], [('BTCUSDT', True, False), ('ETHUSDT', False, True)]))
+
+    def test_only_transitions_are_sent(self):
+        dispatcher = SignalDispatcher()
+        dispatcher.subscribe(1, 'BTCUSDT')
+        dispatcher.subscribe(2, 'all')
+        dispatcher.dispatch({'BTCUSDT': ema(buy=True), 'ETHUSDT': ema(buy=True)})
+        self.assertEqual(dispatcher.dispatch({'BTCUSDT': ema(buy=True), 'ETHUSDT': ema(buy=True)}), {})
+
+        alerts = dispatcher.dispatch({'BTCUSDT': ema(buy=True), 'ETHUSDT': ema(sell=True)})
+        self.assertEqual(alerts, {2: ([], [('ETHUSDT', False, True)])})
+
+    def test_direct_and_all_subscription_alert_once(self):
+        dispatcher = SignalDispatcher()
+        dispatcher.subscribe(1, 'BTCUSDT')
+        dispatcher.subscribe(1, 'all')
+        alerts = dispatcher.dispatch({'BTCUSDT': ema(sell=True), 'ETHUSDT': ema(buy=True)})
+        self.assertEqual(alerts[1], ([('BTCUSDT', False, True)], [('ETHUSDT', True, False)]))
+
+    def test_unsubscribe(self):
+        dispatcher = SignalDispatcher()
+        self.assertFalse(dispatcher.subscribe(1, 'BTCUSDT'))
+        self.assertTrue(dispatcher.subscribe(1, 'BTCUSDT'))
+        dispatcher.dispatch({'BTCUSDT': ema(buy=True)})
+        self.assertTrue(dispatcher.unsubscribe(1, 'BTCUSDT'))
+        self.assertFalse(dispatcher.unsubscribe(1, 'BTCUSDT'))
+        self.assertEqual(dispatcher.dispatch({'BTCUSDT': ema(sell=True)}), {})
+        self.assertEqual(dispatcher.sentSignals(1), [])
+        self.assertEqual(dispatcher.subscriptions(), [])
+
+    def test_restored_signals_are_not_sent_again(self):
+        dispatcher = SignalDispatcher()
+        dispatcher.subscribe(1, 'all')
+        dispatcher.restoreSent([(1, 'BTCUSDT', 'buy')])
+        alerts = dispatcher.dispatch({'BTCUSDT': ema(buy=True), 'ETHUSDT': ema(buy=True)})
+        self.assertEqual(alerts, {1: ([], [('ETHUSDT', True, False)])})
+        self.assertEqual(sorted(dispatcher.sentSignals(1)), [('BTCUSDT', 'buy'), ('ETHUSDT', 'buy')])
+
+    def test_all_unsubscribe_keeps_direct_signals(self):
+        dispatcher = SignalDispatcher()
+        dispatcher.subscribe(1, 'BTCUSDT')
+        dispatcher.subscribe(1, 'all')
+        dispatcher.dispatch({'BTCUSDT': ema(buy=True), 'ETHUSDT': ema(buy=True)})
+        dispatcher.unsubscribe(1, 'all')
+        self.assertEqual(dispatcher.sentSignals(1), [('BTCUSDT', 'buy')])
+        self.assertEqual(dispatcher.subscriptions(), [(1, 'BTCUSDT')])
+
+    def test_state_grows_and_reuses_rows(self):
+        dispatcher = SignalDispatcher(chats=2, tickers=2)
+        tickers = [f'S{i}USDT' for i in range(5)]
+        for chat_id in range(5):
+            dispatcher.subscribe(chat_id, tickers[chat_id])
+        alerts = dispatcher.dispatch({ticker: ema(sell=True) for ticker in tickers})
+        self.assertEqual(alerts, {chat_id: ([(tickers[chat_id], False, True)], []) for chat_id in range(5)})
+        dispatcher.unsubscribe(0, tickers[0])
+        dispatcher.subscribe(9, 'all')
+        self.assertEqual(dispatcher.chatRows[9], 0)
+        self.assertEqual(len(dispatcher.dispatch({ticker: ema(sell=True) for ticker in tickers})[9][1]), 5)
+
+    def test_changes(self):
+        dispatcher = SignalDispatcher(chats=1, tickers=1)
+        dispatcher.subscribe(1, 'all')
+        dispatcher.subscribe(2, 'BTCUSDT')
+        dispatcher.restoreSent([(1, 'XRPUSDT', 'sell')])
+        dispatcher.dispatch({'BTCUSDT': ema(buy=True), 'ETHUSDT': ema(sell=True)})
+        self.assertEqual(dispatcher.changes(), ([], [(1, 'BTCUSDT', 'buy'), (1, 'ETHUSDT', 'sell'), (2, 'BTCUSDT', 'buy')]))
+        self.assertEqual(dispatcher.changes(), ([], []))
+        dispatcher.dispatch({'BTCUSDT': ema(sell=True), 'ETHUSDT': ema(sell=True)})
+        dispatcher.unsubscribe(1, 'all')
+        dispatcher.unsubscribe(2, 'BTCUSDT')
+        self.assertEqual(dispatcher.changes(), ([1, 2], []))
+        dispatcher.subscribe(1, 'ETHUSDT')
+        dispatcher.subscribe(1, 'all')
+        dispatcher.dispatch({'BTCUSDT': ema(sell=True), 'ETHUSDT': ema(sell=True)})
+        dispatcher.changes()
+        dispatcher.unsubscribe(1, 'all')
+        self.assertEqual(dispatcher.changes(), ([], [(1, 'BTCUSDT', '')]))
+
+    def test_followed(self):
+        dispatcher = SignalDispatcher()
+        self.assertEqual(dispatcher.followed(), (set(), False))
+        dispatcher.subscribe(1, 'BTCUSDT')
+        dispatcher.subscribe(2, 'all')
+        self.assertEqual(dispatcher.followed(), ({'BTCUSDT'}, True))
+        dispatcher.unsubscribe(1, 'BTCUSDT')
+        self.assertEqual(dispatcher.followed(), (set(), True))
+
+
+if __name__ == '__main__':
+    unittest.main()
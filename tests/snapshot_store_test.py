@@ -0,0 +1,78 @@
+import os
+import tempfile
+import threading
+import unittest
+from snapshot_store import *
+
+
+def signals(value, tickers):
+    return {'1d': {ticker: {'buy': value > 0, 'sell': value < 0, 'fast': value, 'signal': 0} for ticker in tickers}}
+
+
+class TestSnapshotStore(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.dir.name, 'snapshots.db')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_publish_and_read(self):
+        store = SnapshotStore(self.db_file)
+        self.assertEqual(store.read(), Snapshot((), {}, 0))
+        self.assertEqual(store.publish(0, 2, signals(1, ['AUSDT']), updated=10), 1)
+        self.assertEqual(store.publish(1, 2, signals(-1, ['BUSDT']), updated=20), 1)
+        snapshot = store.read()
+        self.assertEqual(snapshot.version, ((0, 1), (1, 1)))
+        self.assertEqual(sorted(snapshot.signals['1d']), ['AUSDT', 'BUSDT'])
+        self.assertTrue(snapshot.signals['1d']['AUSDT']['buy'])
+        # the age of the snapshot is the one of the stalest shard
+        self.assertEqual(snapshot.updated, 10)
+        self.assertIsNone(store.read(snapshot.version))
+
+        self.assertEqual(store.publish(0, 2, signals(-1, ['AUSDT']), updated=30), 2)
+        snapshot = store.read(snapshot.version)
+        self.assertEqual(snapshot.version, ((0, 2), (1, 1)))
+        self.assertTrue(snapshot.signals['1d']['AUSDT']['sell'])
+        store.close()
+        # readable from another connection
+        store = SnapshotStore(self.db_file)
+        self.assertEqual(store.version(), ((0, 2), (1, 1)))
+        store.close()
+
+    def test_rows_of_an_old_shard_layout_are_ignored(self):
+        store = SnapshotStore(self.db_file)
+        for shard in range(3):
+            store.publish(shard, 3, signals(1, [f'S{shard}USDT']), updated=10)
+        store.publish(0, 2, signals(1, ['AUSDT']), updated=20)
+        store.publish(1, 2, signals(1, ['BUSDT']), updated=20)
+        snapshot = store.read()
+        self.assertEqual(sorted(snapshot.signals['1d']), ['AUSDT', 'BUSDT'])
+        store.close()
+
+    def test_readers_never_see_a_partial_swap(self):
+        writer = SnapshotStore(self.db_file)
+        reader = SnapshotStore(self.db_file)
+        tickers = [f'S{i}USDT' for i in range(300)]
+        done = threading.Event()
+
+        def publish():
+            for value in range(1, 60):
+                writer.publish(0, 1, signals(value, tickers))
+            done.set()
+
+        thread = threading.Thread(target=publish)
+        thread.start()
+        while not done.is_set():
+            snapshot = reader.read()
+            values = {data['fast'] for data in snapshot.signals.get('1d', {}).values()}
+            self.assertLessEqual(len(values), 1)
+        thread.join()
+        self.assertEqual(reader.version(), ((0, 59),))
+        writer.close()
+        reader.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import threading
+import unittest
+from symbol_registry import *
+from fake_binance import exchange_info
+
+
+def symbol(name, base, quote, status='TRADING'):
+    return {'symbol': name, 'status': status, 'baseAsset': base, 'quoteAsset': quote, 'isSpotTradingAllowed': True}
+
+
+class TestSymbolRegistry(unittest.TestCase):
+
+    def test_symbols_from_exchange_info(self):
+        info = {'symbols': [symbol('BTCUSDT', 'BTC', 'USDT'), symbol('BTCUPUSDT', 'BTCUP', 'USDT'),
+                            symbol('ETHBULLUSDT', 'ETHBULL', 'USDT'), symbol('ETHUSDT', 'ETH', 'USDT'),
+                            symbol('JUPUSDT', 'JUP', 'USDT'), symbol('SUPERUSDT', 'SUPER', 'USDT'),
+                            symbol('LUNAUSDT', 'LUNA', 'USDT', status='BREAK'), symbol('ETHBTC', 'ETH', 'BTC'),
+                            symbol('BTCFDUSD', 'BTC', 'FDUSD')]}
+        self.assertEqual(symbols_from_exchange_info(info), ['BTCUSDT', 'ETHUSDT', 'JUPUSDT', 'SUPERUSDT'])
+        self.assertEqual(symbols_from_exchange_info(info, ('BTC', 'FDUSD')), ['BTCFDUSD', 'ETHBTC'])
+
+    def test_lookup_and_prefix(self):
+        registry = SymbolRegistry(pageSize=2)
+        registry.load(['ETHUSDT', 'BTCUSDT', 'BTCDOMUSDT', 'BNBUSDT'])
+        self.assertIn('BTCUSDT', registry)
+        self.assertNotIn('XRPUSDT', registry)
+        self.assertEqual(registry.prefix('BTC'), ('BTCDOMUSDT', 'BTCUSDT'))
+        self.assertEqual(registry.prefix('B'), ('BNBUSDT', 'BTCDOMUSDT', 'BTCUSDT'))
+        self.assertEqual(registry.prefix('X'), ())
+        self.assertEqual(len(registry.pages()), 2)
+        pages = registry.pages('btc')
+        self.assertEqual(len(pages), 1)
+        self.assertIn('BTCDOMUSDT', pages[0])
+        self.assertNotIn('ETHUSDT', pages[0])
+        self.assertIs(registry.pages('BTC'), pages)
+        self.assertEqual(registry.pages('X'), [])
+
+    def test_refresh_after_ttl(self):
+        now = [1000.0]
+        calls = []
+
+        def fetch():
+            calls.append(now[0])
+            return exchange_info(['BTCUSDT', 'ETHUSDT'] + (['NEWUSDT'] if len(calls) > 1 else []))
+
+        registry = SymbolRegistry(ttl=60, clock=lambda: now[0])
+        self.assertTrue(registry.refresh(fetch))
+        pages = registry.pages('N')
+        self.assertFalse(registry.refresh(fetch))
+        now[0] += 60
+        self.assertTrue(registry.refresh(fetch))
+        self.assertEqual(calls, [1000.0, 1060.0])
+        self.assertEqual(registry.version, 2)
+        self.assertIn('NEWUSDT', registry)
+        self.assertIsNot(registry.pages('N'), pages)
+        self.assertEqual(registry.prefix('N'), ('NEWUSDT',))
+
+    def test_persisted_symbols_are_kept_until_the_ttl(self):
+        registry = SymbolRegistry(ttl=60, clock=lambda: 1030.0)
+        registry.load(['BTCUSDT'], updated=1000.0)
+        self.assertFalse(registry.refresh(lambda: self.fail('refreshed too early')))
+        registry.load(['BTCUSDT'], updated=0)
+        self.assertTrue(registry.expired())
+
+    def test_concurrent_refreshes_ask_once(self):
+        registry = SymbolRegistry(ttl=60)
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return exchange_info(['BTCUSDT'])
+
+        thread = threading.Thread(target=registry.refresh, args=(fetch,))
+        thread.start()
+        started.wait(5)
+        threading.Timer(0.05, release.set).start()
+        self.assertFalse(registry.refresh(fetch))
+        thread.join(5)
+        self.assertEqual(len(calls), 1)
+
+    def test_run_refreshes_in_the_background(self):
+        config = {"keepRunning": True}
+        refreshed = []
+        pauses = []
+
+        def sleep(pause):
+            pauses.append(pause)
+            config["keepRunning"] = False
+
+        def fetch():
+            if not refreshed:
+                raise ConnectionError('not reachable')
+            return exchange_info(['BTCUSDT'])
+
+        registry = SymbolRegistry(ttl=3600, clock=lambda: 5000.0)
+        registry.run(config, fetch, lambda: refreshed.append(registry.version), sleep)
+        self.assertEqual(refreshed, [])
+        self.assertEqual(pauses[0], RETRY_PAUSE)
+        refreshed.append(0)
+        config["keepRunning"] = True
+        registry.run(config, fetch, lambda: refreshed.append(registry.version), sleep)
+        self.assertEqual(refreshed, [0, 1])
+        self.assertEqual(pauses[1], 3600)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+from load_simulation import load_bot
+
+
+class TestTelegramBot(unittest.TestCase):
+
+    def setUp(self):
+        self.bot = load_bot()
+
+    def test_old_signals_are_held_back(self):
+        snapshot = {'AUSDT': {'buy': True, 'sell': False, 'updated': 0}, 'BUSDT': {'buy': True, 'sell': False, 'updated': 9000},
+                    'CUSDT': {'buy': True, 'sell': False}}
+        self.assertEqual(list(self.bot.fresh_signals(snapshot, '15m', 9000 + 15 * 60)), ['BUSDT'])
+        self.assertEqual(list(self.bot.fresh_signals(snapshot, '15m', 9000 + 15 * 60 + self.bot.MAX_PAUSE + 1)), [])
+
+
+    def test_following_a_strategy_adds_demand(self):
+        self.bot.alertDispatchers[('1d', 'ema')].subscribe(1, 'AUSDT')
+        self.bot.alertDispatchers[('4h', 'macd')].subscribe(2, 'AUSDT')
+        self.bot.alertDispatchers[('1d', 'rsi')].subscribe(3, 'all')
+        intervals, demand = self.bot.followed_tickers(['AUSDT', 'BUSDT'])
+        self.assertEqual(intervals, {'AUSDT': '4h', 'BUSDT': '1d'})
+        self.assertEqual(demand, {'AUSDT': {('1d', 'ema'), ('4h', 'macd'), ('1d', 'rsi')}, 'BUSDT': {('1d', 'rsi')}})
+
+    def test_merge_drops_strategies_nobody_follows(self):
+        snapshot = {'1d': {'AUSDT': 1, 'BUSDT': 1}, '1d:macd': {'AUSDT': 1}, '4h:rsi': {'AUSDT': 1}}
+        signals = {'1d': {'AUSDT': 2}, '1d:macd': {'AUSDT': 2}}
+        merged = self.bot.merge_signals(snapshot, signals, {'BUSDT'}, {'1d': ['ema', 'macd'], '4h': ['ema']})
+        self.assertEqual(merged, {'1d': {'AUSDT': 2}, '1d:macd': {'AUSDT': 2}})
+        self.assertEqual(snapshot['4h:rsi'], {'AUSDT': 1})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,5 @@
 import unittest
+import prettytable as pt
 from utils import *
 class TestUtils(unittest.TestCase):
     
@@ -46,6 +47,28 @@ class TestUtils(unittest.TestCase):
         tables2 = list_to_tables(alerts_data,2, symbols_alerts_to_table)
         self.assertEqual(len(tables2), 3)
        
+    def test_render_table_matches_prettytable(self):
+        rows = [('BTCUSDT', 'Y', 'N'), ('A', 'N', 'Y'), ('VERYLONGSYMBOLUSDT', 'N', 'N')]
+        for data in [[], rows[:1], rows]:
+            table = pt.PrettyTable(['Symbol', 'Buy', 'Sell'])
+            for column in ['Symbol', 'Buy', 'Sell']:
+                table.align[column] = 'l'
+            for row in data:
+                table.add_row(row)
+            self.assertEqual(render_table(['Symbol', 'Buy', 'Sell'], data), str(table))
+
+    def test_tables_cache(self):
+        calls = []
+        def data():
+            calls.append(1)
+            return ['BTC', 'ETH', 'XRP']
+        cache = TablesCache(2, symbols_to_table)
+        tables = cache.get(1, data)
+        self.assertEqual(len(tables), 2)
+        self.assertIs(cache.get(1, data), tables)
+        self.assertEqual(len(calls), 1)
+        cache.get(2, data)
+        self.assertEqual(len(calls), 2)
 
 
 if __name__ == '__main__':
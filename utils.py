@@ -1,24 +1,27 @@
-from typing import List
-import prettytable as pt
+from typing import List, Callable
+import threading
 
 
-def symbols_to_table(symbols: List) -> str:
-    table = pt.PrettyTable(['Symbol'])
-    table.align['Symbol'] = 'l'
-    for symbol in symbols:
-       table.add_row([symbol])
+def render_table(header: List, rows: List) -> str:
+    """Render rows like a default PrettyTable with left aligned columns, without its per row overhead."""
+    widths = [len(name) for name in header]
+    for row in rows:
+        for i, value in enumerate(row):
+            if len(value) > widths[i]:
+                widths[i] = len(value)
+    border = '+' + '+'.join('-' * (width + 2) for width in widths) + '+'
+    lines = [border, '| ' + ' | '.join(name.ljust(width) for name, width in zip(header, widths)) + ' |', border]
+    lines.extend('| ' + ' | '.join(value.ljust(width) for value, width in zip(row, widths)) + ' |' for row in rows)
+    lines.append(border)
+    return '\n'.join(lines)
+
 
+def symbols_to_table(symbols: List) -> str:
+    table = render_table(['Symbol'], [(symbol,) for symbol in symbols])
     return f'<pre>{table}</pre>'
 
 def symbols_alerts_to_table(data: List) -> str:
-    table = pt.PrettyTable(['Symbol', 'Buy', 'Sell'])
-    table.align['Symbol'] = 'l'
-    table.align['Buy'] = 'l'
-    table.align['Sell'] = 'l'
-    
-    for symbol, buy, sell in data:
-       table.add_row([symbol, boolAsYorNo(buy), boolAsYorNo(sell)])
-
+    table = render_table(['Symbol', 'Buy', 'Sell'], [(symbol, boolAsYorNo(buy), boolAsYorNo(sell)) for symbol, buy, sell in data])
     return f'<pre>{table}</pre>'
 
 def split_list_to_chunks(data: List, chunkSize: int) -> List:
@@ -32,4 +35,23 @@ def list_to_tables(data:List, chunkSize: int, converter) -> List:
     return tables
 
 def boolAsYorNo(value: bool) -> str:
-    return 'Y' if value  else 'N'
\ No newline at end of file
+    return 'Y' if value  else 'N'
+
+
+class TablesCache:
+    """Rendered table chunks of a data source, rebuilt only when its version changes."""
+
+    def __init__(self, chunkSize: int, converter: Callable):
+        self.chunkSize = chunkSize
+        self.converter = converter
+        self.version = None
+        self.tables = []
+        self.lock = threading.Lock()
+
+    def get(self, version, data: Callable) -> List:
+        """Tables for `version`, data() is only called to build the rows when the version changed."""
+        with self.lock:
+            if version != self.version:
+                self.tables = list_to_tables(data(), self.chunkSize, self.converter)
+                self.version = version
+            return self.tables